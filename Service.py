@@ -2,19 +2,81 @@ from __future__ import annotations
 
 import asyncio
 import json
+import threading
+import time
+from collections import deque
 from typing import Any, AsyncGenerator, Dict
 
 from fastapi import Body, FastAPI
 from sse_starlette.sse import EventSourceResponse
 
+from conf.config import recording_config, service_config, session_config
 from graph import AgentReACTORPlanner as GraphPlanner
-from State import ExecutionState, ReplanState, ReACTOR
+from nodes.planner import select_sop
+from runtime import AgentRuntime
+from State import ExecutionState, ReplanState, ReACTOR, StepResult
 from utils.ReACTORTracer import TraceCollector
+from utils.call_llm import llm_metrics
+from utils.deadline import expired, new_deadline
+from utils.recorder import RecordingSession, bind_session, build_recorder, reset_session
+from utils.session_store import SESSION_FIELDS, build_session_store, session_turn
+from utils.sop_engine import build_plan_from_sop
 import uvicorn
 
 app = FastAPI(title="ReACTOR Planner Service", version="1.0.0")
 
 
+class _StreamStats:
+    """
+    Server-side timings of /plan/stream requests (seconds):
+    first_event: request start -> first SSE event handed to the response;
+    queue_delay: trace event emitted -> taken off the _stream_handle queue;
+    drain: graph finished -> stream loop noticed it and started composing the final output;
+    final: request start -> first `final` event.
+    """
+
+    _KINDS = ("first_event", "queue_delay", "drain", "final")
+
+    def __init__(self, max_samples: int = 1000):
+        self._lock = threading.Lock()
+        self._samples = {kind: deque(maxlen=max_samples) for kind in self._KINDS}
+        self.active = 0
+        self.total = 0
+
+    def record(self, kind: str, seconds: float) -> None:
+        with self._lock:
+            self._samples[kind].append(seconds)
+
+    def opened(self) -> None:
+        with self._lock:
+            self.active += 1
+            self.total += 1
+
+    def closed(self) -> None:
+        with self._lock:
+            self.active -= 1
+
+    @staticmethod
+    def _quantile(samples, q: float):
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {"active": self.active, "total": self.total}
+            for kind, samples in self._samples.items():
+                out[f"{kind}_p50_s"] = self._quantile(samples, 0.5)
+                out[f"{kind}_p95_s"] = self._quantile(samples, 0.95)
+                out[f"{kind}_max_s"] = round(max(samples), 4) if samples else None
+            return out
+
+
+_stream_stats = _StreamStats()
+_fast_lane_stats = {"hits": 0}
+
+
 class AgentReACTORPlanner:
     """
     Full pipeline runner.
@@ -22,9 +84,11 @@ class AgentReACTORPlanner:
     Output: streaming final answer if working_input.is_streaming == True, else direct output.
     """
 
-    def __init__(self) -> None:
-        self.graph = GraphPlanner()
+    def __init__(self, runtime: AgentRuntime | None = None) -> None:
+        self.graph = GraphPlanner(runtime)
         self.evaluator_enabled = True
+        self.recorder = build_recorder(recording_config)
+        self.sessions = build_session_store(session_config)
 
     def set_evaluator(self, enabled: bool = True):
         self.evaluator_enabled = bool(enabled)
@@ -32,6 +96,49 @@ class AgentReACTORPlanner:
             self.graph.set_evaluator(enabled)
         return self
 
+    async def startup(self) -> None:
+        await self.graph.runtime.startup()
+
+    async def shutdown(self) -> None:
+        await self.graph.runtime.shutdown()
+        if self.sessions is not None:
+            self.sessions.close()
+
+    async def _restore_session(self, working_input: Dict[str, Any]) -> Dict[str, Any]:
+        """Fill history/slots/sop_runtime the request leaves out from its stored session."""
+        session_id = (working_input or {}).get("session_id")
+        if self.sessions is None or not session_id:
+            return working_input
+        stored = await self.sessions.aget(str(session_id))
+        if not stored:
+            return working_input
+        merged = dict(working_input)
+        for key in SESSION_FIELDS:
+            if key not in merged and key in stored:
+                merged[key] = stored[key]
+        return merged
+
+    async def _save_session(self, state: ReACTOR, result: Any) -> None:
+        raw = state.get("raw_input") or {}
+        session_id = raw.get("session_id")
+        if self.sessions is None or not session_id or state.get("eval_status") not in ("DONE", "FAILED"):
+            return
+        execution = self.graph.runtime.ensure_execution(state)
+        data = session_turn(
+            history=raw.get("history"),
+            query=raw.get("query", ""),
+            answer=result,
+            slots=state.get("slots") or {},
+            sop_runtime=state.get("sop_runtime") or {},
+            pending_question=state.get("pending_question"),
+            results=self.graph.runtime.results_to_plain(execution.results),
+            max_history=int(session_config.get("max_history", 40)),
+        )
+        try:
+            await self.sessions.aput(str(session_id), data)
+        except Exception as exc:
+            print(f"[session] write failed for {session_id}: {exc!r}")
+
     def _ensure_working_input(self, working_input: Dict[str, Any]) -> Dict[str, Any]:
         raw = dict(working_input or {})
         raw.setdefault("request_id", "")
@@ -45,6 +152,7 @@ class AgentReACTORPlanner:
         raw.setdefault("recursion_limit", 10)
         raw.setdefault("sop_runtime", {})
         raw.setdefault("slots", {})
+        raw.setdefault("timeout_s", service_config.get("request_timeout_s", 60))
         return raw
 
     def _init_state(self, raw: Dict[str, Any]) -> ReACTOR:
@@ -78,6 +186,7 @@ class AgentReACTORPlanner:
                 last_plan="",
                 last_results={},
             ),
+            "deadline": new_deadline(raw.get("timeout_s")),
             "result": "",
         }
 
@@ -101,7 +210,53 @@ class AgentReACTORPlanner:
         except Exception:
             return str(data)
 
+    def _sop_fast_lane(self, state: ReACTOR) -> bool:
+        """
+        If this turn's SOP plan is just AskUser -> FinalOutput (the next node is a prompt for a
+        missing slot), apply what planner and worker would and finish without the graph.
+        The canned question skips the evaluator, so no LLM is called. Otherwise the SOP match
+        and its plan are left in state["sop_plan"] for the planner.
+        """
+        if not service_config.get("sop_fast_lane", True):
+            return False
+        sops = self.graph.runtime.sops
+        sop = select_sop(state, self.graph.runtime, sops.registry)
+        patch = build_plan_from_sop(sop, state) if sop else None
+        steps = patch["execution"].steps if patch else []
+        if len(steps) != 2 or steps[0][2] != "AskUser" or steps[1][2] != "FinalOutput" or steps[1][3] != steps[0][1]:
+            state["sop_plan"] = {"fingerprint": sops.fingerprint, "patch": patch}
+            return False
+
+        (ask_desc, ask_var, _, ask_input), (final_desc, final_var, _, _) = steps
+        cfg = json.loads(ask_input)
+        question = cfg.get("question") or ""
+        execution = patch["execution"]
+        execution.results = {
+            ask_var: StepResult(id=ask_var, tag="AskUser", desc=ask_desc, status="ok", output=question),
+            final_var: StepResult(id=final_var, tag="FinalOutput", desc=final_desc, status="ok", output=question),
+        }
+        execution.result_meta = {
+            ask_var: {"tag": "AskUser", "key": cfg.get("key", ""), "question": question},
+            final_var: {"tag": "FinalOutput"},
+        }
+        execution.idx = len(steps)
+        state.update(patch)
+        state.update(
+            {
+                "plan_source": "sop",
+                "pending_question": cfg,
+                "result": question,
+                "eval_status": "DONE",
+            }
+        )
+        state["trace"].add_text("需要补充信息，已向用户发起提问")
+        _fast_lane_stats["hits"] += 1
+        print(f"[sop_fast_lane] sop={sop.get('id')} cursor={patch['sop_runtime'].get('cursor')}")
+        return True
+
     async def _execute(self, state: ReACTOR) -> ReACTOR:
+        if self._sop_fast_lane(state):
+            return state
         recursion_limit = int(state.get("working_input", {}).get("recursion_limit", 10))
         compiled = self.graph.graph
         config = {"recursion_limit": recursion_limit * 50}
@@ -113,37 +268,72 @@ class AgentReACTORPlanner:
 
         if isinstance(final_state, dict):
             state = self._merge_state(state, final_state)
+        if state.get("eval_status") not in ("DONE", "FAILED") and expired(state):
+            state["eval_status"] = "FAILED"
         return state
 
-    async def _stream_handle(self, state: ReACTOR) -> AsyncGenerator[Dict[str, str], None]:
+    async def _stream_handle(
+        self, state: ReACTOR, session: RecordingSession | None = None
+    ) -> AsyncGenerator[Dict[str, str], None]:
+        _stream_stats.opened()
+        # The generator runs in the response task: bind the recording there so the graph task inherits it.
+        bind_session(session)
+        final_items = []
+        try:
+            async for event in self._stream_events(state):
+                if event.get("event") == "final":
+                    final_items.append(event.get("data"))
+                yield event
+        finally:
+            _stream_stats.closed()
+            if session is not None:
+                self._finish_recording(session, state, final_items)
+            await self._save_session(state, "".join(final_items))
+
+    async def _stream_events(self, state: ReACTOR) -> AsyncGenerator[Dict[str, str], None]:
         loop = asyncio.get_running_loop()
         queue: asyncio.Queue = asyncio.Queue()
+        started = time.perf_counter()
+        first_sent = False
+        final_sent = False
+        finished_at: Dict[str, float] = {}
 
         trace = state.get("trace")
         if isinstance(trace, TraceCollector):
             def _emit(payload: Dict[str, Any]) -> None:
                 try:
-                    loop.call_soon_threadsafe(queue.put_nowait, payload)
+                    loop.call_soon_threadsafe(queue.put_nowait, (time.perf_counter(), payload))
                 except Exception:
                     pass
 
             trace.set_sse(_emit)
 
         execute_task = asyncio.create_task(self._execute(state))
+        execute_task.add_done_callback(lambda _task: finished_at.setdefault("t", time.perf_counter()))
 
         while True:
             if execute_task.done() and queue.empty():
                 break
             try:
-                payload = await asyncio.wait_for(queue.get(), timeout=0.1)
+                queued_at, payload = await asyncio.wait_for(queue.get(), timeout=0.1)
             except asyncio.TimeoutError:
                 continue
+            _stream_stats.record("queue_delay", time.perf_counter() - queued_at)
             if not isinstance(payload, dict):
                 continue
             event_name = payload.get("event", "stream")
             event_data = self._encode_sse_data(payload.get("data", ""))
+            if not first_sent:
+                first_sent = True
+                _stream_stats.record("first_event", time.perf_counter() - started)
+            if event_name == "final" and not final_sent:
+                # Raw agent events forwarded as final output while the graph is still running.
+                final_sent = True
+                _stream_stats.record("final", time.perf_counter() - started)
             yield {"event": event_name, "data": event_data}
 
+        if "t" in finished_at:
+            _stream_stats.record("drain", time.perf_counter() - finished_at["t"])
         try:
             state = await execute_task
         except Exception as exc:
@@ -152,26 +342,46 @@ class AgentReACTORPlanner:
             return
 
         try:
-            final_items = self.graph.compose_output(state, streaming=True)
+            final_items = await self.graph.acompose_output(state, streaming=True)
         except Exception as exc:
             yield {"event": "error", "data": self._encode_sse_data({"message": str(exc)})}
             yield {"event": "done", "data": self._encode_sse_data("")}
             return
         for item in final_items:
+            if not first_sent:
+                first_sent = True
+                _stream_stats.record("first_event", time.perf_counter() - started)
+            if not final_sent:
+                final_sent = True
+                _stream_stats.record("final", time.perf_counter() - started)
             yield {"event": "final", "data": self._encode_sse_data(item)}
 
         yield {"event": "state", "data": self._encode_sse_data(self._build_state_payload(state))}
         yield {"event": "done", "data": self._encode_sse_data("")}
 
+    def _finish_recording(self, session: RecordingSession, state: ReACTOR, result: Any) -> None:
+        try:
+            self.recorder.finish(session, state, result)
+        except Exception as exc:
+            print(f"[recorder] write failed: {exc!r}")
+
     async def handle(self, working_input: Dict[str, Any]):
-        raw = self._ensure_working_input(working_input)
+        raw = self._ensure_working_input(await self._restore_session(working_input))
         state = self._init_state(raw)
+        session = self.recorder.begin(raw) if self.recorder is not None else None
 
         if raw.get("is_streaming", False):
-            return EventSourceResponse(self._stream_handle(state))
+            return EventSourceResponse(self._stream_handle(state, session))
 
-        state = await self._execute(state)
-        result = self.graph.compose_output(state, streaming=False)
+        token = bind_session(session)
+        try:
+            state = await self._execute(state)
+            result = await self.graph.acompose_output(state, streaming=False)
+        finally:
+            reset_session(token)
+        if session is not None:
+            self._finish_recording(session, state, result)
+        await self._save_session(state, result)
         return {
             "result": result,
             "sop_runtime": state.get("sop_runtime") or {},
@@ -183,11 +393,37 @@ class AgentReACTORPlanner:
 planner = AgentReACTORPlanner()
 
 
+@app.on_event("startup")
+async def on_startup():
+    await planner.startup()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await planner.shutdown()
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+def metrics():
+    data = planner.graph.runtime.metrics()
+    data["llm"] = llm_metrics()
+    data["stream"] = _stream_stats.snapshot()
+    data["sop_fast_lane"] = dict(_fast_lane_stats)
+    if planner.sessions is not None:
+        data["sessions"] = planner.sessions.stats()
+    return data
+
+
+@app.post("/admin/sops/reload")
+async def reload_sops():
+    return await asyncio.to_thread(planner.graph.runtime.reload_sops)
+
+
 @app.post("/plan")
 async def plan(working_input: Dict[str, Any] = Body(...)):
     return await planner.handle(working_input)
@@ -41,6 +41,7 @@ class ExecutionState:
     steps: List = field(default_factory=list)
     results: Dict[str, StepResult] = field(default_factory=dict)     # key = '#E..'
     result_meta: Dict[str, Dict[str, Any]] = field(default_factory=dict)   # key = step.id
+    prefetched: Dict[str, Dict[str, Any]] = field(default_factory=dict)    # key = step.id, agent calls started while planning
 
 class SopRuntime(TypedDict,total=False):
     active_sop_id: str
@@ -69,6 +70,9 @@ class ReACTOR(TypedDict,total=False):
 
     plan_string : str
     reasoning_overview : str
+    plan_source : str       # 'llm' | 'cache' | 'sop'
+    plan_cache_key : str    # plan cache key of the current plan (None = not cacheable)
+    plan_template : str     # task of the past plan reused by similarity (plan_source == 'similar')
 
     # ------ Agenda Core --------
     plan_agenda: List[PlanStep]     # steps waiting to be executed (allow assert)
@@ -77,6 +81,7 @@ class ReACTOR(TypedDict,total=False):
     execution: ExecutionState
 
     sop_runtime: SopRuntime
+    sop_plan: Dict[str,Any]     # SOP selection already made this turn (fingerprint, patch); consumed by the planner
     slots: Dict[str,Any]        # User slots
 
     required_steps: List[PlanStep]  # Result from evaluator. Insert to agenda by replan
@@ -91,4 +96,6 @@ class ReACTOR(TypedDict,total=False):
     route: Dict[str, Any]         # Worker prepared single dispatch target
     routes: List[Dict[str, Any]]  # Worker prepared parallel dispatch targets
     replan : ReplanState
+    deadline: float     # time.monotonic() deadline of the whole request (None = unbounded)
+    summary_cache: str      # solver summary produced alongside a passing evaluation
     result: str     # Final answer(natural language)
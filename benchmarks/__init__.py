@@ -0,0 +1,8 @@
+"""
+Offline benchmarks for the ReACTOR pipeline.
+
+The LLM is replaced through utils.call_llm.set_llm_backend and agents are registered as
+'local' endpoints, so a run needs no network access and only measures the framework.
+
+    python -m benchmarks --scenario single_serial --requests 100 --concurrency 8
+"""
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+
+from benchmarks.harness import format_report, run_scenario
+from benchmarks.scenarios import SCENARIOS
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline ReACTOR benchmarks with fake LLM and agents")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="repeatable; default: all")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiply every fake latency (0 = no sleeps)")
+    parser.add_argument("--plan-cache", action="store_true", help="keep plan cache / similarity reuse enabled")
+    parser.add_argument("--json", dest="json_path", help="write the reports to this file")
+    args = parser.parse_args()
+
+    reports = []
+    for name in args.scenario or sorted(SCENARIOS):
+        report = asyncio.run(
+            run_scenario(
+                SCENARIOS[name],
+                requests=args.requests,
+                concurrency=args.concurrency,
+                seed=args.seed,
+                time_scale=args.time_scale,
+                plan_cache=args.plan_cache,
+            )
+        )
+        reports.append(report)
+        print(format_report(report))
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Local stub agent server for load tests.
+
+    python -m benchmarks.agent_farm --port 9100 --latency-ms 200 --error-rate 0.01
+
+POST /agents/{name}          JSON reply, used by `http` and `http_async` endpoints
+POST /agents/{name}/stream   SSE reply (one graph_trace event, then `--chunks` delta events)
+
+Latency and failures can be overridden per endpoint with query parameters
+(`?latency_ms=50&jitter=0.2&error_rate=0.1&chunks=8`), so one farm serves agents
+with different profiles.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+from typing import Any, Dict
+
+import uvicorn
+from fastapi import Body, FastAPI, Request
+from fastapi.responses import JSONResponse
+from sse_starlette.sse import EventSourceResponse
+
+DEFAULTS: Dict[str, Any] = {"latency_ms": 200.0, "jitter": 0.2, "error_rate": 0.0, "chunks": 8}
+
+app = FastAPI(title="ReACTOR benchmark agent farm")
+_rng = random.Random(0)
+
+
+def _profile(request: Request) -> Dict[str, float]:
+    params = request.query_params
+    return {key: float(params.get(key, default)) for key, default in DEFAULTS.items()}
+
+
+def _delay(profile: Dict[str, float]) -> float:
+    base = profile["latency_ms"] / 1000.0
+    return max(0.0, base * (1.0 + _rng.uniform(-profile["jitter"], profile["jitter"])))
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+
+@app.post("/agents/{name}")
+async def agent(name: str, request: Request, payload: Dict[str, Any] = Body(...)):
+    profile = _profile(request)
+    await asyncio.sleep(_delay(profile))
+    if _rng.random() < profile["error_rate"]:
+        return JSONResponse({"status": "fail", "reason": f"{name} injected error"}, status_code=500)
+    return {"status": "ok", "data": f"{name} 已处理：{payload.get('query', '')}"}
+
+
+@app.post("/agents/{name}/stream")
+async def agent_stream(name: str, request: Request, payload: Dict[str, Any] = Body(...)):
+    profile = _profile(request)
+    chunks = max(1, int(profile["chunks"]))
+    per_chunk = _delay(profile) / (chunks + 1)
+    failed = _rng.random() < profile["error_rate"]
+
+    async def _events():
+        await asyncio.sleep(per_chunk)
+        yield {"data": json.dumps({"type": "graph_trace", "data": {"content": f"{name} 开始处理"}}, ensure_ascii=False)}
+        for i in range(chunks):
+            await asyncio.sleep(per_chunk)
+            if failed and i == chunks // 2:
+                yield {"data": json.dumps({"error": f"{name} injected error"}, ensure_ascii=False)}
+                return
+            text = f"{name} 第{i + 1}段；" if i else f"{name} 已处理：{payload.get('query', '')}；"
+            yield {"data": json.dumps({"choices": [{"delta": {"content": text}}]}, ensure_ascii=False)}
+
+    return EventSourceResponse(_events())
+
+
+def farm_agent_config(base_url: str, profiles: Dict[str, str] | None = None) -> Dict[str, Dict[str, Any]]:
+    """agent_config entries for one agent per endpoint type, pointing at a running farm."""
+    base_url = base_url.rstrip("/")
+    profiles = profiles or {}
+    pool = {"max_connections": 100, "max_keepalive": 50, "keepalive_expiry": 30, "http2": False, "warmup": 0}
+    out: Dict[str, Dict[str, Any]] = {}
+    for name, etype, path in (
+        ("farm_http", "http", "/agents/farm_http"),
+        ("farm_async", "http_async", "/agents/farm_async"),
+        ("farm_stream", "http_stream", "/agents/farm_stream/stream"),
+    ):
+        query = profiles.get(name, "")
+        out[name] = {
+            "description": f"benchmark agent farm ({etype})",
+            "endpoint": {
+                "type": etype,
+                "url": f"{base_url}{path}" + (f"?{query}" if query else ""),
+                "timeout": 30,
+                "headers": {},
+                "pool": dict(pool),
+            },
+        }
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stub agent server for ReACTOR load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=DEFAULTS["latency_ms"])
+    parser.add_argument("--jitter", type=float, default=DEFAULTS["jitter"], help="relative +/- spread of the latency")
+    parser.add_argument("--error-rate", type=float, default=DEFAULTS["error_rate"])
+    parser.add_argument("--chunks", type=int, default=DEFAULTS["chunks"], help="delta events per streamed reply")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    DEFAULTS.update(latency_ms=args.latency_ms, jitter=args.jitter, error_rate=args.error_rate, chunks=args.chunks)
+    _rng.seed(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
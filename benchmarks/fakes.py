@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import math
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class LatencyDist:
+    """
+    Latency sampler (seconds).
+    kind: fixed(value) | uniform(low, high) | normal(mean, stddev) | lognormal(p50, p99)
+    """
+
+    kind: str = "fixed"
+    value: float = 0.0
+    low: float = 0.0
+    high: float = 0.0
+    mean: float = 0.0
+    stddev: float = 0.0
+    p50: float = 0.0
+    p99: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: Any) -> "LatencyDist":
+        if isinstance(spec, LatencyDist):
+            return spec
+        if isinstance(spec, (int, float)):
+            return cls("fixed", value=float(spec))
+        if isinstance(spec, dict):
+            return cls(**spec)
+        return cls()
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            return rng.uniform(self.low, self.high)
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(self.mean, self.stddev))
+        if self.kind == "lognormal":
+            # p99 = p50 * exp(2.326 * sigma)
+            sigma = math.log(self.p99 / self.p50) / 2.326 if self.p99 > self.p50 > 0 else 0.0
+            return rng.lognormvariate(math.log(self.p50), sigma) if self.p50 > 0 else 0.0
+        return self.value
+
+
+@dataclass
+class RequestContext:
+    """Per-request bookkeeping shared by every fake call made on behalf of that request."""
+
+    index: int
+    rng: random.Random
+    intervals: List[Tuple[float, float, str]] = field(default_factory=list)
+    calls: Counter = field(default_factory=Counter)
+
+    def record(self, start: float, end: float, label: str) -> None:
+        self.intervals.append((start, end, label))
+
+
+_current: contextvars.ContextVar[Optional[RequestContext]] = contextvars.ContextVar("bench_request", default=None)
+
+
+def bind_request(ctx: RequestContext) -> contextvars.Token:
+    return _current.set(ctx)
+
+
+def current_request() -> RequestContext:
+    ctx = _current.get()
+    if ctx is None:
+        # Calls outside a benchmark request (warmup, ad-hoc use) still work.
+        ctx = RequestContext(index=-1, rng=random.Random(0))
+    return ctx
+
+
+LLMScript = Callable[[str, str, RequestContext], str]
+
+
+class FakeLLM:
+    """
+    Scripted LLM backend for utils.call_llm.set_llm_backend.
+    `script(prompt, node, ctx)` returns the completion; latency is sampled per node.
+    """
+
+    def __init__(
+        self,
+        script: LLMScript,
+        latency: Dict[str, Any] | None = None,
+        *,
+        time_scale: float = 1.0,
+        chunk_chars: int = 24,
+    ):
+        self.script = script
+        self.latency = {node: LatencyDist.parse(spec) for node, spec in (latency or {}).items()}
+        self.time_scale = float(time_scale)
+        self.chunk_chars = int(chunk_chars)
+
+    def _delay(self, node: str, ctx: RequestContext) -> float:
+        dist = self.latency.get(node) or self.latency.get("default") or LatencyDist()
+        return dist.sample(ctx.rng) * self.time_scale
+
+    def complete(self, prompt: str, node: str = "default") -> str:
+        ctx = current_request()
+        ctx.calls[f"llm:{node}"] += 1
+        text = self.script(prompt, node, ctx)
+        start = time.perf_counter()
+        time.sleep(self._delay(node, ctx))
+        ctx.record(start, time.perf_counter(), f"llm:{node}")
+        return text
+
+    async def acomplete(self, prompt: str, node: str = "default") -> str:
+        ctx = current_request()
+        ctx.calls[f"llm:{node}"] += 1
+        text = self.script(prompt, node, ctx)
+        start = time.perf_counter()
+        try:
+            await asyncio.sleep(self._delay(node, ctx))
+        finally:
+            ctx.record(start, time.perf_counter(), f"llm:{node}")
+        return text
+
+    async def astream(self, prompt: str, node: str = "default") -> AsyncIterator[str]:
+        ctx = current_request()
+        ctx.calls[f"llm:{node}"] += 1
+        text = self.script(prompt, node, ctx)
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or [""]
+        per_chunk = self._delay(node, ctx) / len(chunks)
+        start = time.perf_counter()
+        try:
+            for chunk in chunks:
+                await asyncio.sleep(per_chunk)
+                yield chunk
+        finally:
+            ctx.record(start, time.perf_counter(), f"llm:{node}")
+
+
+class FakeAgent:
+    """Agent with a latency distribution and error rate; register `execute` as a 'local' endpoint."""
+
+    def __init__(
+        self,
+        name: str,
+        latency: Any = 0.0,
+        *,
+        error_rate: float = 0.0,
+        reply: Optional[Callable[[Dict[str, Any]], Any]] = None,
+        time_scale: float = 1.0,
+    ):
+        self.name = name
+        self.latency = LatencyDist.parse(latency)
+        self.error_rate = float(error_rate)
+        self.reply = reply
+        self.time_scale = float(time_scale)
+
+    async def execute(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        ctx = current_request()
+        ctx.calls[f"agent:{self.name}"] += 1
+        delay = self.latency.sample(ctx.rng) * self.time_scale
+        failed = ctx.rng.random() < self.error_rate
+        start = time.perf_counter()
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            ctx.record(start, time.perf_counter(), f"agent:{self.name}")
+        if failed:
+            return {"status": "fail", "reason": f"{self.name} injected error"}
+        query = payload.get("query", "") if isinstance(payload, dict) else ""
+        data = self.reply(payload) if self.reply is not None else f"{self.name} 已处理：{query}"
+        return {"status": "ok", "data": data}
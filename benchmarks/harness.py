@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+from benchmarks.fakes import FakeAgent, FakeLLM, RequestContext, bind_request, current_request
+from benchmarks.scenarios import Scenario
+from benchmarks.stats import covered, summary_ms
+from runtime import AgentRuntime
+from Service import AgentReACTORPlanner
+from utils.call_llm import set_llm_backend
+from utils.sop_registry import build_sop_registry
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_LLM_LATENCY = {
+    "planner": {"kind": "lognormal", "p50": 0.8, "p99": 2.0},
+    "evaluator": {"kind": "lognormal", "p50": 0.5, "p99": 1.2},
+    "solver": {"kind": "lognormal", "p50": 0.7, "p99": 1.5},
+    "default": {"kind": "lognormal", "p50": 0.5, "p99": 1.2},
+}
+
+
+class EventCollector:
+    """Stands in for ReACTORLogger: keeps node timings in memory, tagged with the request."""
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+
+    def log(self, event: Dict[str, Any]) -> None:
+        self.events.append(
+            {
+                "node": event.get("node"),
+                "duration_s": float(event.get("duration_ms") or 0.0) / 1000.0,
+                "end": time.perf_counter(),
+                "request": current_request().index,
+            }
+        )
+
+
+def _llm_script(scenario: Scenario):
+    def _script(prompt: str, node: str, ctx: RequestContext) -> str:
+        if node == "planner":
+            return scenario.plan or ""
+        if node == "evaluator":
+            if ctx.calls["llm:evaluator"] <= scenario.evaluator_fail_first:
+                return json.dumps({"decision": "FAIL", "hint": "基准测试：模拟评估不通过"}, ensure_ascii=False)
+            return json.dumps({"decision": "PASS", "hint": ""})
+        return "基准测试摘要：已根据证据完成回答。"
+
+    return _script
+
+
+def _check_calls(scenario: Scenario, contexts: Dict[int, RequestContext]) -> None:
+    """Fail the run when a request did not make exactly the scenario's expected agent calls."""
+    wrong = []
+    for index, ctx in sorted(contexts.items()):
+        made = {key[len("agent:"):]: n for key, n in ctx.calls.items() if key.startswith("agent:") and n}
+        if made != scenario.expected_calls:
+            wrong.append(f"#{index}: {made}")
+    if wrong:
+        raise AssertionError(
+            f"scenario {scenario.name!r} expected agent calls {scenario.expected_calls} per request, got "
+            + "; ".join(wrong[:5])
+            + (f" (+{len(wrong) - 5} more)" if len(wrong) > 5 else "")
+        )
+
+
+def build_planner(scenario: Scenario, *, time_scale: float = 1.0, plan_cache: bool = False) -> AgentReACTORPlanner:
+    agent_config = {}
+    for name, spec in scenario.agents.items():
+        agent = FakeAgent(
+            name,
+            spec.get("latency", 0.0),
+            error_rate=spec.get("error_rate", 0.0),
+            time_scale=time_scale,
+        )
+        agent_config[name] = {
+            "description": f"benchmark fake agent {name}",
+            "endpoint": {"type": "local", "callable": agent.execute},
+        }
+    runtime = AgentRuntime(agent_config)
+    runtime.publish_sops(build_sop_registry({"base_dir": BENCH_DIR, "sops": list(scenario.sop_paths)}))
+    if not plan_cache:
+        # Measure the planning path itself, not cache hits across iterations.
+        runtime.plan_cache = None
+        runtime.plan_index = None
+
+    planner = AgentReACTORPlanner(runtime)
+    planner.graph.logger = EventCollector()
+    return planner
+
+
+async def run_scenario(
+    scenario: Scenario,
+    *,
+    requests: int = 50,
+    concurrency: int = 4,
+    seed: int = 0,
+    time_scale: float = 1.0,
+    llm_latency: Optional[Dict[str, Any]] = None,
+    plan_cache: bool = False,
+) -> Dict[str, Any]:
+    """
+    Drive AgentReACTORPlanner.handle with fake LLM/agents and report latency, throughput
+    and framework overhead (node time not spent inside a fake LLM or agent call).
+    Every request has its own RNG seeded from (seed, scenario, index), so the sampled
+    latencies and injected errors do not depend on concurrency.
+    """
+    planner = build_planner(scenario, time_scale=time_scale, plan_cache=plan_cache)
+    collector: EventCollector = planner.graph.logger
+    llm = FakeLLM(_llm_script(scenario), llm_latency or DEFAULT_LLM_LATENCY, time_scale=time_scale)
+    previous = set_llm_backend(llm)
+
+    latencies: List[float] = []
+    overheads: List[float] = []
+    contexts: Dict[int, RequestContext] = {}
+    failures = 0
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(index: int) -> None:
+        nonlocal failures
+        ctx = RequestContext(index=index, rng=random.Random(f"{seed}:{scenario.name}:{index}"))
+        contexts[index] = ctx
+        bind_request(ctx)
+        carry: Dict[str, Any] = {}
+        async with semaphore:
+            for turn in scenario.turns:
+                working_input = dict(turn, **carry)
+                working_input.setdefault("request_id", f"bench-{scenario.name}-{index}")
+                start = time.perf_counter()
+                try:
+                    resp = await planner.handle(working_input)
+                except Exception as exc:
+                    failures += 1
+                    print(f"[bench] {scenario.name}#{index} failed: {exc!r}")
+                    return
+                end = time.perf_counter()
+                latencies.append(end - start)
+                overheads.append((end - start) - covered(ctx.intervals, start, end))
+                if not isinstance(resp, dict) or not (resp.get("result") or resp.get("pending_question")):
+                    failures += 1
+                carry = {
+                    "sop_runtime": (resp or {}).get("sop_runtime") or {},
+                    "slots": (resp or {}).get("slots") or {},
+                }
+
+    await planner.startup()
+    try:
+        wall_start = time.perf_counter()
+        await asyncio.gather(*[_one(i) for i in range(requests)])
+        wall = time.perf_counter() - wall_start
+    finally:
+        set_llm_backend(previous)
+        await planner.shutdown()
+
+    node_overheads: Dict[str, List[float]] = defaultdict(list)
+    for event in collector.events:
+        ctx = contexts.get(event["request"])
+        if ctx is None:
+            continue
+        start = event["end"] - event["duration_s"]
+        node_overheads[event["node"]].append(max(0.0, event["duration_s"] - covered(ctx.intervals, start, event["end"])))
+
+    calls: Counter = Counter()
+    for ctx in contexts.values():
+        calls.update(ctx.calls)
+    _check_calls(scenario, contexts)
+
+    return {
+        "scenario": scenario.name,
+        "description": scenario.description,
+        "requests": requests,
+        "turns": len(latencies),
+        "concurrency": concurrency,
+        "seed": seed,
+        "time_scale": time_scale,
+        "failures": failures,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall > 0 else None,
+        "latency_ms": summary_ms(latencies),
+        "overhead_ms": {
+            "total": summary_ms(overheads),
+            "nodes": {node: summary_ms(samples) for node, samples in sorted(node_overheads.items())},
+        },
+        "calls_per_request": {key: round(value / max(1, requests), 3) for key, value in sorted(calls.items())},
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lat = report["latency_ms"]
+    lines = [
+        f"== {report['scenario']} ({report['description']})",
+        f"   turns={report['turns']} concurrency={report['concurrency']} failures={report['failures']} "
+        f"throughput={report['throughput_rps']} rps",
+        f"   latency ms     p50={lat['p50']} p95={lat['p95']} p99={lat['p99']}",
+    ]
+    total = report["overhead_ms"]["total"]
+    lines.append(f"   overhead ms    p50={total['p50']} p95={total['p95']} p99={total['p99']}")
+    for node, item in report["overhead_ms"]["nodes"].items():
+        lines.append(f"     {node:<10} p50={item['p50']} p95={item['p95']} p99={item['p99']} (n={item['count']})")
+    calls = ", ".join(f"{k}={v}" for k, v in report["calls_per_request"].items())
+    lines.append(f"   calls/request  {calls}")
+    return "\n".join(lines)
@@ -0,0 +1,221 @@
+"""
+HTTP load driver for /plan and /plan/stream.
+
+    python -m benchmarks.load --spawn --concurrency 1,4,16,64 --duration 10
+    python -m benchmarks.load --url http://127.0.0.1:8080 --stream-ratio 1.0 --json load.json
+
+Each concurrency level runs closed-loop clients over one pooled httpx.AsyncClient
+(connections are reused across requests) and reports throughput, end-to-end latency,
+time to the first SSE event and to the first `final` event, plus the server-side
+stream timings from GET /metrics. --spawn starts the agent farm and benchmarks.serve
+as subprocesses.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.stats import summary_ms
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def _plan_once(client: httpx.AsyncClient, body: Dict[str, Any]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    resp = await client.post("/plan", json=body)
+    ok = resp.status_code == 200 and bool((resp.json() or {}).get("result"))
+    return {"kind": "plan", "ok": ok, "total": time.perf_counter() - start}
+
+
+async def _stream_once(client: httpx.AsyncClient, body: Dict[str, Any]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    first_event: Optional[float] = None
+    first_final: Optional[float] = None
+    events = 0
+    ok = False
+    async with client.stream("POST", "/plan/stream", json=body) as resp:
+        if resp.status_code != 200:
+            await resp.aread()
+            return {"kind": "stream", "ok": False, "total": time.perf_counter() - start}
+        async for line in resp.aiter_lines():
+            if not line.startswith("event:"):
+                continue
+            now = time.perf_counter() - start
+            name = line[len("event:"):].strip()
+            events += 1
+            if first_event is None:
+                first_event = now
+            if name == "final" and first_final is None:
+                first_final = now
+            if name == "error":
+                break
+            if name == "done":
+                ok = first_final is not None
+                break
+    return {
+        "kind": "stream",
+        "ok": ok,
+        "total": time.perf_counter() - start,
+        "first_event": first_event,
+        "first_final": first_final,
+        "events": events,
+    }
+
+
+async def run_level(
+    url: str,
+    *,
+    concurrency: int,
+    duration: float,
+    stream_ratio: float,
+    seed: int = 0,
+    timeout: float = 60.0,
+) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    samples: List[Dict[str, Any]] = []
+    errors: List[str] = []
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        deadline = time.perf_counter() + duration
+
+        async def _client(worker: int) -> None:
+            rng = random.Random(f"{seed}:{concurrency}:{worker}")
+            n = 0
+            while time.perf_counter() < deadline:
+                n += 1
+                body = {"query": "查询账户并推荐理财", "request_id": f"load-{concurrency}-{worker}-{n}"}
+                try:
+                    if rng.random() < stream_ratio:
+                        samples.append(await _stream_once(client, body))
+                    else:
+                        samples.append(await _plan_once(client, body))
+                except Exception as exc:
+                    errors.append(repr(exc))
+
+        start = time.perf_counter()
+        await asyncio.gather(*[_client(i) for i in range(concurrency)])
+        wall = time.perf_counter() - start
+
+        try:
+            server = (await client.get("/metrics")).json()
+        except Exception:
+            server = {}
+
+    def _values(key: str, kind: Optional[str] = None) -> List[float]:
+        return [s[key] for s in samples if s.get(key) is not None and (kind is None or s["kind"] == kind)]
+
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(wall, 3),
+        "requests": len(samples),
+        "failures": sum(1 for s in samples if not s["ok"]) + len(errors),
+        "errors": errors[:5],
+        "throughput_rps": round(len(samples) / wall, 3) if wall > 0 else None,
+        "latency_ms": {
+            "plan": summary_ms(_values("total", "plan")),
+            "stream": summary_ms(_values("total", "stream")),
+        },
+        "first_event_ms": summary_ms(_values("first_event")),
+        "first_final_ms": summary_ms(_values("first_final")),
+        "server": {"stream": server.get("stream"), "llm": (server.get("llm") or {}).get("limiters")},
+    }
+
+
+def _wait_healthy(url: str, timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/health", timeout=1.0).status_code == 200:
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become healthy in {timeout}s")
+
+
+def spawn(port: int, farm_port: int, farm_args: List[str]) -> List[subprocess.Popen]:
+    python = sys.executable
+    farm = subprocess.Popen([python, "-m", "benchmarks.agent_farm", "--port", str(farm_port), *farm_args], cwd=ROOT_DIR)
+    farm_url = f"http://127.0.0.1:{farm_port}"
+    _wait_healthy(farm_url)
+    service = subprocess.Popen(
+        [python, "-m", "benchmarks.serve", "--port", str(port), "--farm", farm_url], cwd=ROOT_DIR
+    )
+    _wait_healthy(f"http://127.0.0.1:{port}")
+    return [service, farm]
+
+
+def format_level(report: Dict[str, Any]) -> str:
+    def _p(item: Dict[str, Any]) -> str:
+        return f"p50={item['p50']} p95={item['p95']} p99={item['p99']} (n={item['count']})"
+
+    stream = (report.get("server") or {}).get("stream") or {}
+    return "\n".join(
+        [
+            f"== concurrency={report['concurrency']} requests={report['requests']} "
+            f"failures={report['failures']} throughput={report['throughput_rps']} rps",
+            f"   /plan ms          {_p(report['latency_ms']['plan'])}",
+            f"   /plan/stream ms   {_p(report['latency_ms']['stream'])}",
+            f"   first event ms    {_p(report['first_event_ms'])}",
+            f"   first final ms    {_p(report['first_final_ms'])}",
+            f"   server stream s   queue_delay p50={stream.get('queue_delay_p50_s')} p95={stream.get('queue_delay_p95_s')} "
+            f"drain p50={stream.get('drain_p50_s')} p95={stream.get('drain_p95_s')}",
+        ]
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test /plan and /plan/stream")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma separated levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--stream-ratio", type=float, default=0.5, help="share of requests sent to /plan/stream")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="write the reports to this file")
+    parser.add_argument("--spawn", action="store_true", help="start the agent farm and benchmarks.serve locally")
+    parser.add_argument("--farm-port", type=int, default=9100)
+    parser.add_argument("--farm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--farm-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    procs: List[subprocess.Popen] = []
+    if args.spawn:
+        port = httpx.URL(args.url).port or 8080
+        farm_args = ["--latency-ms", str(args.farm_latency_ms), "--error-rate", str(args.farm_error_rate)]
+        procs = spawn(port, args.farm_port, farm_args)
+
+    reports = []
+    try:
+        for level in [int(x) for x in args.concurrency.split(",") if x.strip()]:
+            report = asyncio.run(
+                run_level(
+                    args.url,
+                    concurrency=level,
+                    duration=args.duration,
+                    stream_ratio=args.stream_ratio,
+                    seed=args.seed,
+                )
+            )
+            reports.append(report)
+            print(format_level(report))
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
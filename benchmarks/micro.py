@@ -0,0 +1,351 @@
+"""
+Microbenchmarks for the pure-Python functions that run on every request.
+
+    python -m benchmarks.micro --json micro.json
+    python -m benchmarks.micro --compare baseline.json --json current.json
+
+Every case is measured at several input sizes; results are saved as JSON (one row per
+case/size, per-call time in microseconds) together with the git commit they were taken
+at, and --compare reports the ratio against a previous run.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from State import StepResult
+from utils.append_history import aggregate_agent_output, extract_plain_text
+from utils.parse_plan import parse_plan_str
+from utils.ReACTORTracer import TraceCollector
+from utils.sop_compiler import compile_sop
+from utils.sop_engine import build_plan_from_sop
+from utils.sop_registry import SopRegistry, match_sop
+
+
+@dataclass
+class MicroCase:
+    """setup(size) builds the synthetic input outside the timed region and returns the call to time."""
+
+    name: str
+    param: str
+    sizes: List[int]
+    setup: Callable[[int], Callable[[], Any]]
+
+
+MICRO_CASES: Dict[str, MicroCase] = {}
+
+
+def micro(name: str, param: str, sizes: List[int]):
+    def _register(fn: Callable[[int], Callable[[], Any]]):
+        MICRO_CASES[name] = MicroCase(name, param, list(sizes), fn)
+        return fn
+
+    return _register
+
+
+# ---------------- synthetic inputs ----------------
+
+_WORDS = ["账户", "余额", "理财", "转账", "基金", "持仓", "信用卡", "还款", "额度", "收益", "风险", "市场"]
+
+
+def _word(i: int) -> str:
+    return _WORDS[i % len(_WORDS)] + str(i)
+
+
+def _plan_text(steps: int) -> str:
+    lines = ["思考过程：先拆分任务，再依次调用 agent，最后输出结果。"]
+    for i in range(1, steps):
+        call = json.dumps({"agent": f"agent_{i}", "input": "$WORKING_INPUT", "summary": f"子任务{i}"}, ensure_ascii=False)
+        lines.append(f"Plan:执行子任务{i} | #E{i} = SerialCallAgent['{call}']")
+    lines.append(f"Plan:将最终结果直接输出给用户 | #E{steps} = FinalOutput['#E{steps - 1}']")
+    return "\n".join(lines)
+
+
+def _sop_registry(sops: int, triggers: int) -> SopRegistry:
+    registry = SopRegistry(
+        (f"sop_{i}", {"id": f"sop_{i}", "triggers": [f"{_word(i * triggers + j)}办理" for j in range(triggers)]})
+        for i in range(sops)
+    )
+    registry.refresh_trigger_index()
+    return registry
+
+
+def _chain_sop(decisions: int) -> Dict[str, Any]:
+    """start -> n decision states -> prompt(amount) -> action -> end; n <= 37 fits the 40-node walk guard."""
+    states: List[Dict[str, Any]] = [{"id": "start", "type": "start", "next": "d0"}]
+    for i in range(decisions):
+        nxt = f"d{i + 1}" if i + 1 < decisions else "ask_amount"
+        states.append(
+            {
+                "id": f"d{i}",
+                "type": "decision",
+                "transitions": [
+                    {"when": f"nlp_contains({_word(i)})", "to": "ask_amount"},
+                    {"when": "else", "to": nxt},
+                ],
+            }
+        )
+    states += [
+        {
+            "id": "ask_amount",
+            "type": "prompt",
+            "needed_slots": ["amount"],
+            "utterances": ["请问金额是多少？"],
+            "transitions": [{"when": "all_filled(amount)", "to": "act"}],
+        },
+        {
+            "id": "act",
+            "type": "action",
+            "calls": [{"agent": "transfer_service", "input": "$WORKING_INPUT", "summary": "执行"}],
+            "next": "end",
+        },
+        {"id": "end", "type": "end"},
+    ]
+    return {
+        "id": "bench_chain",
+        "slots": [{"name": "amount", "type": "amount", "required": True}],
+        "states": states,
+        "state_map": {st["id"]: st for st in states},
+        "start_state": "start",
+    }
+
+
+def _history(turns: int) -> List[Dict[str, str]]:
+    out = []
+    for i in range(turns):
+        out.append({"role": "user", "content": f"我想了解一下{_word(i)}的情况"})
+        out.append({"role": "assistant", "content": f"好的，{_word(i)}目前正常。"})
+    return out
+
+
+def _slot_defs(count: int) -> List[Dict[str, Any]]:
+    defs: List[Dict[str, Any]] = []
+    for i in range(count):
+        if i % 2:
+            defs.append({"name": f"slot_{i}", "type": "string", "enum": [_word(i * 4 + j) for j in range(4)]})
+        else:
+            defs.append({"name": f"slot_{i}", "type": "amount"})
+    return defs
+
+
+# ---------------- cases ----------------
+
+
+@micro("parse_plan_str", "steps", [5, 20, 100])
+def _bench_parse_plan(size: int):
+    text = _plan_text(size)
+    return lambda: parse_plan_str(text)
+
+
+@micro("match_sop.sops", "sops", [10, 100, 1000])
+def _bench_match_sops(size: int):
+    registry = _sop_registry(size, 8)
+    query = f"帮我看看{_word(size * 4)}办理需要什么，顺便查一下余额"
+    return lambda: match_sop(query, registry)
+
+
+@micro("match_sop.triggers", "triggers", [4, 32, 256])
+def _bench_match_triggers(size: int):
+    registry = _sop_registry(20, size)
+    query = f"帮我看看{_word(size * 10)}办理需要什么，顺便查一下余额"
+    return lambda: match_sop(query, registry)
+
+
+@micro("build_plan_from_sop", "decisions", [2, 10, 37])
+def _bench_build_plan(size: int):
+    sop = _chain_sop(size)
+    state = {"working_input": {"query": "帮我转账5000元", "history": _history(4)}, "slots": {}, "sop_runtime": {}}
+    # Time the full walk down to the action, not a walk that stops early.
+    plan = build_plan_from_sop(sop, state)["plan_string"]
+    assert "transfer_service" in plan, f"chain SOP never reaches its action step: {plan}"
+    return lambda: build_plan_from_sop(sop, state)
+
+
+@micro("SlotExtractor.extract", "history_turns", [1, 4, 32])
+def _bench_extract_slots(size: int):
+    extractor = compile_sop({"slots": _slot_defs(8)}).extractor
+    texts = [item["content"] for item in _history(size)] + ["这次转 3000 元"]
+    return lambda: extractor.extract(texts, {})
+
+
+@micro("SlotExtractor.enum", "enum_values", [10, 100, 1000])
+def _bench_extract_enum(size: int):
+    defs = [{"name": "product", "type": "string", "enum": [f"{_word(i)}号产品" for i in range(size)]}]
+    extractor = compile_sop({"slots": defs}).extractor
+    texts = [f"我想买{_word(size - 1)}号产品，风险高吗", "上次看的是什么", "转 3000 元"]
+    return lambda: extractor.extract(texts, {})
+
+
+@micro("extract_plain_text", "output_items", [10, 100, 1000])
+def _bench_extract_plain_text(size: int):
+    output = {"data": [{"content": {"text": f"第{i}条：{_word(i)}数据正常"}} for i in range(size)]}
+    return lambda: extract_plain_text(output)
+
+
+@micro("aggregate_agent_output", "stream_events", [50, 500, 5000])
+def _bench_aggregate(size: int):
+    events = [{"choices": [{"delta": {"content": _word(i)}}]} for i in range(size)]
+    return lambda: aggregate_agent_output(events)
+
+
+@micro("results_to_plain", "steps", [5, 20, 100])
+def _bench_results_to_plain(size: int):
+    # Imported here: runtime pulls in the agent transport stack.
+    from runtime import AgentRuntime
+
+    runtime = AgentRuntime({})
+    results = {
+        f"#E{i}": StepResult(id=f"#E{i}", tag="SerialCallAgent", desc=f"子任务{i}", status="ok",
+                             output={"status": "ok", "data": {"items": [_word(j) for j in range(20)]}})
+        for i in range(1, size + 1)
+    }
+    return lambda: runtime.results_to_plain(results)
+
+
+@micro("TraceCollector.add", "trace_steps", [10, 100, 1000])
+def _bench_trace_add(size: int):
+    def _run():
+        trace = TraceCollector()
+        trace.set_sse(lambda event: None)
+        for i in range(size):
+            trace.add(f"步骤{i}", "detail")
+        return trace
+
+    return _run
+
+
+# ---------------- runner ----------------
+
+
+def measure(fn: Callable[[], Any], *, min_time: float = 0.05, repeat: int = 5) -> List[float]:
+    """Seconds per call for each repeat; the loop count is calibrated so a repeat lasts >= min_time."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)))
+    samples = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops)
+    return samples
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+    except Exception:
+        return None
+    return out.stdout.strip() or None
+
+
+def run_micro(names: Optional[List[str]] = None, *, min_time: float = 0.05, repeat: int = 5) -> Dict[str, Any]:
+    rows: List[Dict[str, Any]] = []
+    for name in names or list(MICRO_CASES):
+        case = MICRO_CASES[name]
+        for size in case.sizes:
+            samples = measure(case.setup(size), min_time=min_time, repeat=repeat)
+            rows.append(
+                {
+                    "case": case.name,
+                    "param": case.param,
+                    "size": size,
+                    "median_us": round(statistics.median(samples) * 1e6, 3),
+                    "min_us": round(min(samples) * 1e6, 3),
+                    "stdev_us": round(statistics.pstdev(samples) * 1e6, 3),
+                    "repeat": len(samples),
+                }
+            )
+    return {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": rows,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], *, threshold: float = 0.15) -> List[Dict[str, Any]]:
+    """Row per case/size present in both runs; `regression` when min time grew by more than threshold."""
+    old = {(r["case"], r["size"]): r for r in baseline.get("results") or []}
+    out: List[Dict[str, Any]] = []
+    for row in current.get("results") or []:
+        prev = old.get((row["case"], row["size"]))
+        if prev is None or not prev.get("min_us"):
+            continue
+        ratio = row["min_us"] / prev["min_us"]
+        out.append(
+            {
+                "case": row["case"],
+                "size": row["size"],
+                "baseline_us": prev["min_us"],
+                "current_us": row["min_us"],
+                "ratio": round(ratio, 3),
+                "regression": ratio > 1.0 + threshold,
+            }
+        )
+    return out
+
+
+def format_results(report: Dict[str, Any]) -> str:
+    lines = [f"commit={report.get('commit')} python={report.get('python')}"]
+    for row in report["results"]:
+        lines.append(
+            f"  {row['case']:<24} {row['param']}={row['size']:<6} "
+            f"min={row['min_us']:>11.3f}us median={row['median_us']:>11.3f}us"
+        )
+    return "\n".join(lines)
+
+
+def format_comparison(rows: List[Dict[str, Any]], baseline: Dict[str, Any]) -> str:
+    lines = [f"vs baseline commit={baseline.get('commit')}"]
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        lines.append(
+            f"  {row['case']:<24} size={row['size']:<6} {row['baseline_us']:>11.3f}us -> "
+            f"{row['current_us']:>11.3f}us  x{row['ratio']:.3f}{flag}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for ReACTOR hot paths")
+    parser.add_argument("--case", action="append", choices=sorted(MICRO_CASES), help="repeatable; default: all")
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per repeat")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", dest="json_path", help="write the results to this file")
+    parser.add_argument("--compare", dest="baseline", help="results file of a previous run")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    report = run_micro(args.case, min_time=args.min_time, repeat=args.repeat)
+    print(format_results(report))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(baseline, report, threshold=args.threshold)
+        print(format_comparison(rows, baseline))
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Replay recorded production requests (conf recording_config) through the graph offline.
+
+    python -m benchmarks.replay log/recordings/recording_20260101.log
+    python -m benchmarks.replay --latency-scale 0.5 --arrivals original --arrival-scale 0.1 --json replay.json
+
+LLM completions and agent responses are served from the recording: a call is matched on
+(node, prompt) / (agent, payload) first and falls back to the next unused call of the same
+node/agent in recorded order, so framework changes that alter prompts or payloads still
+replay. Each recorded call sleeps its original duration times --latency-scale; streamed
+agent events and planner chunks keep their recorded offsets.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import time
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from benchmarks.fakes import RequestContext, bind_request, current_request
+from benchmarks.stats import covered, summary_ms
+from conf.config import agent_config
+from runtime import AgentRuntime
+from Service import AgentReACTORPlanner
+from utils.call_llm import set_llm_backend
+from utils.logger import default_log_dir
+from utils.recorder import load_recordings
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+
+
+class _CallBook:
+    """Recorded calls of one request for one kind (LLM or agent), consumed at most once each."""
+
+    def __init__(self, items: List[Dict[str, Any]], name_key: str, body_key: str):
+        self._exact: Dict[Tuple[str, str], Deque[int]] = defaultdict(deque)
+        self._ordered: Dict[str, Deque[int]] = defaultdict(deque)
+        self._items = items
+        self._used: set = set()
+        for i, item in enumerate(items):
+            name = item.get(name_key) or ""
+            self._exact[(name, _canonical(item.get(body_key)))].append(i)
+            self._ordered[name].append(i)
+
+    def _pop(self, queue: Deque[int]) -> Optional[int]:
+        while queue:
+            i = queue.popleft()
+            if i not in self._used:
+                self._used.add(i)
+                return i
+        return None
+
+    def take(self, name: str, body: Any) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """(recorded call, exact match)."""
+        i = self._pop(self._exact.get((name, _canonical(body)), deque()))
+        if i is not None:
+            return self._items[i], True
+        i = self._pop(self._ordered.get(name, deque()))
+        return (self._items[i], False) if i is not None else (None, False)
+
+
+class _ReplayRequest:
+    def __init__(self, recording: Dict[str, Any]):
+        self.recording = recording
+        self.llm = _CallBook(recording.get("llm") or [], "node", "prompt")
+        self.agents = _CallBook(recording.get("agents") or [], "agent", "payload")
+        self.matches: Counter = Counter()
+
+
+class Replayer:
+    """LLM backend and agent endpoints serving one recorded request per RequestContext."""
+
+    def __init__(self, latency_scale: float = 1.0):
+        self.latency_scale = float(latency_scale)
+        self.requests: Dict[int, _ReplayRequest] = {}
+
+    def _request(self) -> Tuple[RequestContext, _ReplayRequest]:
+        ctx = current_request()
+        req = self.requests.get(ctx.index)
+        if req is None:
+            raise RuntimeError("replay call outside a replayed request")
+        return ctx, req
+
+    def _llm_call(self, prompt: str, node: str) -> Tuple[RequestContext, Dict[str, Any]]:
+        ctx, req = self._request()
+        ctx.calls[f"llm:{node}"] += 1
+        item, exact = req.llm.take(node, prompt)
+        if item is None and node == "planner" and req.recording.get("plan_string"):
+            # Production served this plan from the plan cache / SOP: no recorded planner call.
+            item, exact = {"completion": req.recording["plan_string"], "duration": 0.0}, False
+        if item is None:
+            req.matches["llm_missing"] += 1
+            raise RuntimeError(f"no recorded {node} completion left")
+        req.matches["llm_exact" if exact else "llm_fallback"] += 1
+        return ctx, item
+
+    # ---- LLM backend (utils.call_llm.set_llm_backend) ----
+
+    def complete(self, prompt: str, node: str = "default") -> str:
+        ctx, item = self._llm_call(prompt, node)
+        start = time.perf_counter()
+        time.sleep(float(item.get("duration") or 0.0) * self.latency_scale)
+        ctx.record(start, time.perf_counter(), f"llm:{node}")
+        return item.get("completion") or ""
+
+    async def acomplete(self, prompt: str, node: str = "default") -> str:
+        ctx, item = self._llm_call(prompt, node)
+        start = time.perf_counter()
+        try:
+            await asyncio.sleep(float(item.get("duration") or 0.0) * self.latency_scale)
+        finally:
+            ctx.record(start, time.perf_counter(), f"llm:{node}")
+        if item.get("completion") is None:
+            raise RuntimeError(f"recorded {node} call failed: {item.get('error')}")
+        return item["completion"]
+
+    async def astream(self, prompt: str, node: str = "default"):
+        ctx, item = self._llm_call(prompt, node)
+        chunks = item.get("chunks") or [[float(item.get("duration") or 0.0), item.get("completion") or ""]]
+        start = time.perf_counter()
+        try:
+            for offset, text in chunks:
+                await asyncio.sleep(max(0.0, start + float(offset) * self.latency_scale - time.perf_counter()))
+                yield text
+        finally:
+            ctx.record(start, time.perf_counter(), f"llm:{node}")
+
+    # ---- agents ('local' endpoints) ----
+
+    def agent(self, name: str):
+        async def _execute(payload: Dict[str, Any], trace=None, on_raw=None):
+            ctx, req = self._request()
+            ctx.calls[f"agent:{name}"] += 1
+            item, exact = req.agents.take(name, payload)
+            if item is None:
+                req.matches["agent_missing"] += 1
+                return {"status": "fail", "reason": f"no recorded response for {name}"}
+            req.matches["agent_exact" if exact else "agent_fallback"] += 1
+            start = time.perf_counter()
+            try:
+                for offset, raw in item.get("events") or []:
+                    await asyncio.sleep(max(0.0, start + float(offset) * self.latency_scale - time.perf_counter()))
+                    if on_raw is not None:
+                        on_raw(raw)
+                end = start + float(item.get("duration") or 0.0) * self.latency_scale
+                await asyncio.sleep(max(0.0, end - time.perf_counter()))
+            finally:
+                ctx.record(start, time.perf_counter(), f"agent:{name}")
+            error = item.get("error")
+            if error == "deadline exceeded":
+                raise asyncio.TimeoutError()
+            if error:
+                raise RuntimeError(f"recorded agent error: {error}")
+            return item.get("response")
+
+        return _execute
+
+
+def build_replay_planner(recordings: List[Dict[str, Any]], replayer: Replayer, *, plan_cache: bool = False) -> AgentReACTORPlanner:
+    """Production agent catalog (same planner prompts), every agent served by the replayer."""
+    names = list(agent_config)
+    streaming = set()
+    for rec in recordings:
+        for call in rec.get("agents") or []:
+            if call.get("agent") not in names:
+                names.append(call.get("agent"))
+            if call.get("events") is not None:
+                streaming.add(call.get("agent"))
+    config = {
+        name: {
+            "description": (agent_config.get(name) or {}).get("description", ""),
+            "endpoint": {"type": "local", "callable": replayer.agent(name)},
+        }
+        for name in names
+        if name
+    }
+    runtime = AgentRuntime(config)
+    for name in streaming:
+        runtime.agent_registry[name]["streaming"] = True
+    if not plan_cache:
+        runtime.plan_cache = None
+        runtime.plan_index = None
+    planner = AgentReACTORPlanner(runtime)
+    planner.recorder = None
+    return planner
+
+
+async def _run_one(planner: AgentReACTORPlanner, working_input: Dict[str, Any]) -> Tuple[bool, Optional[float]]:
+    """(ok, time to first final event for streaming requests)."""
+    if not working_input.get("is_streaming"):
+        resp = await planner.handle(working_input)
+        return bool(resp.get("result") or resp.get("pending_question")), None
+    state = planner._init_state(planner._ensure_working_input(working_input))
+    start = time.perf_counter()
+    first_final = None
+    ok = False
+    async for event in planner._stream_handle(state):
+        if event.get("event") == "final" and first_final is None:
+            first_final = time.perf_counter() - start
+            ok = True
+        if event.get("event") == "error":
+            ok = False
+    return ok, first_final
+
+
+def _arrival_offsets(recordings: List[Dict[str, Any]]) -> List[float]:
+    stamps = []
+    for rec in recordings:
+        try:
+            stamps.append(datetime.fromisoformat(str(rec.get("started_at"))).timestamp())
+        except ValueError:
+            stamps.append(None)
+    known = [s for s in stamps if s is not None]
+    t0 = min(known) if known else 0.0
+    return [(s - t0) if s is not None else 0.0 for s in stamps]
+
+
+async def replay(
+    recordings: List[Dict[str, Any]],
+    *,
+    latency_scale: float = 1.0,
+    arrivals: str = "closed",
+    arrival_scale: float = 1.0,
+    concurrency: int = 1,
+    plan_cache: bool = False,
+) -> Dict[str, Any]:
+    """
+    Replay recordings and compare with the recorded latencies.
+    arrivals="original" starts request i at its recorded start offset times arrival_scale
+    (production traffic shape); "closed" runs them through `concurrency` workers back to back.
+    """
+    replayer = Replayer(latency_scale)
+    planner = build_replay_planner(recordings, replayer, plan_cache=plan_cache)
+    previous = set_llm_backend(replayer)
+
+    rows: List[Dict[str, Any]] = []
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    offsets = _arrival_offsets(recordings)
+
+    async def _one(index: int, rec: Dict[str, Any]) -> None:
+        if arrivals == "original":
+            await asyncio.sleep(offsets[index] * arrival_scale)
+        ctx = RequestContext(index=index, rng=random.Random(index))
+        bind_request(ctx)
+        req = _ReplayRequest(rec)
+        replayer.requests[index] = req
+        guard = semaphore if arrivals != "original" else None
+        if guard is not None:
+            await guard.acquire()
+        start = time.perf_counter()
+        error = ""
+        try:
+            ok, first_final = await _run_one(planner, dict(rec.get("working_input") or {}))
+        except Exception as exc:
+            ok, first_final, error = False, None, repr(exc)
+        finally:
+            if guard is not None:
+                guard.release()
+        end = time.perf_counter()
+        rows.append(
+            {
+                "request_id": rec.get("request_id"),
+                "ok": ok,
+                "error": error,
+                "recorded_s": rec.get("duration"),
+                "replay_s": round(end - start, 6),
+                "overhead_s": round((end - start) - covered(ctx.intervals, start, end), 6),
+                "first_final_s": first_final,
+                "matches": dict(req.matches),
+            }
+        )
+
+    await planner.startup()
+    try:
+        wall_start = time.perf_counter()
+        await asyncio.gather(*[_one(i, rec) for i, rec in enumerate(recordings)])
+        wall = time.perf_counter() - wall_start
+    finally:
+        set_llm_backend(previous)
+        await planner.shutdown()
+
+    matches: Counter = Counter()
+    for row in rows:
+        matches.update(row["matches"])
+    recorded = [r["recorded_s"] * latency_scale for r in rows if isinstance(r.get("recorded_s"), (int, float))]
+    return {
+        "requests": len(rows),
+        "failures": sum(1 for r in rows if not r["ok"]),
+        "latency_scale": latency_scale,
+        "arrivals": arrivals,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(rows) / wall, 3) if wall > 0 else None,
+        "recorded_ms": summary_ms(recorded),
+        "replay_ms": summary_ms([r["replay_s"] for r in rows]),
+        "overhead_ms": summary_ms([r["overhead_s"] for r in rows]),
+        "first_final_ms": summary_ms([r["first_final_s"] for r in rows if r["first_final_s"] is not None]),
+        "matches": dict(matches),
+        "rows": rows,
+    }
+
+
+def format_replay(report: Dict[str, Any]) -> str:
+    def _p(item: Dict[str, Any]) -> str:
+        return f"p50={item['p50']} p95={item['p95']} p99={item['p99']} (n={item['count']})"
+
+    return "\n".join(
+        [
+            f"== replay requests={report['requests']} failures={report['failures']} "
+            f"latency_scale={report['latency_scale']} arrivals={report['arrivals']} "
+            f"throughput={report['throughput_rps']} rps",
+            f"   recorded ms (scaled) {_p(report['recorded_ms'])}",
+            f"   replay ms            {_p(report['replay_ms'])}",
+            f"   overhead ms          {_p(report['overhead_ms'])}",
+            f"   first final ms       {_p(report['first_final_ms'])}",
+            f"   matches              {report['matches']}",
+        ]
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay recorded LLM/agent interactions through the graph")
+    parser.add_argument("paths", nargs="*", help="recording files (default: log/recordings/recording_*.log)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiply recorded call durations")
+    parser.add_argument("--arrivals", choices=["closed", "original"], default="closed")
+    parser.add_argument("--arrival-scale", type=float, default=1.0, help="multiply recorded inter-arrival times")
+    parser.add_argument("--concurrency", type=int, default=1, help="workers for --arrivals closed")
+    parser.add_argument("--limit", type=int, default=0, help="replay at most this many requests")
+    parser.add_argument("--plan-cache", action="store_true", help="keep plan cache / similarity reuse enabled")
+    parser.add_argument("--json", dest="json_path", help="write the report to this file")
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob.glob(os.path.join(default_log_dir(), "recordings", "recording_*.log")))
+    recordings = list(load_recordings(paths))
+    if args.limit:
+        recordings = recordings[: args.limit]
+    if not recordings:
+        raise SystemExit(f"no recordings found in {paths or 'log/recordings'}")
+
+    report = asyncio.run(
+        replay(
+            recordings,
+            latency_scale=args.latency_scale,
+            arrivals=args.arrivals,
+            arrival_scale=args.arrival_scale,
+            concurrency=args.concurrency,
+            plan_cache=args.plan_cache,
+        )
+    )
+    print(format_replay(report))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+def _call(agent: str, summary: str) -> str:
+    return json.dumps({"agent": agent, "input": "$WORKING_INPUT", "summary": summary}, ensure_ascii=False)
+
+
+def _plan(*lines: str) -> str:
+    return "\n".join(lines)
+
+
+_DEFAULT_AGENT = {"latency": {"kind": "lognormal", "p50": 0.3, "p99": 1.0}, "error_rate": 0.0}
+
+
+@dataclass
+class Scenario:
+    """
+    One benchmark workload.
+    turns: working_input of each turn; from the second turn on, sop_runtime/slots returned by
+    the previous turn are carried over (AskUser resume).
+    plan: planner completion returned by the fake LLM (None for SOP-only scenarios).
+    evaluator_fail_first: the evaluator answers FAIL for the first n evaluations of a request.
+    expected_calls: agent name -> calls every request must make (over all its turns); checked
+    by the harness so a scenario that stops reaching its agents fails instead of timing nothing.
+    """
+
+    name: str
+    description: str
+    turns: List[Dict[str, Any]]
+    plan: Optional[str] = None
+    agents: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    sop_paths: List[str] = field(default_factory=list)
+    evaluator_fail_first: int = 0
+    expected_calls: Dict[str, int] = field(default_factory=dict)
+
+
+SCENARIOS: Dict[str, Scenario] = {}
+
+
+def register(scenario: Scenario) -> Scenario:
+    SCENARIOS[scenario.name] = scenario
+    return scenario
+
+
+register(
+    Scenario(
+        name="single_serial",
+        description="one SerialCallAgent + FinalOutput",
+        turns=[{"query": "看下我的账户余额"}],
+        plan=_plan(
+            f"Plan:查询余额 | #E1 = SerialCallAgent['{_call('account_balance', '查询账户余额')}']",
+            "Plan:将最终结果直接输出给用户 | #E2 = FinalOutput['#E1']",
+        ),
+        agents={"account_balance": _DEFAULT_AGENT},
+        expected_calls={"account_balance": 1},
+    )
+)
+
+register(
+    Scenario(
+        name="split_serial",
+        description="SplitQuery + two dependent serial calls with AppendHistory",
+        turns=[{"query": "看看我的账户余额，给我推荐个符合我标准的理财"}],
+        plan=_plan(
+            "Plan:拆分为两个子任务 | #E1 = SplitQuery['看看我的账户余额','给我推荐个符合我标准的理财']",
+            f"Plan:执行子任务1 | #E2 = SerialCallAgent['{_call('account_balance', '查询账户余额')}']",
+            "Plan:将子任务1结果写入历史 | #E3 = AppendHistory['#E2']",
+            f"Plan:执行子任务2 | #E4 = SerialCallAgent['{_call('product_recommendation', '推荐理财产品')}']",
+            "Plan:将最终结果直接输出给用户 | #E5 = FinalOutput['#E4']",
+        ),
+        agents={"account_balance": _DEFAULT_AGENT, "product_recommendation": _DEFAULT_AGENT},
+        expected_calls={"account_balance": 1, "product_recommendation": 1},
+    )
+)
+
+register(
+    Scenario(
+        name="parallel_fanout",
+        description="SplitQuery + ParallelCallAgent over three agents",
+        turns=[{"query": "看下我的账户情况、市场热点和我的持仓"}],
+        plan=_plan(
+            "Plan:拆分为三个子任务 | #E1 = SplitQuery['看下我的账户情况','现在市场上的热点','我的持仓']",
+            "Plan:并行执行全部子任务 | #E2 = ParallelCallAgent['["
+            + ",".join(
+                [
+                    _call("account_balance", "查询账户"),
+                    _call("market_hotspot", "查询市场热点"),
+                    _call("portfolio", "查询持仓"),
+                ]
+            )
+            + "]']",
+            "Plan:将最终结果直接输出给用户 | #E3 = FinalOutput['#E2']",
+        ),
+        agents={"account_balance": _DEFAULT_AGENT, "market_hotspot": _DEFAULT_AGENT, "portfolio": _DEFAULT_AGENT},
+        expected_calls={"account_balance": 1, "market_hotspot": 1, "portfolio": 1},
+    )
+)
+
+register(
+    Scenario(
+        name="sop_hit",
+        description="query matches an SOP whose slots are already filled: no planner LLM call",
+        turns=[{"query": "帮我转账5000元"}],
+        agents={"transfer_service": _DEFAULT_AGENT},
+        sop_paths=["sops/bench_transfer.yaml"],
+        expected_calls={"transfer_service": 1},
+    )
+)
+
+register(
+    Scenario(
+        name="askuser_resume",
+        description="SOP asks for a missing slot, the next turn answers and resumes the SOP",
+        turns=[{"query": "我要转账"}, {"query": "5000元"}],
+        agents={"transfer_service": _DEFAULT_AGENT},
+        sop_paths=["sops/bench_transfer.yaml"],
+        expected_calls={"transfer_service": 1},
+    )
+)
+
+register(
+    Scenario(
+        name="replan_loop",
+        description="evaluator rejects the first answer, one replan round then PASS",
+        turns=[{"query": "看下我的账户余额"}],
+        plan=_plan(
+            f"Plan:查询余额 | #E1 = SerialCallAgent['{_call('account_balance', '查询账户余额')}']",
+            "Plan:将最终结果直接输出给用户 | #E2 = FinalOutput['#E1']",
+        ),
+        agents={"account_balance": _DEFAULT_AGENT},
+        evaluator_fail_first=1,
+        expected_calls={"account_balance": 2},
+    )
+)
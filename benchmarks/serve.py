@@ -0,0 +1,81 @@
+"""
+Run the real Service.py app for load tests: agents point at a running agent farm and
+the LLM is the scripted FakeLLM, so only HTTP/SSE handling and agent I/O are real.
+
+    python -m benchmarks.serve --port 8080 --farm http://127.0.0.1:9100
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import random
+
+import uvicorn
+
+import Service
+from benchmarks.agent_farm import farm_agent_config
+from benchmarks.fakes import FakeLLM, RequestContext, bind_request
+from runtime import AgentRuntime
+from utils.call_llm import set_llm_backend
+
+
+def _call(agent: str, summary: str) -> dict:
+    return {"agent": agent, "input": "$WORKING_INPUT", "summary": summary}
+
+
+# http + http_async in parallel, then the streaming agent feeds FinalOutput.
+FARM_PLAN = "\n".join(
+    [
+        "Plan:并行查询 | #E1 = ParallelCallAgent['"
+        + json.dumps([_call("farm_http", "同步查询"), _call("farm_async", "异步查询")], ensure_ascii=False)
+        + "']",
+        f"Plan:流式查询 | #E2 = SerialCallAgent['{json.dumps(_call('farm_stream', '流式查询'), ensure_ascii=False)}']",
+        "Plan:将最终结果直接输出给用户 | #E3 = FinalOutput['#E2']",
+    ]
+)
+
+
+def _script(prompt: str, node: str, ctx: RequestContext) -> str:
+    if node == "planner":
+        return FARM_PLAN
+    if node == "evaluator":
+        return json.dumps({"decision": "PASS", "hint": ""})
+    return "压测摘要：已根据证据完成回答。"
+
+
+def install(farm_url: str, *, llm_latency_ms: float = 0.0, seed: int = 0) -> None:
+    """Swap Service.planner for one wired to the farm and the fake LLM."""
+    runtime = AgentRuntime(farm_agent_config(farm_url))
+    # Every request should exercise planning and agent I/O.
+    runtime.plan_cache = None
+    runtime.plan_index = None
+    Service.planner = Service.AgentReACTORPlanner(runtime)
+
+    latency = {"default": {"kind": "fixed", "value": llm_latency_ms / 1000.0}}
+    set_llm_backend(FakeLLM(_script, latency))
+
+    counter = itertools.count()
+
+    @Service.app.middleware("http")
+    async def _bind_request(request, call_next):
+        index = next(counter)
+        bind_request(RequestContext(index=index, rng=random.Random(f"{seed}:{index}")))
+        return await call_next(request)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve Service.app against the benchmark agent farm")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--farm", default="http://127.0.0.1:9100", help="agent farm base URL")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="fixed latency of every fake LLM call")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    install(args.farm, llm_latency_ms=args.llm_latency_ms, seed=args.seed)
+    uvicorn.run(Service.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(q * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summary_ms(samples: List[float]) -> Dict[str, Any]:
+    """count/mean/p50/p95/p99 of samples in seconds, reported in milliseconds."""
+
+    def _ms(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        "count": len(samples),
+        "mean": _ms(sum(samples) / len(samples)) if samples else None,
+        "p50": _ms(percentile(samples, 0.50)),
+        "p95": _ms(percentile(samples, 0.95)),
+        "p99": _ms(percentile(samples, 0.99)),
+    }
+
+
+def covered(intervals: List[Tuple[float, float, str]], start: float, end: float) -> float:
+    """Length of the union of fake (LLM/agent) intervals inside [start, end]."""
+    spans = sorted((max(s, start), min(e, end)) for s, e, _ in intervals if e > start and s < end)
+    total = 0.0
+    cur_s, cur_e = None, None
+    for s, e in spans:
+        if cur_e is None or s > cur_e:
+            if cur_e is not None:
+                total += cur_e - cur_s
+            cur_s, cur_e = s, e
+        else:
+            cur_e = max(cur_e, e)
+    if cur_e is not None:
+        total += cur_e - cur_s
+    return total
@@ -3,30 +3,133 @@ github_api_key = ""
 agent_config = {
     'life_service' : {
         'description':'',
+        # Optional isolation: max concurrent calls, waiting calls and a dedicated thread pool.
+        'bulkhead':{'max_in_flight':16,'max_queue':32,'queue_timeout':2,'thread_pool_size':16},
+        'circuit_breaker':{'window_s':30,'min_calls':10,'error_rate':0.5,'slow_call_s':10,'slow_rate':0.8,'open_s':15},
         'endpoint':{
             'type':'http',
             'url':'',
             'timeout':20,
-            'headers':{}
+            'headers':{},
+            'pool':{'max_connections':20,'max_keepalive':10,'keepalive_expiry':30,'http2':False,'warmup':1}
         }
         },
     'finance_service' : {
         'description':'',
+        'bulkhead':{'max_in_flight':16,'max_queue':32,'queue_timeout':2,'thread_pool_size':16},
+        'circuit_breaker':{'window_s':30,'min_calls':10,'error_rate':0.5,'slow_call_s':10,'slow_rate':0.8,'open_s':15},
         'endpoint':{
             'type':'http',
             'url':'',
             'timeout':20,
-            'headers':{}
+            'headers':{},
+            'pool':{'max_connections':20,'max_keepalive':10,'keepalive_expiry':30,'http2':False,'warmup':1}
         }
     },
     'chart_service': {
         'description': '',
+        'bulkhead': {'max_in_flight': 16, 'max_queue': 32, 'queue_timeout': 2, 'thread_pool_size': 16},
+        'circuit_breaker': {'window_s': 30, 'min_calls': 10, 'error_rate': 0.5, 'slow_call_s': 10, 'slow_rate': 0.8, 'open_s': 15},
+        # Hedged requests are only sent for idempotent agents.
+        'idempotent': True,
+        'hedge': {'enabled': True, 'quantile': 0.95, 'min_delay': 0.2, 'max_delay': 5},
+        # Cache successful responses for a few minutes. Off by default: answers are per customer,
+        # so identity_fields must name payload fields that identify the caller (payloads
+        # without them are never cached); key_fields add the question and its context.
+        'cache': {'enabled': False, 'ttl': 300, 'max_entries': 1024,
+                  'identity_fields': ['customer_no'], 'key_fields': ['query', 'slots', 'history']},
         'endpoint': {
             'type': 'http',
             'url': '',
             'timeout': 20,
-            'headers': {}
+            'headers': {},
+            'pool': {'max_connections': 20, 'max_keepalive': 10, 'keepalive_expiry': 30, 'http2': False, 'warmup': 1}
         }
     },
 
 }
+
+service_config = {
+    # Default end-to-end budget per request (seconds); working_input.timeout_s overrides it.
+    'request_timeout_s': 60,
+    # Answer turns whose SOP plan is only an AskUser straight from the compiled SOP,
+    # without running the graph (no planner/evaluator LLM calls).
+    'sop_fast_lane': True,
+}
+
+llm_config = {
+    # Pooled HTTP client shared by all async LLM calls.
+    'max_connections': 64,
+    'max_keepalive': 32,
+    'keepalive_expiry': 30,
+    # In-flight LLM calls across the process (0 = unbounded) and per graph node.
+    'max_concurrency': 32,
+    'node_concurrency': {'planner': 16, 'evaluator': 8, 'solver': 8},
+    # Client-side retries per LLM call; every attempt gets the full remaining budget.
+    'max_retries': 0,
+}
+
+planner_config = {
+    # Stream the planner completion and start the first dependency-free agent call as soon
+    # as its line is parsed, overlapping planner latency with that call.
+    'streaming': False,
+    # Reuse planner output for identical (normalized) tasks under the same agent/SOP catalogs.
+    # disk_path enables a SQLite tier that survives restarts; prewarm_from_logs loads plans
+    # recorded by ReACTORLogger at startup.
+    'plan_cache': {
+        'enabled': True,
+        'ttl': 3600,
+        'max_entries': 2048,
+        'disk_path': None,
+        'prewarm_from_logs': False,
+    },
+    # Reuse a plan that passed the evaluator for a paraphrased task (char n-gram TF-IDF cosine).
+    # Only single-task plans whose agent inputs come from $WORKING_INPUT are indexed.
+    'plan_similarity': {
+        'enabled': True,
+        'threshold': 0.85,
+        'max_entries': 200000,
+        'ngram_range': [1, 3],
+    },
+}
+
+solver_config = {
+    # Generate the summary concurrently with the evaluator LLM; kept on PASS, discarded otherwise.
+    'speculative_summary': True,
+}
+
+evidence_config = {
+    # Token budgets for step results rendered into prompts (see utils/evidence.py).
+    'default_budget': 2000,
+    'budgets': {
+        'evaluator': 1500,
+        'evaluator_answer': 1000,
+        'solver': 3000,
+        'replanner': 400,
+    },
+}
+
+recording_config = {
+    # Record every LLM prompt/completion and agent payload/response with timings, one JSONL
+    # line per request under dir (default log/recordings); replay with `python -m benchmarks.replay`.
+    'enabled': False,
+    'dir': None,
+    'sample_rate': 1.0,
+}
+
+session_config = {
+    # Server-side multi-turn state keyed by working_input.session_id: history, slots, SOP cursor,
+    # pending question and the last turn's step results. Fields the request carries win.
+    'enabled': False,
+    'backend': 'memory',  # memory | sqlite | redis
+    'ttl': 86400,
+    'max_entries': 10000,  # memory
+    'path': None,  # sqlite file, default log/sessions.sqlite
+    'url': None,  # redis, default redis://127.0.0.1:6379/0
+    'max_history': 40,
+}
+
+worker_config = {
+    # Run independent plan steps concurrently (dependency graph over #E refs / AppendHistory).
+    'dag_scheduler': True,
+}
@@ -4,6 +4,10 @@ BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 
 sop_config = {
     "base_dir": BASE_DIR,
+    # Compiled SOPs are pickled here (keyed by path, mtime and sha256) so warm starts skip YAML parsing.
+    "cache_dir": None,
+    # Seconds between checks for changed SOP files (0 = off); POST /admin/sops/reload reloads on demand.
+    "watch_interval": 0,
     "sops": [
         {
             "path": "sop/mock_sop.yaml",
@@ -9,21 +9,25 @@ from typing import Any, Dict
 from langgraph.graph import StateGraph, START, END
 
 from State import ReACTOR
-from node.planner import run_planner
-from node.worker import run_worker_async
-from node.evaluator import run_evaluator
-from node.replanner import run_replanner
-from node.solver import summary_plan_and_results, compose_output
+from conf.config import worker_config
+from nodes.planner import run_planner
+from nodes.scheduler import run_scheduler_async
+from nodes.worker import run_worker_async
+from nodes.evaluator import run_evaluator
+from nodes.replanner import run_replanner
+from nodes.solver import summary_plan_and_results, compose_output, acompose_output
 from runtime import AgentRuntime
 from utils.ReACTORTracer import TraceCollector
+from utils.deadline import expired
 from utils.logger import ReACTORLogger
 
 
 class AgentReACTORPlanner:
-    def __init__(self):
-        self.runtime = AgentRuntime()
+    def __init__(self, runtime: AgentRuntime | None = None):
+        self.runtime = runtime if runtime is not None else AgentRuntime()
         self.logger = ReACTORLogger()
         self.evaluator_enabled = True
+        self.dag_scheduler_enabled = bool(worker_config.get("dag_scheduler", True))
         self.graph = self.build_graph()
 
     def set_evaluator(self, enabled: bool = True):
@@ -33,7 +37,13 @@ class AgentReACTORPlanner:
     async def run_planner_async(self, state: ReACTOR):
         return await self._run_with_log_async("planner", run_planner, state)
 
+    def set_dag_scheduler(self, enabled: bool = True):
+        self.dag_scheduler_enabled = bool(enabled)
+        return self
+
     async def run_worker_async(self, state: ReACTOR):
+        if self.dag_scheduler_enabled:
+            return await self._run_with_log_async("scheduler", run_scheduler_async, state)
         execution = self.runtime.ensure_execution(state)
         steps = execution.steps
         idx = execution.idx
@@ -58,6 +68,9 @@ class AgentReACTORPlanner:
     def compose_output(self, state: ReACTOR, *, streaming: bool = False):
         return compose_output(state, self.runtime, streaming=streaming)
 
+    async def acompose_output(self, state: ReACTOR, *, streaming: bool = False):
+        return await acompose_output(state, self.runtime, streaming=streaming)
+
     def _summarize_execution(self, state: ReACTOR) -> Dict[str, Any]:
         execution = self.runtime.ensure_execution(state)
         steps = execution.steps
@@ -131,6 +144,8 @@ class AgentReACTORPlanner:
         if name == "planner" and isinstance(patch, dict):
             event["plan_string"] = patch.get("plan_string", "")
             event["reasoning_overview"] = patch.get("reasoning_overview", "")
+            event["plan_source"] = patch.get("plan_source")
+            event["plan_cache_key"] = patch.get("plan_cache_key")
         self._log_event(event)
         duration_s = round(duration_ms / 1000.0, 3)
         print(f"[node:{name}] duration_s={duration_s}s")
@@ -160,6 +175,9 @@ class AgentReACTORPlanner:
     def _how_end(self, state: ReACTOR):
         if state.get("eval_status") in ("DONE", "FAILED"):
             next_node = "END"
+        elif expired(state):
+            # No budget left for another plan; Service returns the best available result.
+            next_node = "END"
         else:
             next_node = "replanner"
         print(f"[route] evaluator -> {next_node} (eval_status={state.get('eval_status')})")
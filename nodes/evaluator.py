@@ -7,7 +7,10 @@ from typing import Any, Dict
 from State import ReACTOR
 from runtime import AgentRuntime
 from prompt.evaluator_prompt import reactor_evaluator_prompt
-from utils.call_llm import execute_react_agent
+from utils.call_llm import aexecute_react_agent
+from nodes.solver import start_speculative_summary
+from utils.deadline import expired, remaining
+from utils.evidence import budget_for, build_evidence, compact_text, truncate_tokens
 
 
 def _apply_external_hook(state: ReACTOR, runtime: AgentRuntime, output: Any) -> Dict[str, Any]:
@@ -24,13 +27,6 @@ def _apply_external_hook(state: ReACTOR, runtime: AgentRuntime, output: Any) ->
     return {}
 
 
-def _safe_json_dumps(obj: Any) -> str:
-    try:
-        return json.dumps(obj, ensure_ascii=False, indent=2)
-    except Exception:
-        return str(obj)
-
-
 def _parse_eval_result(text: str) -> Dict[str, str]:
     try:
         data = json.loads(text)
@@ -49,7 +45,30 @@ def _parse_eval_result(text: str) -> Dict[str, str]:
     return {"decision": "FAIL", "hint": "评估输出无法解析"}
 
 
-def run_evaluator(state: ReACTOR, runtime: AgentRuntime) -> Dict:
+async def _index_plan(state: ReACTOR, runtime: AgentRuntime) -> None:
+    """Make a plan that passed evaluation available for similarity reuse."""
+    if runtime.plan_index is None or state.get("plan_source") not in ("llm", "cache", "similar"):
+        return
+    execution = runtime.ensure_execution(state)
+    await runtime.plan_index.aadd(
+        state.get("task") or "",
+        state.get("plan_string") or "",
+        execution.steps,
+        runtime.catalog_fingerprint,
+    )
+
+
+async def _commit_summary(state: ReACTOR, speculative) -> None:
+    if speculative is None:
+        return
+    try:
+        state["summary_cache"] = await speculative
+    except Exception as exc:
+        # The solver will generate the summary again on the normal path.
+        print(f"[evaluator] speculative summary failed: {exc!r}")
+
+
+async def run_evaluator(state: ReACTOR, runtime: AgentRuntime) -> Dict:
     if state.get("sop_runtime", {}).get("active"):
         return state
 
@@ -57,6 +76,18 @@ def run_evaluator(state: ReACTOR, runtime: AgentRuntime) -> Dict:
     results = execution.results
     replan = runtime.ensure_replan(state)
 
+    if expired(state):
+        # Out of budget: no evaluation LLM and no replan, return what we have.
+        has_ok = any(
+            (res.status if is_dataclass(res) else (res or {}).get("status")) == "ok"
+            for res in (results or {}).values()
+        )
+        state["eval_status"] = "DONE" if has_ok else "FAILED"
+        state["evaluator_hint"] = "request deadline exceeded"
+        state["trace"].add_text("处理时间已达上限，正在为您返回当前结果")
+        state["replan"] = replan
+        return state
+
     if state.get("eval_status") == "NEED_REPLAN":
         if not replan.last_failure:
             replan.last_failure = state.get("evaluator_hint") or "agent returned error"
@@ -80,7 +111,13 @@ def run_evaluator(state: ReACTOR, runtime: AgentRuntime) -> Dict:
             output = None
             error = None
 
-        def _mark_replan(reason: str) -> None:
+        async def _mark_replan(reason: str) -> None:
+            # The plan itself was judged wrong: do not serve it from the plan cache again.
+            cache_key = state.get("plan_cache_key")
+            if cache_key and runtime.plan_cache is not None:
+                await runtime.plan_cache.ainvalidate(cache_key)
+            if state.get("plan_template") and runtime.plan_index is not None:
+                await runtime.plan_index.aremove(state["plan_template"])
             state["eval_status"] = "NEED_REPLAN"
             if reason and not replan.last_failure:
                 replan.last_failure = reason
@@ -102,27 +139,44 @@ def run_evaluator(state: ReACTOR, runtime: AgentRuntime) -> Dict:
                     or hook_result.get("reason")
                     or "external evaluator rejected result"
                 )
-                _mark_replan(str(hint))
+                await _mark_replan(str(hint))
             else:
                 task = state.get("task") or state.get("working_input", {}).get("query", "")
-                evidence = _safe_json_dumps(runtime.results_to_plain(results))
-                answer = _safe_json_dumps(output)
+                evidence = build_evidence(results, node="evaluator", skip=[last_key])
+                answer = truncate_tokens(compact_text(output), budget_for("evaluator_answer"))
 
                 prompt = reactor_evaluator_prompt.format(
                     task=task,
                     answer=answer,
                     evidence=evidence,
                 )
-                eval_text = execute_react_agent(prompt=prompt)
+                speculative = start_speculative_summary(state, runtime)
+                try:
+                    eval_text = await aexecute_react_agent(prompt, node="evaluator", timeout=remaining(state))
+                except Exception:
+                    if not expired(state):
+                        if speculative is not None:
+                            speculative.cancel()
+                        raise
+                    # Budget ran out while judging: accept the current answer.
+                    eval_text = '{"decision":"PASS","hint":""}'
+                except BaseException:
+                    if speculative is not None:
+                        speculative.cancel()
+                    raise
                 parsed = _parse_eval_result(eval_text)
                 decision = parsed.get("decision", "").upper()
                 if decision == "PASS":
+                    await _index_plan(state, runtime)
+                    await _commit_summary(state, speculative)
                     state["eval_status"] = "DONE"
                     state["evaluator_hint"] = ""
                     state["trace"].add_text("评估通过，正在为您整合答案")
                 else:
+                    if speculative is not None:
+                        speculative.cancel()
                     hint = parsed.get("hint") or "评估未通过"
-                    _mark_replan(hint)
+                    await _mark_replan(hint)
         if status is None and output is None and error is None:
             state["eval_status"] = "DONE"
             state["evaluator_hint"] = ""
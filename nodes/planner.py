@@ -1,60 +1,145 @@
 from __future__ import annotations
 
-import json
-from typing import Dict
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
 
 from State import ExecutionState, ReACTOR
+from conf.config import planner_config
+from nodes.worker import _call_agent, prefetch_route
 from prompt.planner_prompt import reactor_planner_prompt
 from runtime import AgentRuntime
-from utils.call_llm import execute_react_agent
-from utils.parse_plan import parse_plan_str
+from utils.call_llm import aexecute_react_agent, astream_react_agent
+from utils.deadline import remaining
+from utils.parse_plan import PlanStreamParser, parse_plan_str, split_queries
+from utils.plan_cache import make_plan_key
+from utils.plan_index import instantiate_plan
 from utils.sop_engine import build_plan_from_sop
 
 
-def run_planner(state: ReACTOR, runtime: AgentRuntime) -> Dict:
-    task = state["task"]
+async def _stream_plan(prompt: str, state: ReACTOR, runtime: AgentRuntime) -> Tuple[str, Dict[str, Dict[str, Any]]]:
+    """
+    Stream the planner completion and parse it line by line. The first agent call that needs
+    nothing from later lines is started right away; the worker picks up its result.
+    """
+    parser = PlanStreamParser()
+    prefetched: Dict[str, Dict[str, Any]] = {}
+    candidate = True
+
+    def _on_steps(new_steps: List[tuple]) -> None:
+        nonlocal candidate
+        offset = len(parser.steps) - len(new_steps)
+        for k, step in enumerate(new_steps):
+            if not candidate:
+                return
+            i = offset + k
+            if step[2] == "SplitQuery":
+                continue
+            candidate = False
+            route = prefetch_route(state, runtime, parser.steps, i)
+            if route is None:
+                return
+            step_var = step[1]
+            print(f"[planner] prefetch {step_var} agent={route['agent']} while planning")
+            task = asyncio.ensure_future(
+                _call_agent(runtime, route["agent"], route["payload"], remaining(state))
+            )
+            prefetched[step_var] = dict(route, task=task)
+
+    try:
+        async for chunk in astream_react_agent(prompt, node="planner", timeout=remaining(state)):
+            _on_steps(parser.feed(chunk))
+        _on_steps(parser.close())
+    except BaseException:
+        for item in prefetched.values():
+            item["task"].cancel()
+        raise
+    return parser.text.strip(), prefetched
+
+
+def select_sop(state: ReACTOR, runtime: AgentRuntime, sop_registry=None) -> Optional[Dict[str, Any]]:
+    """The SOP this turn follows: the active one, else one matching the task, else the latest user turn."""
     sop_runtime = state.get("sop_runtime") or {}
     active_sop_id = sop_runtime.get("active_sop_id")
-    sop_match = None
-    if active_sop_id and active_sop_id in runtime.sop_registry:
-        sop_match = runtime.sop_registry.get(active_sop_id)
-    if sop_match is None:
-        sop_match = runtime.match_sop(task)
+    if sop_registry is None:
+        sop_registry = runtime.sop_registry
+    if active_sop_id and active_sop_id in sop_registry:
+        return sop_registry.get(active_sop_id)
+    sop_match = runtime.match_sop(state["task"], sop_registry)
     if sop_match is None:
         history = state.get("working_input", {}).get("history") or []
         for item in reversed(history):
             if isinstance(item, dict) and item.get("role") == "user":
-                cand = runtime.match_sop(item.get("content", ""))
+                cand = runtime.match_sop(item.get("content", ""), sop_registry)
                 if cand is not None:
-                    sop_match = cand
-                    break
-    if sop_match:
-        return build_plan_from_sop(sop_match, state)
+                    return cand
+    return sop_match
+
+
+async def run_planner(state: ReACTOR, runtime: AgentRuntime) -> Dict:
+    task = state["task"]
+    # One snapshot per turn: SOP matching, the prompt catalog and cache keys all see the same SOPs.
+    sops = runtime.sops
+    selected = state.get("sop_plan")
+    if selected and selected.get("fingerprint") == sops.fingerprint:
+        # Service's SOP fast lane already matched (and planned) this turn on the same SOPs.
+        patch = selected.get("patch")
+    else:
+        sop_match = select_sop(state, runtime, sops.registry)
+        patch = build_plan_from_sop(sop_match, state) if sop_match else None
+    if patch:
+        patch = dict(patch, plan_source="sop", plan_cache_key=None, plan_template=None, sop_plan=None)
+        return patch
 
     replan_hint = runtime.build_replan_hint(state)
     agent_catalog = runtime.agent_catalog
-    sop_catalog = runtime.sop_catalog
-    prompt = reactor_planner_prompt.format(
-        task=task,
-        replan_hint=replan_hint,
-        agent_catalog=agent_catalog,
-        sop_catalog=sop_catalog,
-    )
+    sop_catalog = sops.catalog
+
+    plan_cache = runtime.plan_cache
+    cache_key = None
+    cached = None
+    if plan_cache is not None:
+        cache_key = make_plan_key(task, sops.fingerprint, replan_hint)
+        cached = await plan_cache.aget(cache_key)
+
+    similar = None
+    if cached is None and runtime.plan_index is not None and not runtime.ensure_replan(state).count:
+        similar = await runtime.plan_index.alookup(task, sops.fingerprint)
+
+    plan_template = None
+    prefetched: Dict[str, Dict[str, Any]] = {}
+    if cached is not None:
+        plan_str = cached["plan_string"]
+        steps = list(cached["steps"])
+        _, reasoning_overview = parse_plan_str(plan_str)
+        plan_source = "cache"
+    elif similar is not None:
+        plan_str, steps, reasoning_overview = instantiate_plan(similar, task, parse_plan_str)
+        plan_source = "similar"
+        plan_template = similar["task"]
+        print(f"[planner] reuse plan of similar task ({similar['score']}): {plan_template}")
+        if plan_cache is not None:
+            await plan_cache.aput(cache_key, plan_str, steps)
+    else:
+        prompt = reactor_planner_prompt.format(
+            task=task,
+            replan_hint=replan_hint,
+            agent_catalog=agent_catalog,
+            sop_catalog=sop_catalog,
+        )
 
-    plan_str = execute_react_agent(prompt=prompt)
-    steps, reasoning_overview = parse_plan_str(plan_str)
+        if planner_config.get("streaming"):
+            plan_str, prefetched = await _stream_plan(prompt, state, runtime)
+        else:
+            plan_str = await aexecute_react_agent(prompt, node="planner", timeout=remaining(state))
+        steps, reasoning_overview = parse_plan_str(plan_str)
+        plan_source = "llm"
+        if plan_cache is not None:
+            await plan_cache.aput(cache_key, plan_str, steps)
 
     pending_queries = []
     for plan_text, step_var, tool_tag, tool_input in steps:
         if tool_tag == "SplitQuery":
-            if isinstance(tool_input, str):
-                try:
-                    queries = json.loads(tool_input)
-                except Exception:
-                    queries = [q.strip() for q in tool_input.split(",")]
-            else:
-                queries = list(tool_input)
-            pending_queries.extend(queries)
+            pending_queries.extend(split_queries(tool_input))
 
     if not pending_queries:
         pending_queries = [state["working_input"]["query"]]
@@ -62,11 +147,16 @@ def run_planner(state: ReACTOR, runtime: AgentRuntime) -> Dict:
     return {
         "plan_string": plan_str,
         "reasoning_overview": reasoning_overview,
+        "plan_source": plan_source,
+        "plan_cache_key": cache_key if steps else None,
+        "plan_template": plan_template,
         "execution": ExecutionState(
             steps=steps,
             results={},
             idx=0,
+            prefetched=prefetched,
         ),
         "pending_queries": pending_queries,
         "active_query": None,
+        "sop_plan": None,
     }
@@ -3,10 +3,11 @@ from __future__ import annotations
 from typing import Dict
 
 from State import ExecutionState, ReACTOR
+from nodes.worker import cancel_prefetched
 from runtime import AgentRuntime
 
 
-def run_replanner(state: ReACTOR, runtime: AgentRuntime) -> Dict:
+async def run_replanner(state: ReACTOR, runtime: AgentRuntime) -> Dict:
     raw_input = state.get("raw_input")
     if not isinstance(raw_input, dict):
         raw_input = state.get("working_input") or {}
@@ -27,6 +28,7 @@ def run_replanner(state: ReACTOR, runtime: AgentRuntime) -> Dict:
         replan.max_iteration_limit = raw_input.get("recursion_limit", 10)
     replan.last_plan = state.get("plan_string", "")
     execution = runtime.ensure_execution(state)
+    cancel_prefetched(execution)
     replan.last_results = runtime.results_to_plain(execution.results)
     if not replan.last_failure:
         replan.last_failure = "unknown"
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from State import ReACTOR
+from runtime import AgentRuntime
+from utils.deadline import remaining
+from nodes.worker import (
+    _call_agent_prefetched,
+    _call_parallel,
+    _ensure_trace,
+    _parse_call_config,
+    _parse_call_list,
+    _prepare_routing,
+    _record_parallel,
+    _record_serial,
+    _stream_options,
+    cancel_prefetched,
+    run_worker_async,
+)
+
+
+_CALL_TAGS = ("SerialCallAgent", "ParallelCallAgent")
+
+
+def _assign_queries(
+    steps: List[tuple],
+    start: int,
+    pending_queries: List[str],
+    active_query: Optional[str],
+    default_query: str,
+) -> Dict[int, Any]:
+    """
+    Replay the sequential pending_queries/active_query bookkeeping once, so every step
+    knows its query up front regardless of the order in which it becomes ready.
+    Serial steps map to a query string, parallel steps to the queries their items pop,
+    AppendHistory steps to the query of the call they record.
+    """
+    pending = list(pending_queries)
+    active = active_query
+    assigned: Dict[int, Any] = {}
+    for i in range(start, len(steps)):
+        _desc, _var, tag, inp = steps[i]
+        if tag == "SerialCallAgent":
+            if active is None:
+                active = pending.pop(0) if pending else default_query
+            cfg = _parse_call_config(inp)
+            if cfg.get("query"):
+                active = cfg.get("query")
+            assigned[i] = active
+        elif tag == "ParallelCallAgent":
+            popped = []
+            for cfg in _parse_call_list(inp):
+                if cfg.get("query"):
+                    continue
+                if pending:
+                    popped.append(pending.pop(0))
+                else:
+                    popped.append(active or default_query)
+            assigned[i] = popped
+            pending = []
+            active = None
+        elif tag == "AppendHistory":
+            assigned[i] = active
+            active = None
+    return assigned
+
+
+def _is_inline_call(runtime: AgentRuntime, tag: str, inp: Any) -> bool:
+    # "others" and unregistered agents are resolved by the worker without any I/O.
+    if tag != "SerialCallAgent":
+        return False
+    agent_name = _parse_call_config(inp).get("agent", "")
+    return agent_name == "others" or agent_name not in runtime.agent_registry
+
+
+async def run_scheduler_async(state: ReACTOR, runtime: AgentRuntime):
+    """
+    Dependency-aware executor for the whole plan in one graph hop.
+    Every step whose dependencies are satisfied is started immediately; agent calls run
+    concurrently and are recorded into ExecutionState as they finish, other steps run
+    inline through the regular worker.
+    """
+    execution = runtime.ensure_execution(state)
+    steps = execution.steps
+    start = execution.idx
+    if start >= len(steps):
+        return None
+
+    deps = runtime.build_dependency_graph(steps)
+    working_input = dict(state.get("working_input") or state.get("raw_input") or {})
+    state["working_input"] = working_input
+    trace = _ensure_trace(state)
+    state["trace"] = trace
+    assigned = _assign_queries(
+        steps,
+        start,
+        list(state.get("pending_queries", [])),
+        state.get("active_query"),
+        working_input.get("query", ""),
+    )
+
+    done = set(range(start))
+    waiting = list(range(start, len(steps)))
+    running: Dict[asyncio.Task, Dict[str, Any]] = {}
+    failure = ""
+
+    def _launch(i: int) -> None:
+        plan_text, step_var, tool_tag, tool_input = steps[i]
+        wi = state["working_input"]
+        if tool_tag == "SerialCallAgent":
+            routing = _prepare_routing(
+                tool_tag=tool_tag,
+                tool_input=tool_input,
+                working_input=wi,
+                state=state,
+                runtime=runtime,
+                trace=trace,
+                pending_queries=[],
+                active_query=assigned.get(i) or "",
+            )
+            route = routing.get("route") or {}
+            payload = route.get("payload")
+            if payload is None:
+                payload = dict(wi)
+            stream = _stream_options(state, runtime, trace, route.get("agent"), step_var=step_var, steps=steps)
+            coro = _call_agent_prefetched(
+                runtime, execution, step_var, route.get("agent"), payload, remaining(state), stream
+            )
+        else:
+            routing = _prepare_routing(
+                tool_tag=tool_tag,
+                tool_input=tool_input,
+                working_input=wi,
+                state=state,
+                runtime=runtime,
+                trace=trace,
+                pending_queries=list(assigned.get(i) or []),
+                active_query=None,
+            )
+            route = {}
+            stream = None
+            coro = _call_parallel(runtime, routing.get("routes") or [], wi, remaining(state), trace)
+        print(f"[scheduler] start step={i + 1}/{len(steps)} tag={tool_tag} var={step_var}")
+        task = asyncio.ensure_future(coro)
+        running[task] = {"idx": i, "route": route, "stream": stream}
+
+    def _record(task: asyncio.Task, info: Dict[str, Any]) -> str:
+        i = info["idx"]
+        plan_text, step_var, tool_tag, _tool_input = steps[i]
+        try:
+            res = task.result()
+        except Exception as exc:
+            res = {"status": "fail", "error": repr(exc), "output": None}
+            if tool_tag == "ParallelCallAgent":
+                res = [dict(res, agent=None, query=None)]
+        if tool_tag == "SerialCallAgent":
+            trace.add_text("正在为您处理相关信息。")
+            reason = _record_serial(
+                execution,
+                step_var=step_var,
+                plan_text=plan_text,
+                tool_tag=tool_tag,
+                route=info["route"],
+                res=res,
+            )
+            stream = info.get("stream")
+            if stream and stream.get("forwarded"):
+                execution.result_meta[step_var]["streamed"] = True
+        else:
+            reason = _record_parallel(
+                execution,
+                step_var=step_var,
+                plan_text=plan_text,
+                tool_tag=tool_tag,
+                outputs=res,
+            )
+        print(f"[scheduler] done step={i + 1}/{len(steps)} var={step_var} status={'fail' if reason else 'ok'}")
+        return reason
+
+    async def _run_inline(i: int) -> str:
+        _plan_text, step_var, tool_tag, _tool_input = steps[i]
+        execution.idx = i
+        state["execution"] = execution
+        state["active_query"] = assigned.get(i) if tool_tag in ("AppendHistory", "SerialCallAgent") else None
+        state["pending_queries"] = []
+        await run_worker_async(state, runtime)
+        if state.get("eval_status") == "NEED_REPLAN":
+            return state.get("evaluator_hint") or "step failed"
+        return ""
+
+    while waiting or running:
+        launched = False
+        if not failure:
+            for i in [i for i in waiting if deps[i] <= done]:
+                waiting.remove(i)
+                _desc, _var, tag, inp = steps[i]
+                if tag in _CALL_TAGS and not _is_inline_call(runtime, tag, inp):
+                    _launch(i)
+                    launched = True
+                    continue
+                failure = await _run_inline(i)
+                done.add(i)
+                launched = True
+                if failure:
+                    break
+            if launched and not failure:
+                continue
+
+        if failure or not running:
+            break
+
+        finished, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+        for task in finished:
+            info = running.pop(task)
+            reason = _record(task, info)
+            done.add(info["idx"])
+            if reason and not failure:
+                failure = reason
+
+    for task in running:
+        task.cancel()
+    cancel_prefetched(execution)
+
+    # Keep results in plan order; the evaluator reads the last entry.
+    order = {var: i for i, (_desc, var, _tag, _inp) in enumerate(steps)}
+    execution.results = dict(
+        sorted(execution.results.items(), key=lambda kv: order.get(kv[0], len(steps)))
+    )
+    execution.idx = len(steps)
+    state["execution"] = execution
+    if failure:
+        state["eval_status"] = "NEED_REPLAN"
+        state["evaluator_hint"] = failure
+
+    return {
+        "working_input": state["working_input"],
+        "trace": trace,
+        "execution": execution,
+        "pending_queries": [],
+        "active_query": None,
+        "route": None,
+        "routes": None,
+    }
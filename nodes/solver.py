@@ -1,14 +1,18 @@
 from __future__ import annotations
 
+import asyncio
 import json
 from dataclasses import is_dataclass
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from State import ReACTOR
+from conf.config import solver_config
 from prompt.solver_prompt import reactor_solver_prompt
 from runtime import AgentRuntime
 from utils.append_history import aggregate_agent_output, extract_plain_text
-from utils.call_llm import execute_react_agent
+from utils.call_llm import aexecute_react_agent, execute_react_agent
+from utils.deadline import expired, remaining
+from utils.evidence import build_evidence
 
 try:
     from src.output_config import OUTPUT_LAYOUT, OUTPUT_SEPARATOR
@@ -23,19 +27,105 @@ def _ensure_layout(layout: List[Dict[str, Any]] | None) -> List[Dict[str, Any]]:
     return layout
 
 
-def _build_summary(state: ReACTOR, runtime: AgentRuntime) -> str:
+def layout_streams_agent(agent_name: str) -> bool:
+    """Whether the streaming output layout prints this agent's raw output."""
+    for section in _ensure_layout(OUTPUT_LAYOUT):
+        if not isinstance(section, dict):
+            continue
+        sec_type = section.get("type")
+        if sec_type == "final":
+            return True
+        if sec_type == "agent" and section.get("agent", "") in ("", agent_name):
+            return True
+    return False
+
+
+def _streamed_steps(state: ReACTOR, runtime: AgentRuntime) -> set:
+    # Steps whose raw events were already forwarded to the client while the agent streamed.
+    execution = runtime.ensure_execution(state)
+    return {
+        step_id
+        for step_id, meta in (execution.result_meta or {}).items()
+        if isinstance(meta, dict) and meta.get("streamed")
+    }
+
+
+def _final_output_ref(state: ReACTOR, runtime: AgentRuntime) -> str:
+    execution = runtime.ensure_execution(state)
+    for _desc, _var, tag, inp in reversed(execution.steps or []):
+        if tag == "FinalOutput" and isinstance(inp, str):
+            return inp.split(".", 1)[0]
+    return ""
+
+
+def _summary_prompt(state: ReACTOR, runtime: AgentRuntime) -> str:
     reasoning_overview = state.get("reasoning_overview", "")
     plan_str = state.get("plan_string", "")
     execution = runtime.ensure_execution(state)
-    evidence = json.dumps(runtime.results_to_plain(execution.results), ensure_ascii=False, indent=2)
+    evidence = build_evidence(execution.results, node="solver")
 
-    solve_prompt = reactor_solver_prompt.format(
+    return reactor_solver_prompt.format(
         reasoning_overview=reasoning_overview,
         plan_str=plan_str,
         evidence=evidence,
     )
 
-    return execute_react_agent(prompt=solve_prompt)
+
+def _build_summary(state: ReACTOR, runtime: AgentRuntime) -> str:
+    solve_prompt = _summary_prompt(state, runtime)
+    try:
+        return execute_react_agent(prompt=solve_prompt, timeout=remaining(state))
+    except Exception:
+        if not expired(state):
+            raise
+        return _fallback_summary(state, runtime)
+
+
+async def _abuild_summary(state: ReACTOR, runtime: AgentRuntime) -> str:
+    solve_prompt = _summary_prompt(state, runtime)
+    try:
+        return await aexecute_react_agent(solve_prompt, node="solver", timeout=remaining(state))
+    except Exception:
+        if not expired(state):
+            raise
+        return _fallback_summary(state, runtime)
+
+
+def _layout_has_summary() -> bool:
+    return any(
+        isinstance(section, dict) and section.get("type") == "summary"
+        for section in _ensure_layout(OUTPUT_LAYOUT)
+    )
+
+
+def _needs_summary(state: ReACTOR) -> bool:
+    if state.get("eval_status") not in ("DONE", "FAILED") or state.get("pending_question"):
+        return False
+    return _layout_has_summary()
+
+
+def start_speculative_summary(state: ReACTOR, runtime: AgentRuntime) -> Optional[asyncio.Task]:
+    """
+    Start the summary while the evaluator is still judging: plan and results are final by then.
+    The caller keeps it on PASS (state["summary_cache"]) and cancels it otherwise.
+    """
+    if not solver_config.get("speculative_summary") or state.get("pending_question"):
+        return None
+    if not _layout_has_summary():
+        return None
+    return asyncio.ensure_future(_abuild_summary(state, runtime))
+
+
+def _fallback_summary(state: ReACTOR, runtime: AgentRuntime) -> str:
+    # Best available answer when the budget is gone: agent outputs as plain text.
+    texts = []
+    for item in _collect_agent_outputs(state, runtime):
+        text = _render_payload_text(item.get("output"))
+        if text:
+            texts.append(text)
+    if texts:
+        return OUTPUT_SEPARATOR.join(texts)
+    return _render_payload_text(state.get("result"))
 
 
 def _extract_result_meta(execution, step_id: str) -> Dict[str, Any]:
@@ -141,7 +231,13 @@ def _render_payload_stream(payload: Any) -> List[Any]:
     return [payload]
 
 
-def compose_output(state: ReACTOR, runtime: AgentRuntime, *, streaming: bool = False):
+def compose_output(
+    state: ReACTOR,
+    runtime: AgentRuntime,
+    *,
+    streaming: bool = False,
+    summary: str | None = None,
+):
     if state.get("eval_status") not in ("DONE", "FAILED"):
         return [] if streaming else ""
 
@@ -157,7 +253,8 @@ def compose_output(state: ReACTOR, runtime: AgentRuntime, *, streaming: bool = F
 
     layout = _ensure_layout(OUTPUT_LAYOUT)
     agent_outputs = _collect_agent_outputs(state, runtime)
-    summary_cache: str | None = None
+    summary_cache: str | None = summary if summary is not None else state.get("summary_cache")
+    streamed = _streamed_steps(state, runtime) if streaming else set()
 
     pieces: List[Any] = []
 
@@ -181,6 +278,8 @@ def compose_output(state: ReACTOR, runtime: AgentRuntime, *, streaming: bool = F
             )
             for item in selected:
                 payload = item.get("output")
+                if item.get("step_id") in streamed:
+                    continue
                 if streaming:
                     section_chunks.extend(_render_payload_stream(payload))
                 else:
@@ -201,6 +300,8 @@ def compose_output(state: ReACTOR, runtime: AgentRuntime, *, streaming: bool = F
 
         elif sec_type == "final":
             value = state.get("result", "")
+            if value and streamed and _final_output_ref(state, runtime) in streamed:
+                value = ""
             if value:
                 section_chunks.append(value)
 
@@ -219,5 +320,13 @@ def compose_output(state: ReACTOR, runtime: AgentRuntime, *, streaming: bool = F
     return "".join(str(p) for p in pieces if p is not None)
 
 
+async def acompose_output(state: ReACTOR, runtime: AgentRuntime, *, streaming: bool = False):
+    """compose_output with the summary LLM call awaited natively instead of blocking."""
+    summary = state.get("summary_cache")
+    if summary is None and _needs_summary(state):
+        summary = await _abuild_summary(state, runtime)
+    return compose_output(state, runtime, streaming=streaming, summary=summary)
+
+
 def summary_plan_and_results(state: ReACTOR, runtime: AgentRuntime) -> str:
     return compose_output(state, runtime, streaming=False)
@@ -1,15 +1,23 @@
 from __future__ import annotations
 
 import json
+import time
 import asyncio
 import inspect
 from typing import Any, Dict, List, Optional
 
 from State import StepResult, ReACTOR
+from nodes.solver import layout_streams_agent
 from runtime import AgentRuntime
 from utils.ReACTORTracer import TraceCollector
 from utils.append_history import extract_plain_text
 from utils.agent_response import validate_agent_response
+from utils.bulkhead import BulkheadFullError
+from utils.circuit_breaker import hedge_delay
+from utils.deadline import remaining
+from utils.loop_runner import run_sync
+from utils.parse_plan import split_queries
+from utils.recorder import current_session
 
 
 def _ensure_trace(state: ReACTOR) -> TraceCollector:
@@ -184,29 +192,393 @@ def _prepare_routing(
     return {}
 
 
-async def _execute_agent_async(func, payload: Dict[str, Any]) -> Any:
+async def _execute_agent_async(func, payload: Dict[str, Any], executor=None, **kwargs) -> Any:
     if inspect.iscoroutinefunction(func):
-        return await func(payload)
+        return await func(payload, **kwargs)
+    if executor is not None:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, payload)
     return await asyncio.to_thread(func, payload)
 
 
-def _run_coroutine(coro):
+async def _execute_hedged(func, payload: Dict[str, Any], bulkhead, delay: Optional[float], **kwargs) -> Any:
+    """
+    Send a second copy of a slow idempotent call after `delay`; first response wins.
+    The copy needs a bulkhead slot of its own and is skipped when none is free.
+    """
+    executor = bulkhead.executor if bulkhead is not None else None
+    if delay is None:
+        return await _execute_agent_async(func, payload, executor, **kwargs)
+
+    primary = asyncio.ensure_future(_execute_agent_async(func, payload, executor))
+    tasks = {primary}
     try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        return asyncio.run(coro)
-    # If we're already in an event loop, run in a new thread to avoid nesting.
-    result_box: Dict[str, Any] = {}
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return primary.result()
+        if bulkhead is None or bulkhead.try_acquire():
+            hedge = asyncio.ensure_future(_execute_agent_async(func, payload, executor))
+            if bulkhead is not None:
+                hedge.add_done_callback(lambda _task: bulkhead.release())
+            tasks.add(hedge)
+        error: Optional[BaseException] = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _call_limit(entry: Dict[str, Any], timeout: Optional[float]) -> tuple:
+    """(seconds allowed for the call, whether the agent's own timeout is the binding limit)."""
+    agent_timeout = entry.get("timeout")
+    if agent_timeout is None:
+        return timeout, False
+    agent_timeout = float(agent_timeout)
+    if timeout is not None and timeout < agent_timeout:
+        return timeout, False
+    return agent_timeout, True
+
+
+async def _call_agent(
+    runtime: AgentRuntime,
+    agent_name: Optional[str],
+    payload: Any,
+    timeout: Optional[float] = None,
+    stream: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    if timeout is not None and timeout <= 0:
+        return {"status": "fail", "error": "deadline exceeded", "output": None}
+    entry = runtime.agent_registry.get(agent_name, {}) if agent_name else {}
+    if entry.get("execute") is None:
+        return {"status": "fail", "error": "agent not registered", "output": None}
+
+    cache = entry.get("cache")
+    if cache is not None:
+        return await cache.get_or_call(
+            payload,
+            lambda: _invoke_agent(entry, agent_name, payload, timeout, stream),
+        )
+    return await _invoke_agent(entry, agent_name, payload, timeout, stream)
+
+
+async def _invoke_agent(
+    entry: Dict[str, Any],
+    agent_name: Optional[str],
+    payload: Any,
+    timeout: Optional[float],
+    stream: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    func = entry.get("execute")
+    call_kwargs: Dict[str, Any] = {}
+    if entry.get("streaming") and stream is not None:
+        call_kwargs = {"trace": stream.get("trace"), "on_raw": stream.get("on_raw")}
+    bulkhead = entry.get("bulkhead")
+    if bulkhead is not None:
+        try:
+            await bulkhead.acquire()
+        except BulkheadFullError as exc:
+            return {"status": "fail", "error": str(exc), "output": None}
+    breaker = entry.get("breaker")
+    admitted = breaker.admit() if breaker is not None else None
+    if breaker is not None and admitted is None:
+        if bulkhead is not None:
+            bulkhead.release()
+        return {"status": "fail", "error": f"circuit open: {agent_name}", "output": None}
+    # The breaker only learns from calls that finished or hit the agent's own timeout;
+    # cancelled calls and calls cut short by the request deadline give their probe back.
+    outcome_recorded = False
+    limit, agent_bound = _call_limit(entry, timeout)
+    session = current_session()
+    events: Optional[List[List[Any]]] = None
+    started = time.perf_counter()
+    if session is not None and entry.get("streaming") and stream is not None:
+        events = []
+        forward = call_kwargs.get("on_raw")
+
+        def _record_raw(raw):
+            events.append([round(time.perf_counter() - started, 6), raw])
+            if forward is not None:
+                forward(raw)
+
+        call_kwargs["on_raw"] = _record_raw
+    try:
+        try:
+            raw_res = await asyncio.wait_for(
+                _execute_hedged(
+                    func,
+                    payload,
+                    bulkhead,
+                    # A stream cannot be hedged without duplicating its events.
+                    None if entry.get("streaming") else hedge_delay(breaker, entry.get("hedge")),
+                    **call_kwargs,
+                ),
+                limit,
+            )
+        except asyncio.TimeoutError:
+            error = "agent timeout" if agent_bound else "deadline exceeded"
+            if breaker is not None and agent_bound:
+                breaker.record(False, time.perf_counter() - started)
+                outcome_recorded = True
+            if session is not None:
+                session.record_agent(agent_name, payload, None, started, time.perf_counter(), error=error, events=events)
+            return {"status": "fail", "error": error, "output": None}
+        except Exception as exc:
+            if breaker is not None:
+                breaker.record(False, time.perf_counter() - started)
+                outcome_recorded = True
+            if session is not None:
+                session.record_agent(agent_name, payload, None, started, time.perf_counter(), error=repr(exc), events=events)
+            raise
+        finally:
+            if bulkhead is not None:
+                bulkhead.release()
+        latency = time.perf_counter() - started
+        raw_status = getattr(raw_res, "status_code", None)
+        if hasattr(raw_res, "json"):
+            try:
+                data = raw_res.json()
+            except Exception:
+                data = raw_res.text
+        else:
+            data = raw_res
+        if session is not None:
+            session.record_agent(agent_name, payload, data, started, started + latency, events=events)
+        status = "ok"
+        error = ""
+        if isinstance(data, dict) and data.get("status") == "fail":
+            status = "fail"
+            error = data.get("reason") or data.get("error") or data.get("message") or ""
+        ok, hint = validate_agent_response(data, raw_status_code=raw_status)
+        if not ok:
+            status = "fail"
+            if not error:
+                error = hint
+        if breaker is not None:
+            breaker.record(status == "ok", latency)
+            outcome_recorded = True
+        return {"status": status, "error": error, "output": data}
+    finally:
+        if breaker is not None and not outcome_recorded:
+            breaker.abandon(admitted)
+
+
+def prefetch_route(state: ReACTOR, runtime: AgentRuntime, steps: List[tuple], i: int) -> Optional[Dict[str, Any]]:
+    """
+    Route for step `i` if it can be started before the rest of the plan exists: a serial,
+    non-streaming call reading $WORKING_INPUT, preceded only by SplitQuery steps.
+    """
+    _plan_text, _step_var, tool_tag, tool_input = steps[i]
+    if tool_tag != "SerialCallAgent" or any(tag != "SplitQuery" for _d, _v, tag, _i in steps[:i]):
+        return None
+    cfg = _parse_call_config(tool_input)
+    agent_name = cfg.get("agent", "")
+    entry = runtime.agent_registry.get(agent_name) or {}
+    if agent_name == "others" or entry.get("execute") is None or entry.get("streaming"):
+        return None
+    if cfg.get("input", "$WORKING_INPUT") != "$WORKING_INPUT":
+        return None
+
+    working_input = dict(state.get("working_input") or state.get("raw_input") or {})
+    query = cfg.get("query")
+    if not query:
+        pending: List[str] = []
+        for _d, _v, _tag, split_input in steps[:i]:
+            pending.extend(split_queries(split_input))
+        query = pending[0] if pending else working_input.get("query", "")
+    working_input["query"] = query
+    cfg = dict(cfg, query=query)
+    return {
+        "agent": agent_name,
+        "payload": _build_payload(working_input, cfg, state, runtime, query or ""),
+        "query": query,
+    }
+
+
+async def _call_agent_prefetched(
+    runtime: AgentRuntime,
+    execution,
+    step_var: str,
+    agent_name: Optional[str],
+    payload: Any,
+    timeout: Optional[float] = None,
+    stream: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    _call_agent, reusing the call the streaming planner already started for this step if it
+    matches. The reused call gets the same bound as a fresh one: the remaining request budget,
+    capped by the agent's own timeout.
+    """
+    prefetched = execution.prefetched.pop(step_var, None)
+    if prefetched is not None:
+        task = prefetched["task"]
+        if prefetched["agent"] == agent_name and prefetched["payload"] == payload:
+            print(f"[worker] reuse prefetched call var={step_var} agent={agent_name}")
+            entry = runtime.agent_registry.get(agent_name, {}) if agent_name else {}
+            limit, agent_bound = _call_limit(entry, timeout)
+            try:
+                # wait_for cancels the task when the limit runs out.
+                return await asyncio.wait_for(task, limit)
+            except asyncio.TimeoutError:
+                error = "agent timeout" if agent_bound else "deadline exceeded"
+                return {"status": "fail", "error": error, "output": None}
+        task.cancel()
+    return await _call_agent(runtime, agent_name, payload, timeout, stream)
+
+
+def cancel_prefetched(execution) -> None:
+    for prefetched in execution.prefetched.values():
+        prefetched["task"].cancel()
+    execution.prefetched.clear()
+
+
+async def _call_parallel(
+    runtime: AgentRuntime,
+    routes: List[Dict[str, Any]],
+    working_input: Dict[str, Any],
+    timeout: Optional[float] = None,
+    trace: Optional[TraceCollector] = None,
+) -> List[Dict[str, Any]]:
+    async def _execute_one(route: Dict[str, Any]) -> dict:
+        query = route.get("query", "")
+        agent_name = route.get("agent")
+        payload = route.get("payload")
+        if payload is None:
+            payload = dict(working_input)
+            if query:
+                payload["query"] = query
+        # Parallel streams are relayed to the trace only; interleaved tokens are not forwarded.
+        stream = {"trace": trace, "on_raw": None} if trace is not None else None
+        res = await _call_agent(runtime, agent_name, payload, timeout, stream)
+        return {
+            "query": query,
+            "agent": agent_name,
+            "status": res["status"],
+            "error": res["error"],
+            "output": res["output"],
+        }
 
-    def _runner():
-        result_box["value"] = asyncio.run(coro)
+    # Each call is bounded by the remaining budget; items that run out keep a
+    # 'deadline exceeded' entry while finished items are still returned.
+    return list(await asyncio.gather(*[_execute_one(r) for r in routes]))
 
-    import threading
 
-    t = threading.Thread(target=_runner)
-    t.start()
-    t.join()
-    return result_box.get("value")
+def _feeds_final_output(steps: List[tuple], step_var: str) -> bool:
+    for _desc, _var, tag, inp in steps:
+        if tag == "FinalOutput" and isinstance(inp, str) and inp.split(".", 1)[0] == step_var:
+            return True
+    return False
+
+
+def _stream_options(
+    state: ReACTOR,
+    runtime: AgentRuntime,
+    trace: TraceCollector,
+    agent_name: Optional[str],
+    *,
+    step_var: str = "",
+    steps: Optional[List[tuple]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Options for http_stream agents: trace relay always; raw events are forwarded to the
+    /plan/stream client only when the step feeds FinalOutput and the layout would print it.
+    """
+    entry = runtime.agent_registry.get(agent_name, {}) if agent_name else {}
+    if not entry.get("streaming"):
+        return None
+    opts: Dict[str, Any] = {"trace": trace, "on_raw": None, "forwarded": False}
+    working_input = state.get("working_input") or {}
+    if (
+        working_input.get("is_streaming")
+        and step_var
+        and _feeds_final_output(steps or [], step_var)
+        and layout_streams_agent(agent_name)
+    ):
+        def _forward(raw: Any) -> None:
+            if trace.emit_raw("final", raw):
+                opts["forwarded"] = True
+
+        opts["on_raw"] = _forward
+    return opts
+
+
+def _record_serial(
+    execution,
+    *,
+    step_var: str,
+    plan_text: str,
+    tool_tag: str,
+    route: Dict[str, Any],
+    res: Dict[str, Any],
+) -> str:
+    """Write a SerialCallAgent result into execution; return the failure reason ('' if ok)."""
+    status = res.get("status", "")
+    error = res.get("error", "")
+    execution.results[step_var] = StepResult(
+        id=step_var,
+        tag=tool_tag,
+        desc=plan_text,
+        status=status,
+        error=error,
+        output=res.get("output"),
+    )
+    execution.result_meta[step_var] = {
+        "tag": tool_tag,
+        "agent": route.get("agent"),
+        "query": route.get("query"),
+        "status": status,
+    }
+    if status == "fail":
+        return error or "agent returned error"
+    return ""
+
+
+def _record_parallel(
+    execution,
+    *,
+    step_var: str,
+    plan_text: str,
+    tool_tag: str,
+    outputs: List[Dict[str, Any]],
+) -> str:
+    """Write a ParallelCallAgent result into execution; return the first failure reason ('' if ok)."""
+    overall_error = ""
+    for item in outputs:
+        if isinstance(item, dict) and item.get("status") == "fail":
+            overall_error = item.get("error") or "agent returned error"
+            break
+    overall_status = "fail" if overall_error else "ok"
+
+    execution.results[step_var] = StepResult(
+        id=step_var,
+        tag=tool_tag,
+        desc=plan_text,
+        status=overall_status,
+        error=overall_error,
+        output=outputs,
+    )
+    execution.result_meta[step_var] = {
+        "tag": tool_tag,
+        "items": [
+            {
+                "agent": item.get("agent") if isinstance(item, dict) else None,
+                "query": item.get("query") if isinstance(item, dict) else None,
+                "status": item.get("status") if isinstance(item, dict) else None,
+            }
+            for item in outputs
+        ],
+    }
+    return overall_error
+
+
+def _run_coroutine(coro):
+    # Sync entry point: reuse the process-wide background loop (and its pooled clients)
+    # instead of a fresh thread + event loop per step.
+    return run_sync(coro)
 
 
 async def run_worker_async(state: ReACTOR, runtime: AgentRuntime):
@@ -248,9 +620,8 @@ async def run_worker_async(state: ReACTOR, runtime: AgentRuntime):
     if idx == 0:
         print("===================== FULL PLAN ==========================")
         for i, (desc, var, tag, inp) in enumerate(steps, start=1):
-            deps = runtime._extract_deps(inp)
-            if not deps:
-                deps = runtime._infer_implicit_deps(steps, i - 1, tag)
+            deps = runtime._extract_deps(inp) + runtime._infer_implicit_deps(steps, i - 1, tag)
+            deps = list(dict.fromkeys(deps))
             print(f"Step{i} {desc}")
             print(f"   -> {var} = {tag}[{inp}]")
             print(f"      tag: {tag}")
@@ -393,86 +764,18 @@ async def run_worker_async(state: ReACTOR, runtime: AgentRuntime):
             _print_step_result(step_var)
             return _patch()
 
-        async def _execute_one(route: Dict[str, Any]) -> dict:
-            query = route.get("query", "")
-            agent_name = route.get("agent")
-            payload = route.get("payload")
-            if payload is None:
-                payload = dict(working_input)
-                if query:
-                    payload["query"] = query
-
-            func = runtime.agent_registry.get(agent_name, {}).get("execute") if agent_name else None
-            if func is None:
-                return {
-                    "query": query,
-                    "agent": agent_name,
-                    "status": "fail",
-                    "error": "agent not registered",
-                    "output": None,
-                }
-
-            raw_res = await _execute_agent_async(func, payload)
-            raw_status = getattr(raw_res, "status_code", None)
-            if hasattr(raw_res, "json"):
-                try:
-                    data = raw_res.json()
-                except Exception:
-                    data = raw_res.text
-            else:
-                data = raw_res
-            status = "ok"
-            error = ""
-            if isinstance(data, dict) and data.get("status") == "fail":
-                status = "fail"
-                error = data.get("reason") or data.get("error") or data.get("message") or ""
-            ok, hint = validate_agent_response(data, raw_status_code=raw_status)
-            if not ok:
-                status = "fail"
-                if not error:
-                    error = hint
-            return {
-                "query": query,
-                "agent": agent_name,
-                "status": status,
-                "error": error,
-                "output": data,
-            }
-
-        async def _run_parallel():
-            tasks = [_execute_one(r) for r in routes]
-            return await asyncio.gather(*tasks)
-
-        outputs = await _run_parallel()
+        outputs = await _call_parallel(runtime, routes, working_input, remaining(state), trace)
 
-        overall_error = ""
-        for item in outputs:
-            if isinstance(item, dict) and item.get("status") == "fail":
-                overall_error = item.get("error") or "agent returned error"
-                break
-        overall_status = "fail" if overall_error else "ok"
-
-        results[step_var] = StepResult(
-            id=step_var,
-            tag=tool_tag,
-            desc=plan_text,
-            status=overall_status,
-            error=overall_error,
-            output=outputs,
+        execution.results = results
+        overall_error = _record_parallel(
+            execution,
+            step_var=step_var,
+            plan_text=plan_text,
+            tool_tag=tool_tag,
+            outputs=outputs,
         )
-        execution.result_meta[step_var] = {
-            "tag": tool_tag,
-            "items": [
-                {
-                    "agent": item.get("agent") if isinstance(item, dict) else None,
-                    "query": item.get("query") if isinstance(item, dict) else None,
-                    "status": item.get("status") if isinstance(item, dict) else None,
-                }
-                for item in outputs
-            ],
-        }
+        overall_status = "fail" if overall_error else "ok"
 
-        execution.results = results
         execution.idx = idx + 1
         state["execution"] = execution
         state["working_input"] = working_input
@@ -554,42 +857,23 @@ async def run_worker_async(state: ReACTOR, runtime: AgentRuntime):
             _print_step_result(step_var)
             return _patch()
 
-        raw_res = await _execute_agent_async(func, payload)
-        raw_status = getattr(raw_res, "status_code", None)
+        stream = _stream_options(state, runtime, trace, agent_name, step_var=step_var, steps=steps)
+        res = await _call_agent_prefetched(
+            runtime, execution, step_var, agent_name, payload, remaining(state), stream
+        )
         trace.add_text("正在为您处理相关信息。")
-        if hasattr(raw_res, "json"):
-            try:
-                data = raw_res.json()
-            except Exception:
-                data = raw_res.text
-        else:
-            data = raw_res
-        status = "ok"
-        error = ""
-        if isinstance(data, dict) and data.get("status") == "fail":
-            status = "fail"
-            error = data.get("reason") or data.get("error") or data.get("message") or ""
-        ok, hint = validate_agent_response(data, raw_status_code=raw_status)
-        if not ok:
-            status = "fail"
-            if not error:
-                error = hint
-        results[step_var] = StepResult(
-            id=step_var,
-            tag=tool_tag,
-            desc=plan_text,
-            status=status,
-            error=error,
-            output=data,
+        execution.results = results
+        force_replan_reason = _record_serial(
+            execution,
+            step_var=step_var,
+            plan_text=plan_text,
+            tool_tag=tool_tag,
+            route=route,
+            res=res,
         )
-        execution.result_meta[step_var] = {
-            "tag": tool_tag,
-            "agent": agent_name,
-            "query": route.get("query"),
-            "status": status,
-        }
-        if status == "fail":
-            force_replan_reason = error or "agent returned error"
+        if stream and stream.get("forwarded"):
+            execution.result_meta[step_var]["streamed"] = True
+        results = execution.results
 
     elif tool_tag == "FinalOutput":
         final_value = runtime.resolve_tool_input(tool_input, state)
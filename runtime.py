@@ -1,24 +1,38 @@
 from __future__ import annotations
 
-import json
+import asyncio
 import re
+import threading
+import time
 from dataclasses import asdict, is_dataclass
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from State import ExecutionState, ReplanState
-from conf.config import agent_config
+from conf.config import agent_config, planner_config
 from conf.sop_config import sop_config
+from utils.agent_pool import AgentPoolManager
 from utils.agent_register import build_agent_registry
-from utils.sop_registry import build_sop_registry, build_sop_catalog, match_sop
+from utils.evidence import build_evidence
+from utils.logger import default_log_dir
+from utils.parse_plan import parse_plan_str
+from utils.plan_cache import build_plan_cache, catalog_fingerprint, log_files
+from utils.plan_index import build_plan_index
+from utils.sop_registry import SopRegistry, SopSnapshot, build_sop_cache, build_sop_registry, build_sop_catalog, match_sop
 
 
 class AgentRuntime:
     def __init__(self, config: Dict[str, Any] | None = None):
         cfg = config if config is not None else agent_config
-        self.agent_registry = build_agent_registry(cfg)
+        self.agent_pools = AgentPoolManager()
+        self.agent_registry = build_agent_registry(cfg, pool_manager=self.agent_pools)
         self.agent_catalog = self._build_agent_catalog()
-        self.sop_registry = build_sop_registry(sop_config)
-        self.sop_catalog = build_sop_catalog(self.sop_registry)
+        self.sop_cache = build_sop_cache(sop_config)
+        self.publish_sops(build_sop_registry(sop_config, cache=self.sop_cache))
+        self._sop_lock = threading.Lock()
+        self._sop_watcher: Optional[asyncio.Task] = None
+        self.sop_reloads = {"reloads": 0, "failed": 0, "last_reload": None, "last_error": ""}
+        self.plan_cache = build_plan_cache(planner_config.get("plan_cache"))
+        self.plan_index = build_plan_index(planner_config.get("plan_similarity"))
         # Optional external evaluator hook (e.g., reward model); may be set by caller.
         self.evaluator_hook = None
 
@@ -30,8 +44,130 @@ class AgentRuntime:
             lines.append(f"- {agent_name}: {desc_text}")
         return "\n".join(lines)
 
-    def match_sop(self, query: str):
-        return match_sop(query, self.sop_registry)
+    @property
+    def sops(self) -> SopSnapshot:
+        """Current SOP registry, catalog and fingerprint; read it once per use to see one version."""
+        return self._sops
+
+    @property
+    def sop_registry(self) -> SopRegistry:
+        return self._sops.registry
+
+    @property
+    def sop_catalog(self) -> str:
+        return self._sops.catalog
+
+    @property
+    def catalog_fingerprint(self) -> str:
+        # Part of every plan cache key: editing agents or SOPs invalidates cached plans.
+        return self._sops.fingerprint
+
+    def publish_sops(self, registry: SopRegistry) -> None:
+        """Swap in `registry` with its catalog and fingerprint as a single reference assignment."""
+        catalog = build_sop_catalog(registry)
+        self._sops = SopSnapshot(registry, catalog, catalog_fingerprint(self.agent_catalog, catalog))
+
+    def reload_sops(self) -> Dict[str, Any]:
+        """
+        Rebuild the SOP registry from sop_config, re-parsing only files that changed, and publish
+        a new snapshot (registry + catalog + fingerprint) if any SOP changed. In-flight requests
+        keep the SOP dict they already matched; a load error keeps the current registry.
+        """
+        with self._sop_lock:
+            previous = self.sop_registry
+            try:
+                registry = build_sop_registry(sop_config, cache=self.sop_cache, previous=previous)
+            except Exception as exc:
+                self.sop_reloads["failed"] += 1
+                self.sop_reloads["last_error"] = f"{type(exc).__name__}: {exc}"
+                return {"status": "failed", "error": self.sop_reloads["last_error"]}
+            changed = [sop_id for sop_id, sop in registry.items() if previous.get(sop_id) is not sop]
+            removed = [sop_id for sop_id in previous if sop_id not in registry]
+            result = {"status": "unchanged", "changed": changed, "removed": removed, "total": len(registry)}
+            if changed or removed or list(registry) != list(previous):
+                self.publish_sops(registry)
+                self.sop_reloads["reloads"] += 1
+                self.sop_reloads["last_reload"] = time.time()
+                result["status"] = "reloaded"
+            else:
+                # Same SOPs; keep the new stamps so touched-but-identical files are not re-hashed.
+                previous.sources = registry.sources
+            return result
+
+    async def _watch_sops(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            result = await asyncio.to_thread(self.reload_sops)
+            if result["status"] != "unchanged":
+                print(f"[sop_reload] {result}")
+
+    async def startup(self) -> None:
+        async_agents = [
+            name
+            for name, info in self.agent_registry.items()
+            if info.get("type") in ("http_async", "http_stream")
+        ]
+        await self.agent_pools.startup(async_agents)
+        cache_cfg = planner_config.get("plan_cache") or {}
+        if self.plan_cache is not None and cache_cfg.get("prewarm_from_logs"):
+            loaded = await asyncio.to_thread(
+                self.plan_cache.prewarm_from_logs, log_files(default_log_dir()), parse_plan_str
+            )
+            print(f"[plan_cache] prewarmed {loaded} plans from logs")
+        interval = float(sop_config.get("watch_interval") or 0)
+        if interval > 0 and self._sop_watcher is None:
+            self._sop_watcher = asyncio.create_task(self._watch_sops(interval))
+
+    async def shutdown(self) -> None:
+        if self._sop_watcher is not None:
+            self._sop_watcher.cancel()
+            self._sop_watcher = None
+        await self.agent_pools.shutdown()
+        for info in self.agent_registry.values():
+            bulkhead = info.get("bulkhead")
+            if bulkhead is not None:
+                bulkhead.shutdown()
+        if self.plan_cache is not None:
+            self.plan_cache.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        agents: Dict[str, Any] = {}
+        for agent_name, info in self.agent_registry.items():
+            item: Dict[str, Any] = {}
+            for key in ("cache", "breaker", "bulkhead"):
+                component = info.get(key)
+                if component is not None:
+                    item[key] = component.stats()
+            agents[agent_name] = item
+        data: Dict[str, Any] = {"agents": agents}
+        if self.plan_cache is not None:
+            data["plan_cache"] = self.plan_cache.stats()
+        if self.plan_index is not None:
+            data["plan_index"] = self.plan_index.stats()
+        sop_registry = self.sop_registry
+        sops: Dict[str, Any] = {"count": len(sop_registry), **self.sop_reloads}
+        memo = {"entries": 0, "hits": 0, "misses": 0}
+        for sop in sop_registry.values():
+            compiled = sop.get("compiled")
+            if compiled is not None:
+                for key, value in compiled.memo.stats().items():
+                    memo[key] += value
+        sops["plan_memo"] = memo
+        if self.sop_cache is not None:
+            sops["cache"] = self.sop_cache.stats()
+        data["sops"] = sops
+        return data
+
+    def unavailable_agents(self) -> List[str]:
+        names = []
+        for agent_name, info in self.agent_registry.items():
+            breaker = info.get("breaker")
+            if breaker is not None and breaker.state == "open":
+                names.append(agent_name)
+        return names
+
+    def match_sop(self, query: str, registry: Optional[SopRegistry] = None):
+        return match_sop(query, registry if registry is not None else self.sop_registry)
 
     def _extract_deps(self, tool_input: str) -> List[str]:
         if not isinstance(tool_input, str):
@@ -39,9 +175,39 @@ class AgentRuntime:
         return re.findall(r"#E\d+", tool_input)
 
     def _infer_implicit_deps(self, steps: List[tuple], idx: int, tool_tag: str) -> List[str]:
+        """
+        Dependencies that are not spelled out as #E references:
+        - agent calls read working_input.history, so they wait for the latest AppendHistory,
+          and take their query from the latest SplitQuery (pending_queries);
+        - AppendHistory keeps history order, so it waits for the previous AppendHistory;
+        - AskUser / FinalOutput / unknown tags are barriers over every earlier step.
+        """
         if idx <= 0:
             return []
-        return []
+        prev = steps[:idx]
+        if tool_tag in ("SerialCallAgent", "ParallelCallAgent", "AppendHistory"):
+            deps: List[str] = []
+            for want in ("AppendHistory", "SplitQuery"):
+                if tool_tag == "AppendHistory" and want == "SplitQuery":
+                    continue
+                for _desc, var, tag, _inp in reversed(prev):
+                    if tag == want:
+                        deps.append(var)
+                        break
+            return deps
+        if tool_tag == "SplitQuery":
+            return []
+        return [var for _desc, var, _tag, _inp in prev]
+
+    def build_dependency_graph(self, steps: List[tuple]) -> Dict[int, set]:
+        """Map step index -> indices it depends on (explicit #E refs + implicit deps)."""
+        index_of: Dict[str, int] = {}
+        graph: Dict[int, set] = {}
+        for i, (_desc, var, tag, inp) in enumerate(steps):
+            refs = self._extract_deps(inp) + self._infer_implicit_deps(steps, i, tag)
+            graph[i] = {index_of[ref] for ref in refs if ref in index_of}
+            index_of[var] = i
+        return graph
 
     def _load_by_path(self, obj: Any, path: str):
         cur = obj
@@ -123,19 +289,18 @@ class AgentRuntime:
         last_failure = replan.last_failure
         last_results = replan.last_results
 
-        results_text = ""
-        try:
-            results_text = json.dumps(last_results, ensure_ascii=False)
-        except Exception:
-            results_text = str(last_results)
+        results_text = build_evidence(last_results, node="replanner")
 
-        if len(results_text) > 800:
-            results_text = results_text[:800] + "..."
+        unavailable = self.unavailable_agents()
+        unavailable_text = ""
+        if unavailable:
+            unavailable_text = f"当前不可用的agent(已熔断，禁止调用): {', '.join(unavailable)}\n"
 
         return (
             f"这是第{count}次重新规划。\n"
             f"上次计划: {last_plan}\n"
             f"上次失败原因: {last_failure}\n"
             f"上次结果摘要: {results_text}\n"
+            f"{unavailable_text}"
             "要求: 必须避免重复上次计划，必要时调整拆解顺序或Action组合。"
         )
@@ -0,0 +1,12 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import conf.config  # noqa: E402
+
+# ChatOpenAI rejects an empty key when a client is built; tests never call the LLM.
+if not conf.config.github_api_key:
+    conf.config.github_api_key = "test-key"
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from utils.agent_cache import AgentResponseCache, build_agent_cache
+
+
+def _cache(**kwargs) -> AgentResponseCache:
+    return AgentResponseCache("chart", identity_fields=["customer_no"], **kwargs)
+
+
+def test_enabling_without_identity_fields_fails():
+    with pytest.raises(ValueError):
+        build_agent_cache("chart", {"enabled": True, "ttl": 60})
+    assert build_agent_cache("chart", {"enabled": False}) is None
+
+
+def test_keys_are_isolated_per_caller():
+    cache = _cache()
+    base = {"query": "本月  账单", "slots": {"month": "5"}, "history": []}
+    alice = cache.make_key(dict(base, customer_no="A"))
+    bob = cache.make_key(dict(base, customer_no="B"))
+    assert alice and bob and alice != bob
+    # Whitespace is normalized; history is part of the key.
+    assert cache.make_key(dict(base, customer_no="A", query="本月 账单")) == alice
+    assert cache.make_key(dict(base, customer_no="A", history=[{"role": "user", "content": "x"}])) != alice
+
+
+def test_payload_without_identity_bypasses_cache():
+    cache = _cache()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return {"status": "ok", "output": "x"}
+
+    async def main():
+        for _ in range(2):
+            await cache.get_or_call({"query": "q"}, call)
+
+    asyncio.run(main())
+    assert len(calls) == 2
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["bypassed"] == 2
+
+
+def test_hits_are_independent_copies():
+    cache = _cache()
+    payload = {"customer_no": "A", "query": "q"}
+
+    async def call():
+        return {"status": "ok", "output": {"rows": [1]}}
+
+    async def main():
+        first = await cache.get_or_call(payload, call)
+        first["output"]["rows"].append(2)
+        second = await cache.get_or_call(payload, call)
+        second["output"]["rows"].append(3)
+        return await cache.get_or_call(payload, call)
+
+    assert asyncio.run(main())["output"] == {"rows": [1]}
+    assert cache.stats()["hits"] == 2
+
+
+def test_only_successful_responses_are_stored():
+    cache = _cache()
+    payload = {"customer_no": "A", "query": "q"}
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return {"status": "fail", "error": "boom", "output": None}
+
+    async def main():
+        await cache.get_or_call(payload, call)
+        await cache.get_or_call(payload, call)
+
+    asyncio.run(main())
+    assert len(calls) == 2
+
+
+def test_single_flight_shares_one_call():
+    cache = _cache()
+    payload = {"customer_no": "A", "query": "q"}
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return {"status": "ok", "output": {"rows": [1]}}
+
+    async def main():
+        return await asyncio.gather(*[cache.get_or_call(payload, call) for _ in range(5)])
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert cache.stats()["joined"] == 4
+    assert all(r["output"] == {"rows": [1]} for r in results)
+    assert len({id(r) for r in results}) == 5
+
+
+def test_joiner_retries_when_leader_is_cancelled():
+    cache = _cache()
+    payload = {"customer_no": "A", "query": "q"}
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"status": "ok", "output": len(calls)}
+
+    async def main():
+        leader = asyncio.ensure_future(cache.get_or_call(payload, call))
+        await asyncio.sleep(0)
+        joiner = asyncio.ensure_future(cache.get_or_call(payload, call))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await joiner
+
+    assert asyncio.run(main())["status"] == "ok"
+    assert len(calls) == 2
+
+
+def test_expired_entries_are_refetched():
+    cache = _cache(ttl=0.01)
+    key = cache.make_key({"customer_no": "A", "query": "q"})
+    cache.put(key, {"status": "ok"})
+    assert cache.get(key)[0]
+    asyncio.run(asyncio.sleep(0.02))
+    assert cache.get(key) == (False, None)
@@ -0,0 +1,47 @@
+import asyncio
+
+from utils.agent_pool import AgentClientPool
+from utils.loop_runner import BackgroundLoop
+
+
+async def _client(pool):
+    return pool.async_client
+
+
+def test_one_client_per_loop_reused_across_switches():
+    pool = AgentClientPool("agent", "http://agent")
+    background = BackgroundLoop("test-loop")
+    try:
+
+        async def main():
+            seen = []
+            for _ in range(3):
+                seen.append(pool.async_client)
+                seen.append(await asyncio.wrap_future(background.submit(_client(pool))))
+            return seen
+
+        seen = asyncio.run(main())
+        request_clients = {id(c) for c in seen[0::2]}
+        background_clients = {id(c) for c in seen[1::2]}
+        assert len(request_clients) == 1
+        assert len(background_clients) == 1
+        assert request_clients != background_clients
+    finally:
+        background.stop()
+
+
+def test_aclose_closes_every_loops_client():
+    pool = AgentClientPool("agent", "http://agent")
+    background = BackgroundLoop("test-loop")
+    try:
+
+        async def main():
+            mine = pool.async_client
+            other = await asyncio.wrap_future(background.submit(_client(pool)))
+            await pool.aclose()
+            return mine, other
+
+        mine, other = asyncio.run(main())
+        assert mine.is_closed and other.is_closed
+    finally:
+        background.stop()
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from nodes.worker import _execute_hedged
+from utils.bulkhead import Bulkhead, BulkheadFullError
+
+
+def test_rejects_beyond_queue():
+    bulkhead = Bulkhead("agent", max_in_flight=1, max_queue=0)
+
+    async def main():
+        await bulkhead.acquire()
+        with pytest.raises(BulkheadFullError):
+            await bulkhead.acquire()
+        bulkhead.release()
+
+    asyncio.run(main())
+    assert bulkhead.stats()["rejected"] == 1
+    assert bulkhead.stats()["in_flight"] == 0
+
+
+def test_release_hands_slot_to_waiter_in_order():
+    bulkhead = Bulkhead("agent", max_in_flight=1, max_queue=2)
+    order = []
+
+    async def worker(name):
+        await bulkhead.acquire()
+        order.append(name)
+        await asyncio.sleep(0.01)
+        bulkhead.release()
+
+    async def main():
+        await bulkhead.acquire()
+        tasks = [asyncio.ensure_future(worker(n)) for n in ("a", "b")]
+        await asyncio.sleep(0.01)
+        assert bulkhead.stats()["queued"] == 2
+        bulkhead.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["a", "b"]
+    assert bulkhead.stats()["in_flight"] == 0
+    assert bulkhead.stats()["queued"] == 0
+
+
+def test_queue_timeout_and_cancelled_waiter_do_not_leak_slots():
+    bulkhead = Bulkhead("agent", max_in_flight=1, max_queue=2, queue_timeout=0.02)
+
+    async def main():
+        await bulkhead.acquire()
+        with pytest.raises(BulkheadFullError):
+            await bulkhead.acquire()
+        waiter = asyncio.ensure_future(bulkhead.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        bulkhead.release()
+
+    asyncio.run(main())
+    assert bulkhead.stats()["in_flight"] == 0
+    assert bulkhead.stats()["queued"] == 0
+
+
+def test_try_acquire_never_queues():
+    bulkhead = Bulkhead("agent", max_in_flight=1, max_queue=4)
+    assert bulkhead.try_acquire()
+    assert not bulkhead.try_acquire()
+    bulkhead.release()
+    assert bulkhead.try_acquire()
+
+
+def test_hedge_takes_its_own_slot():
+    bulkhead = Bulkhead("agent", max_in_flight=2, max_queue=0)
+    calls = []
+
+    async def slow_then_fast(payload):
+        calls.append(bulkhead.stats()["in_flight"])
+        await asyncio.sleep(0.2 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    async def main():
+        await bulkhead.acquire()
+        result = await _execute_hedged(slow_then_fast, {}, bulkhead, 0.02)
+        bulkhead.release()
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == 2
+    assert calls == [1, 2]
+    assert bulkhead.stats()["in_flight"] == 0
+
+
+def test_hedge_skipped_without_a_free_slot():
+    bulkhead = Bulkhead("agent", max_in_flight=1, max_queue=0)
+    calls = []
+
+    async def slow(payload):
+        calls.append(payload)
+        await asyncio.sleep(0.05)
+        return "primary"
+
+    async def main():
+        await bulkhead.acquire()
+        result = await _execute_hedged(slow, {}, bulkhead, 0.01)
+        bulkhead.release()
+        return result
+
+    assert asyncio.run(main()) == "primary"
+    assert len(calls) == 1
+    assert bulkhead.stats()["in_flight"] == 0
@@ -0,0 +1,23 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from utils import call_llm
+
+
+def test_langchain_retries_are_disabled_by_default():
+    assert call_llm._LLM_KWARGS["max_retries"] == 0
+
+
+def test_async_call_is_bounded_by_the_timeout(monkeypatch):
+    async def ainvoke(messages, **kwargs):
+        # A client that ignores its per-operation timeout (e.g. a slow trickling response).
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(call_llm, "_async_llm", lambda: SimpleNamespace(ainvoke=ainvoke))
+    started = time.perf_counter()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(call_llm.aexecute_react_agent("hi", timeout=0.05))
+    assert time.perf_counter() - started < 1.0
@@ -0,0 +1,159 @@
+import asyncio
+import time
+
+import pytest
+
+from nodes.worker import _invoke_agent
+from utils.bulkhead import Bulkhead
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def _half_open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("agent", min_calls=1, open_s=0.0)
+    breaker.record(False, 0.01)
+    assert breaker.state == HALF_OPEN
+    return breaker
+
+
+def _entry(execute, breaker, **extra):
+    entry = {"execute": execute, "breaker": breaker, "bulkhead": None, "timeout": None}
+    entry.update(extra)
+    return entry
+
+
+def test_opens_on_error_rate_and_probes_after_open_s():
+    breaker = CircuitBreaker("agent", min_calls=4, error_rate=0.5, open_s=0.05)
+    for ok in (True, False, True, False):
+        breaker.record(ok, 0.01)
+    assert breaker.state == OPEN
+    assert breaker.allow() is False
+    time.sleep(0.06)
+    assert breaker.admit() == HALF_OPEN
+    # Only one probe at a time.
+    assert breaker.admit() is None
+    breaker.record(True, 0.01)
+    assert breaker.state == CLOSED
+
+
+def test_failed_probe_reopens():
+    breaker = _half_open_breaker()
+    breaker.open_s = 60.0
+    assert breaker.admit() == HALF_OPEN
+    breaker.record(False, 0.01)
+    assert breaker.state == OPEN
+
+
+def test_opens_on_slow_rate():
+    breaker = CircuitBreaker("agent", min_calls=2, slow_call_s=1.0, slow_rate=0.5)
+    breaker.record(True, 2.0)
+    breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+
+
+def test_abandoned_probe_lets_the_next_call_probe():
+    breaker = _half_open_breaker()
+    admitted = breaker.admit()
+    assert breaker.admit() is None
+    breaker.abandon(admitted)
+    assert breaker.admit() == HALF_OPEN
+
+
+def test_abandon_of_closed_call_keeps_the_probe_slot():
+    breaker = _half_open_breaker()
+    assert breaker.admit() == HALF_OPEN
+    breaker.abandon(CLOSED)
+    assert breaker.admit() is None
+
+
+def test_probe_success_closes():
+    breaker = _half_open_breaker()
+
+    async def ok(payload):
+        return {"status": "ok", "data": "fine"}
+
+    res = asyncio.run(_invoke_agent(_entry(ok, breaker), "agent", {"query": "q"}, None))
+    assert res["status"] == "ok"
+    assert breaker.state == CLOSED
+
+
+def test_probe_exception_reopens():
+    breaker = _half_open_breaker()
+    breaker.open_s = 60.0
+
+    async def boom(payload):
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(_invoke_agent(_entry(boom, breaker), "agent", {}, None))
+    assert breaker.state == OPEN
+
+
+def test_probe_cancelled_releases_probe():
+    breaker = _half_open_breaker()
+
+    async def slow(payload):
+        await asyncio.sleep(10)
+
+    async def main():
+        task = asyncio.ensure_future(_invoke_agent(_entry(slow, breaker), "agent", {}, None))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert breaker.state == HALF_OPEN
+    assert breaker.admit() == HALF_OPEN
+
+
+def test_request_deadline_is_not_an_agent_failure():
+    breaker = _half_open_breaker()
+
+    async def slow(payload):
+        await asyncio.sleep(10)
+
+    entry = _entry(slow, breaker, timeout=20)
+    res = asyncio.run(_invoke_agent(entry, "agent", {}, 0.02))
+    assert res["error"] == "deadline exceeded"
+    assert breaker.state == HALF_OPEN
+    assert breaker.admit() == HALF_OPEN
+
+
+def test_agent_timeout_counts_as_failure():
+    breaker = _half_open_breaker()
+    breaker.open_s = 60.0
+
+    async def slow(payload):
+        await asyncio.sleep(10)
+
+    entry = _entry(slow, breaker, timeout=0.02)
+    res = asyncio.run(_invoke_agent(entry, "agent", {}, 5.0))
+    assert res["error"] == "agent timeout"
+    assert breaker.state == OPEN
+
+
+def test_full_bulkhead_does_not_take_the_probe():
+    breaker = _half_open_breaker()
+    bulkhead = Bulkhead("agent", max_in_flight=1, max_queue=0)
+    assert bulkhead.try_acquire()
+
+    async def ok(payload):
+        return {"status": "ok", "data": "fine"}
+
+    entry = _entry(ok, breaker, bulkhead=bulkhead)
+    res = asyncio.run(_invoke_agent(entry, "agent", {}, None))
+    assert res["status"] == "fail" and "bulkhead full" in res["error"]
+    assert breaker.admit() == HALF_OPEN
+
+
+def test_open_circuit_gives_the_bulkhead_slot_back():
+    breaker = CircuitBreaker("agent", min_calls=1, open_s=60.0)
+    breaker.record(False, 0.01)
+    bulkhead = Bulkhead("agent", max_in_flight=1, max_queue=0)
+
+    async def ok(payload):
+        return {"status": "ok", "data": "fine"}
+
+    res = asyncio.run(_invoke_agent(_entry(ok, breaker, bulkhead=bulkhead), "agent", {}, None))
+    assert res["error"] == "circuit open: agent"
+    assert bulkhead.stats()["in_flight"] == 0
@@ -0,0 +1,46 @@
+import asyncio
+import json
+
+import httpx
+
+from nodes.worker import _invoke_agent
+from utils.agent_cache import AgentResponseCache
+from utils.agent_register import make_http_stream_executor_async
+from utils.circuit_breaker import CircuitBreaker
+
+
+class _BrokenStream(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        yield ("data: " + json.dumps({"type": "message", "content": "part"}) + "\n\n").encode()
+        raise httpx.ReadTimeout("read timed out")
+
+
+class _Pool:
+    """Stands in for AgentClientPool: a client whose transport serves `stream`."""
+
+    def __init__(self, stream):
+        self.async_client = httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, stream=stream))
+        )
+
+
+def test_interrupted_stream_is_a_failure():
+    breaker = CircuitBreaker("agent", min_calls=1, open_s=60.0)
+    cache = AgentResponseCache("agent", identity_fields=["customer_no"])
+    executor = make_http_stream_executor_async("http://agent/stream", pool=_Pool(_BrokenStream()))
+    entry = {"execute": executor, "streaming": True, "breaker": breaker, "timeout": None}
+    seen = []
+    payload = {"customer_no": "A", "query": "q"}
+
+    async def main():
+        return await cache.get_or_call(
+            payload,
+            lambda: _invoke_agent(entry, "agent", payload, None, {"trace": None, "on_raw": seen.append}),
+        )
+
+    res = asyncio.run(main())
+    assert res["status"] == "fail"
+    assert "stream interrupted" in res["error"]
+    assert res["output"]["_stream_raw_events"] == seen == [{"type": "message", "content": "part"}]
+    assert breaker.state == "open"
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+
+from utils.plan_cache import PlanCache, make_plan_key
+
+STEPS = [("查询余额", "#E1", "SerialCallAgent", '{"agent": "account"}')]
+
+
+def test_key_ignores_whitespace_and_tracks_catalog():
+    assert make_plan_key("查 余额 ", "fp") == make_plan_key("查  余额", "fp")
+    assert make_plan_key("查余额", "fp") != make_plan_key("查余额", "fp2")
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "plans.sqlite")
+    cache = PlanCache(disk_path=path)
+    cache.put("k", "plan", STEPS)
+    cache.close()
+    reopened = PlanCache(disk_path=path)
+    assert reopened.get("k") == {"plan_string": "plan", "steps": STEPS}
+    assert reopened.stats()["disk_hits"] == 1
+    reopened.invalidate("k")
+    assert reopened.get("k") is None
+
+
+def test_async_calls_with_disk_tier_run_off_the_loop(tmp_path, monkeypatch):
+    cache = PlanCache(disk_path=str(tmp_path / "plans.sqlite"))
+    threads = []
+    original = cache.get
+
+    def get(key):
+        threads.append(threading.current_thread())
+        return original(key)
+
+    monkeypatch.setattr(cache, "get", get)
+
+    async def main():
+        await cache.aput("k", "plan", STEPS)
+        found = await cache.aget("k")
+        await cache.ainvalidate("k")
+        return found, await cache.aget("k")
+
+    found, gone = asyncio.run(main())
+    assert found["plan_string"] == "plan"
+    assert gone is None
+    assert threads and all(t is not threading.main_thread() for t in threads)
+
+
+def test_async_calls_without_disk_tier_stay_inline(monkeypatch):
+    cache = PlanCache()
+    monkeypatch.setattr(asyncio, "to_thread", None)
+
+    async def main():
+        await cache.aput("k", "plan", STEPS)
+        return await cache.aget("k")
+
+    assert asyncio.run(main())["steps"] == STEPS
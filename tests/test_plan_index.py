@@ -0,0 +1,152 @@
+import asyncio
+import math
+import random
+import threading
+
+import pytest
+
+import utils.plan_index as plan_index_module
+from utils.plan_index import PlanIndex, char_ngrams, instantiate_plan, plan_template
+
+FP = "fp"
+
+
+def _steps(agent="account"):
+    return [("查询", "#E1", "SerialCallAgent", '{"agent": "%s", "input": "$WORKING_INPUT"}' % agent),
+            ("输出", "#E2", "FinalOutput", "#E1")]
+
+
+def _reference_cosine(index, query, task):
+    """Brute-force TF-IDF cosine over the live corpus as the index currently weighs it."""
+    q = char_ngrams(query, index.ngram_range)
+    d = char_ngrams(task, index.ngram_range)
+    idf = index._idf
+    dot = sum(q[g] * d[g] * idf(g) ** 2 for g in q if g in d)
+    qn = math.sqrt(sum((tf * idf(g)) ** 2 for g, tf in q.items()))
+    dn = math.sqrt(sum((tf * idf(g)) ** 2 for g, tf in d.items()))
+    return dot / (qn * dn)
+
+
+def test_plan_template_rejects_split_and_hardcoded_queries():
+    assert plan_template(_steps())
+    assert not plan_template([("拆分", "#E1", "SplitQuery", "a;b")])
+    assert not plan_template([("查", "#E1", "SerialCallAgent", '{"agent": "a", "query": "固定"}')])
+    assert not plan_template([])
+
+
+def test_add_lookup_and_fingerprint():
+    index = PlanIndex(threshold=0.5)
+    assert index.add("查询我的账户余额", "plan-a", _steps(), FP)
+    hit = index.lookup("查询一下我的账户余额", FP)
+    assert hit["plan_string"] == "plan-a" and hit["score"] >= 0.5
+    assert index.lookup("查询一下我的账户余额", "other-catalog") is None
+    assert index.lookup("推荐理财产品", FP) is None
+    assert index.stats()["hits"] == 1 and index.stats()["misses"] == 2
+
+
+def test_add_replaces_same_task_and_remove_drops_it():
+    index = PlanIndex(threshold=0.5)
+    index.add("查询账户余额", "old", _steps(), FP)
+    index.add(" 查询账户余额  ", "new", _steps(), FP)
+    assert len(index) == 1
+    assert index.lookup("查询账户余额", FP)["plan_string"] == "new"
+    index.remove("查询账户余额")
+    assert len(index) == 0
+    assert index.lookup("查询账户余额", FP) is None
+    index.remove("never added")
+
+
+def test_max_entries_evicts_oldest():
+    index = PlanIndex(threshold=0.9, max_entries=2)
+    for i, task in enumerate(["查询账户余额", "推荐理财产品", "办理信用卡分期"]):
+        index.add(task, f"plan-{i}", _steps(), FP)
+    assert len(index) == 2
+    assert index.lookup("查询账户余额", FP) is None
+    assert index.lookup("办理信用卡分期", FP)["plan_string"] == "plan-2"
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_refit_keeps_scores_exact(monkeypatch, use_numpy):
+    if use_numpy and plan_index_module.np is None:
+        pytest.skip("numpy not installed")
+    if not use_numpy:
+        monkeypatch.setattr(plan_index_module, "np", None)
+    rng = random.Random(7)
+    words = ["查询", "账户", "余额", "理财", "产品", "推荐", "信用卡", "分期", "转账", "记录", "本月", "账单"]
+    index = PlanIndex(threshold=0.0, shortlist=1000)
+    refits = []
+    original_refit = index._refit
+
+    def counting_refit():
+        refits.append(len(index._docs))
+        original_refit()
+
+    monkeypatch.setattr(index, "_refit", counting_refit)
+    tasks = []
+    for i in range(300):
+        task = "".join(rng.sample(words, 4)) + str(i)
+        tasks.append(task)
+        index.add(task, task, _steps(), FP)
+        if i % 7 == 0:
+            index.remove(tasks[rng.randrange(len(tasks))])
+    # Refits happen as the corpus doubles; removed documents are compacted away.
+    assert len(refits) >= 2
+    assert len(index._docs) <= 2 * len(index) + 64
+    # Between refits norms use the idf of the last fit; right after one, scores are exact.
+    index._refit()
+    live = {doc["task"] for doc in index._docs if doc is not None}
+    assert len(live) == len(index)
+    query = "查询本月账户余额"
+    hit = index.lookup(query, FP)
+    best = max(live, key=lambda task: _reference_cosine(index, query, task))
+    assert hit["task"] == best
+    assert hit["score"] == pytest.approx(_reference_cosine(index, query, best), abs=1e-4)
+
+
+def test_instantiate_plan_rebinds_task():
+    entry = {"task": "查询账户余额", "plan_string": "Plan: 查询账户余额\n#E1 = FinalOutput[查询账户余额]"}
+    plan, steps, _ = instantiate_plan(entry, "查一下余额", lambda text: ([("x", "#E1", "FinalOutput", text)], ""))
+    assert "查询账户余额" not in plan and "查一下余额" in plan
+
+
+def test_refit_builds_outside_the_lock_and_replays_changes(monkeypatch):
+    index = PlanIndex(threshold=0.5)
+    for task in ["查询账户余额", "推荐理财产品", "办理信用卡分期"]:
+        index.add(task, task, _steps(), FP)
+    entered, release = threading.Event(), threading.Event()
+    build = PlanIndex._build
+
+    def slow_build(entries):
+        entered.set()
+        assert release.wait(5)
+        return build(entries)
+
+    monkeypatch.setattr(index, "_build", slow_build)
+    worker = threading.Thread(target=index._refit)
+    worker.start()
+    assert entered.wait(5)
+    # The lock is free while the new index is being built.
+    assert index.lookup("查询账户余额", FP)["plan_string"] == "查询账户余额"
+    index.remove("推荐理财产品")
+    index.add("查询本月账单", "查询本月账单", _steps(), FP)
+    release.set()
+    worker.join(5)
+
+    assert index._fit_size == 3
+    assert len(index) == 3
+    assert index.lookup("推荐理财产品", FP) is None
+    assert index.lookup("查询本月账单", FP)["plan_string"] == "查询本月账单"
+    assert index.lookup("查询账户余额", FP)["plan_string"] == "查询账户余额"
+
+
+def test_async_wrappers():
+    index = PlanIndex(threshold=0.5)
+
+    async def main():
+        assert await index.aadd("查询账户余额", "plan", _steps(), FP)
+        hit = await index.alookup("查询一下账户余额", FP)
+        await index.aremove("查询账户余额")
+        return hit, await index.alookup("查询账户余额", FP)
+
+    hit, miss = asyncio.run(main())
+    assert hit["plan_string"] == "plan" and miss is None
@@ -0,0 +1,43 @@
+import asyncio
+from types import SimpleNamespace
+
+from nodes.worker import _call_agent_prefetched
+
+
+def _runtime(timeout=None):
+    async def never(payload):
+        await asyncio.sleep(10)
+
+    return SimpleNamespace(agent_registry={"agent": {"execute": never, "timeout": timeout}})
+
+
+def _run(runtime, deadline):
+    async def main():
+        task = asyncio.ensure_future(asyncio.sleep(10, result={"status": "ok"}))
+        execution = SimpleNamespace(prefetched={"#E1": {"agent": "agent", "payload": {"q": 1}, "task": task}})
+        res = await _call_agent_prefetched(runtime, execution, "#E1", "agent", {"q": 1}, deadline)
+        await asyncio.sleep(0)
+        return res, task
+
+    return asyncio.run(main())
+
+
+def test_prefetched_call_honours_request_deadline():
+    res, task = _run(_runtime(timeout=20), 0.02)
+    assert res["error"] == "deadline exceeded"
+    assert task.cancelled()
+
+
+def test_prefetched_call_honours_agent_timeout():
+    res, task = _run(_runtime(timeout=0.02), 5.0)
+    assert res["error"] == "agent timeout"
+    assert task.cancelled()
+
+
+def test_prefetched_result_is_reused():
+    async def main():
+        task = asyncio.ensure_future(asyncio.sleep(0, result={"status": "ok", "output": 1}))
+        execution = SimpleNamespace(prefetched={"#E1": {"agent": "agent", "payload": {"q": 1}, "task": task}})
+        return await _call_agent_prefetched(_runtime(), execution, "#E1", "agent", {"q": 1}, 1.0)
+
+    assert asyncio.run(main()) == {"status": "ok", "output": 1}
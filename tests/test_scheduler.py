@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import runtime as runtime_module
+from State import ExecutionState
+from nodes.scheduler import run_scheduler_async
+
+
+def _runtime(monkeypatch, agents):
+    monkeypatch.setattr(runtime_module, "sop_config", {"base_dir": ".", "cache_dir": None, "watch_interval": 0, "sops": []})
+    return runtime_module.AgentRuntime(
+        {name: {"description": name, "endpoint": {"type": "local", "callable": fn}} for name, fn in agents.items()}
+    )
+
+
+def _call(var, agent):
+    return (f"调用{agent}", var, "SerialCallAgent", json.dumps({"agent": agent, "input": "$WORKING_INPUT"}))
+
+
+def _state(*steps):
+    return {
+        "working_input": {"query": "查一下", "history": []},
+        "execution": ExecutionState(steps=list(steps)),
+        "pending_queries": [],
+        "slots": {},
+    }
+
+
+def _run(monkeypatch, agents, state):
+    rt = _runtime(monkeypatch, agents)
+
+    async def main():
+        await asyncio.wait_for(run_scheduler_async(state, rt), 2.0)
+        # Let cancellations reach the agent coroutines.
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+    asyncio.run(main())
+    return state
+
+
+def test_independent_steps_overlap(monkeypatch):
+    # Each agent waits until the other has started: only a concurrent run finishes in time.
+    started = {"a": asyncio.Event(), "b": asyncio.Event()}
+
+    def agent(name, other):
+        async def execute(payload):
+            started[name].set()
+            await asyncio.wait_for(started[other].wait(), 1.0)
+            return {"status": "ok", "data": name}
+
+        return execute
+
+    state = _state(_call("#E1", "a"), _call("#E2", "b"))
+    _run(monkeypatch, {"a": agent("a", "b"), "b": agent("b", "a")}, state)
+    results = state["execution"].results
+    assert [results[v].status for v in ("#E1", "#E2")] == ["ok", "ok"]
+    assert state.get("eval_status") != "NEED_REPLAN"
+
+
+def test_step_after_append_history_sees_the_history(monkeypatch):
+    seen = []
+
+    async def first(payload):
+        await asyncio.sleep(0.01)
+        return {"status": "ok", "data": "余额100元"}
+
+    async def second(payload):
+        seen.append(list(payload.get("history") or []))
+        return {"status": "ok", "data": "推荐理财"}
+
+    state = _state(
+        _call("#E1", "first"),
+        ("写入历史", "#E2", "AppendHistory", "#E1"),
+        _call("#E3", "second"),
+    )
+    _run(monkeypatch, {"first": first, "second": second}, state)
+    assert seen and {"role": "assistant", "content": "余额100元"} in seen[0]
+    assert list(state["execution"].results) == ["#E1", "#E2", "#E3"]
+
+
+def test_failure_cancels_running_calls(monkeypatch):
+    cancelled = []
+
+    async def broken(payload):
+        return {"status": "fail", "reason": "boom"}
+
+    async def slow(payload):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return {"status": "ok", "data": "late"}
+
+    state = _state(_call("#E1", "slow"), _call("#E2", "broken"))
+    _run(monkeypatch, {"slow": slow, "broken": broken}, state)
+    assert state["eval_status"] == "NEED_REPLAN"
+    assert cancelled == [True]
+    assert "#E1" not in state["execution"].results
+
+
+def test_results_are_kept_in_plan_order(monkeypatch):
+    fast_done = []
+
+    async def slow(payload):
+        while not fast_done:
+            await asyncio.sleep(0.005)
+        return {"status": "ok", "data": "slow"}
+
+    async def fast(payload):
+        fast_done.append(True)
+        return {"status": "ok", "data": "fast"}
+
+    state = _state(_call("#E1", "slow"), _call("#E2", "fast"), _call("#E3", "fast"))
+    _run(monkeypatch, {"slow": slow, "fast": fast}, state)
+    assert list(state["execution"].results) == ["#E1", "#E2", "#E3"]
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from utils.session_store import (
+    MemorySessionStore,
+    RedisSessionStore,
+    SqliteSessionStore,
+    build_session_store,
+    session_turn,
+)
+
+
+class _FakeRedis:
+    """The get/set(ex=)/delete subset RedisSessionStore relies on."""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode("utf-8")
+        self.expiry[key] = ex
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        store = MemorySessionStore(ttl=60)
+    elif request.param == "sqlite":
+        store = SqliteSessionStore(str(tmp_path / "sessions.sqlite"), ttl=60)
+    else:
+        store = RedisSessionStore(_FakeRedis(), ttl=60)
+    yield store
+    store.close()
+
+
+def _turn():
+    return session_turn(
+        history=[{"role": "user", "content": "转账"}, {"role": "assistant", "content": "请问金额？"}],
+        query="500元",
+        answer={"text": "已转账"},
+        slots={"amount": "500元"},
+        sop_runtime={"active": True, "active_sop_id": "transfer", "cursor": "do_transfer"},
+        pending_question=None,
+        results={"#E1": {"status": "ok"}},
+        max_history=3,
+    )
+
+
+def test_round_trip(store):
+    data = _turn()
+    store.put("s1", data)
+    loaded = store.get("s1")
+    assert loaded == json.loads(json.dumps(data, ensure_ascii=False))
+    assert [m["content"] for m in loaded["history"]] == ["请问金额？", "500元", '{"text": "已转账"}']
+    assert store.get("missing") is None
+    store.delete("s1")
+    assert store.get("s1") is None
+    assert store.stats()["backend"] == store.backend
+    assert store.stats()["writes"] == 1
+
+
+def test_loaded_sessions_are_independent_copies(store):
+    data = _turn()
+    store.put("s1", data)
+    data["slots"]["amount"] = "changed before read"
+    first = store.get("s1")
+    first["history"].append({"role": "user", "content": "mutated"})
+    first["slots"]["amount"] = "mutated"
+    first["sop_runtime"]["cursor"] = "mutated"
+    second = store.get("s1")
+    assert second["slots"] == {"amount": "500元"}
+    assert second["sop_runtime"]["cursor"] == "do_transfer"
+    assert len(second["history"]) == 3
+
+
+def test_expired_sessions_are_dropped(tmp_path):
+    for store in (MemorySessionStore(ttl=0.01), SqliteSessionStore(str(tmp_path / "s.sqlite"), ttl=0.01)):
+        store.put("s1", {"slots": {}})
+        time.sleep(0.02)
+        assert store.get("s1") is None
+        assert store.stats()["misses"] == 1
+        store.close()
+
+
+def test_memory_store_evicts_least_recent():
+    store = MemorySessionStore(max_entries=2)
+    store.put("a", {})
+    store.put("b", {})
+    store.get("a")
+    store.put("c", {})
+    assert store.get("b") is None
+    assert store.get("a") == {} and store.get("c") == {}
+
+
+def test_redis_expiry_is_left_to_the_server():
+    client = _FakeRedis()
+    RedisSessionStore(client, ttl=90).put("s1", {})
+    assert client.expiry == {"reactor:session:s1": 90}
+
+
+def test_build_session_store(tmp_path):
+    assert build_session_store({"enabled": False}) is None
+    assert isinstance(build_session_store({"enabled": True}), MemorySessionStore)
+    sqlite = build_session_store({"enabled": True, "backend": "sqlite", "path": str(tmp_path / "x.sqlite")})
+    assert isinstance(sqlite, SqliteSessionStore)
+    sqlite.close()
+    with pytest.raises(ValueError):
+        build_session_store({"enabled": True, "backend": "nope"})
+
+
+def test_async_access_runs_file_io_off_the_loop(tmp_path, monkeypatch):
+    store = SqliteSessionStore(str(tmp_path / "sessions.sqlite"))
+    threads = []
+    original = store.put
+
+    def put(session_id, data):
+        threads.append(threading.current_thread())
+        original(session_id, data)
+
+    monkeypatch.setattr(store, "put", put)
+
+    async def main():
+        await store.aput("s1", {"slots": {"a": 1}})
+        return await store.aget("s1")
+
+    assert asyncio.run(main()) == {"slots": {"a": 1}}
+    assert threads and threads[0] is not threading.main_thread()
+    store.close()
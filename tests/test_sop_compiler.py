@@ -0,0 +1,53 @@
+import pytest
+
+from utils.sop_compiler import AllFilled, Always, AnyFilled, NlpContains, SlotFilled, SopCompileError, compile_condition, compile_sop
+from utils.sop_engine import build_plan_from_sop
+
+
+@pytest.mark.parametrize(
+    "expr",
+    ["all_filled(amount)", "all_filled([amount])", 'all_filled(["amount"])', "all_filled(['amount'])", 'all_filled("amount")'],
+)
+def test_argument_spellings_name_the_slot(expr):
+    assert compile_condition(expr) == AllFilled(("amount",))
+
+
+def test_lists_and_other_predicates():
+    assert compile_condition("any_filled([amount, term])") == AnyFilled(("amount", "term"))
+    assert compile_condition("slot_filled[amount]") == SlotFilled("amount")
+    assert compile_condition("nlp_contains([转账, 汇款])") == NlpContains(("转账", "汇款"))
+    assert compile_condition("else") == Always()
+
+
+@pytest.mark.parametrize("expr", ["amount>3", "all_filled()", "all_filled([])", "all_filled([[amount]])", "nlp_contains((词))"])
+def test_malformed_conditions_fail_at_load(expr):
+    with pytest.raises(SopCompileError):
+        compile_condition(expr)
+
+
+def test_compile_error_names_sop_and_state():
+    sop = {"id": "t", "states": [{"id": "s", "type": "decision", "transitions": [{"when": "all_filled([[x]])", "to": "s"}]}]}
+    with pytest.raises(SopCompileError, match="'t'.*'s'"):
+        compile_sop(sop)
+
+
+def test_unquoted_list_condition_reaches_the_action():
+    sop = {
+        "id": "transfer",
+        "slots": [{"name": "amount", "type": "amount"}],
+        "start_state": "start",
+        "states": [
+            {"id": "start", "type": "start", "next": "check"},
+            {
+                "id": "check",
+                "type": "decision",
+                "transitions": [{"when": "all_filled([amount])", "to": "act"}, {"when": "else", "to": "ask"}],
+            },
+            {"id": "ask", "type": "prompt", "needed_slots": ["amount"], "utterances": ["转多少？"]},
+            {"id": "act", "type": "action", "calls": [{"agent": "transfer_service", "input": "$WORKING_INPUT"}]},
+        ],
+    }
+    state = {"task": "帮我转账5000元", "working_input": {"query": "帮我转账5000元"}, "slots": {}}
+    patch = build_plan_from_sop(sop, state)
+    assert patch["slots"]["amount"] == "5000元"
+    assert "transfer_service" in patch["plan_string"]
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+import nodes.planner as planner_module
+import runtime as runtime_module
+from Service import AgentReACTORPlanner
+from utils.ReACTORTracer import TraceCollector
+from utils.sop_registry import build_sop_registry
+
+SOP = """id: transfer
+intent: 转账
+description: 转账流程
+triggers: ["转账"]
+slots:
+  - name: amount
+    type: amount
+    required: true
+start_state: start
+states:
+  - id: start
+    type: start
+    next: check
+  - id: check
+    type: decision
+    transitions:
+      - when: all_filled(amount)
+        to: act
+      - when: else
+        to: ask
+  - id: ask
+    type: prompt
+    needed_slots: [amount]
+    utterances: ["转多少？"]
+  - id: act
+    type: action
+    calls:
+      - agent: transfer_service
+        input: $WORKING_INPUT
+    next: done
+  - id: done
+    type: end
+"""
+
+
+@pytest.fixture
+def service(monkeypatch, tmp_path):
+    (tmp_path / "transfer.yaml").write_text(SOP, encoding="utf-8")
+    monkeypatch.setattr(runtime_module, "sop_config", {"base_dir": str(tmp_path), "cache_dir": None, "watch_interval": 0, "sops": []})
+    rt = runtime_module.AgentRuntime({})
+    rt.publish_sops(build_sop_registry({"base_dir": str(tmp_path), "sops": ["transfer.yaml"]}))
+    return AgentReACTORPlanner(rt)
+
+
+def _state(query):
+    return {"task": query, "working_input": {"query": query, "history": []}, "slots": {}, "sop_runtime": {}}
+
+
+def test_planner_reuses_the_fast_lane_selection(monkeypatch, service):
+    state = _state("帮我转账5000元")
+    assert service._sop_fast_lane(state) is False
+    assert state["sop_plan"]["patch"] is not None
+
+    def fail(*args, **kwargs):
+        raise AssertionError("SOP selected twice")
+
+    monkeypatch.setattr(planner_module, "select_sop", fail)
+    patch = asyncio.run(planner_module.run_planner(state, service.graph.runtime))
+    assert patch["plan_source"] == "sop"
+    assert "transfer_service" in patch["plan_string"]
+    assert patch["sop_plan"] is None
+
+
+def test_stale_selection_is_ignored_after_a_reload(service):
+    state = _state("帮我转账5000元")
+    service._sop_fast_lane(state)
+    state["sop_plan"] = dict(state["sop_plan"], fingerprint="other", patch=None)
+    patch = asyncio.run(planner_module.run_planner(state, service.graph.runtime))
+    assert "transfer_service" in patch["plan_string"]
+
+
+def test_missing_slot_takes_the_fast_lane(service):
+    state = _state("我要转账")
+    state["trace"] = TraceCollector(event_type="planning")
+    assert service._sop_fast_lane(state) is True
+    assert state["result"] == "转多少？"
+    assert "sop_plan" not in state
@@ -0,0 +1,74 @@
+import threading
+
+import runtime as runtime_module
+from utils.plan_cache import catalog_fingerprint
+from utils.sop_registry import build_sop_catalog
+
+SOP = """id: {sop_id}
+intent: 转账
+description: {desc}
+triggers: ["转账"]
+states:
+  - id: start
+    type: start
+    next: done
+  - id: done
+    type: end
+"""
+
+
+def _write(path, sop_id, desc):
+    path.write_text(SOP.format(sop_id=sop_id, desc=desc), encoding="utf-8")
+
+
+def _runtime(monkeypatch, tmp_path):
+    _write(tmp_path / "a.yaml", "transfer", "v0")
+    monkeypatch.setattr(
+        runtime_module,
+        "sop_config",
+        {"base_dir": str(tmp_path), "cache_dir": None, "watch_interval": 0, "sops": [{"path": "a.yaml"}]},
+    )
+    return runtime_module.AgentRuntime({})
+
+
+def test_reload_publishes_a_new_snapshot(monkeypatch, tmp_path):
+    rt = _runtime(monkeypatch, tmp_path)
+    before = rt.sops
+    assert rt.reload_sops()["status"] == "unchanged"
+    assert rt.sops is before
+
+    _write(tmp_path / "a.yaml", "transfer", "v1 with a longer description")
+    assert rt.reload_sops()["status"] == "reloaded"
+    after = rt.sops
+    assert after is not before
+    assert "v1" in after.catalog
+    assert after.fingerprint != before.fingerprint
+    assert rt.catalog_fingerprint == after.fingerprint
+
+
+def test_readers_never_see_mixed_versions(monkeypatch, tmp_path):
+    rt = _runtime(monkeypatch, tmp_path)
+    stop = threading.Event()
+    mismatches = []
+
+    def reader():
+        while not stop.is_set():
+            sops = rt.sops
+            if sops.catalog != build_sop_catalog(sops.registry):
+                mismatches.append(sops)
+            if sops.fingerprint != catalog_fingerprint(rt.agent_catalog, sops.catalog):
+                mismatches.append(sops)
+
+    threads = [threading.Thread(target=reader) for _ in range(2)]
+    for t in threads:
+        t.start()
+    try:
+        for i in range(30):
+            _write(tmp_path / "a.yaml", "transfer", f"v{i + 1}" + "x" * i)
+            rt.reload_sops()
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+    assert not mismatches
+    assert rt.sops.catalog == build_sop_catalog(rt.sop_registry)
@@ -46,6 +46,13 @@ class TraceCollector:
     def add_with_detail(self, title: str, detail: str) -> Dict:
         return self.add(title=title, subtitle=detail)
 
+    def emit_raw(self, event: str, data) -> bool:
+        """Push a non-trace SSE event (e.g. forwarded agent tokens) straight to the client."""
+        if not self._sse:
+            return False
+        self._sse({'event': event, 'data': data})
+        return True
+
     # -------- frontend --------
     def emit_last_event(self) -> Dict:
         data = {
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+_DEFAULT_KEY_FIELDS = ["query", "slots", "history"]
+
+
+def _load_by_path(obj: Any, path: str) -> Any:
+    cur = obj
+    for key in path.split("."):
+        if isinstance(cur, dict):
+            cur = cur.get(key)
+        else:
+            return None
+    return cur
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+class AgentResponseCache:
+    """
+    Opt-in TTL/LRU cache for one idempotent agent.
+    Keys are the agent name plus a normalized projection of the payload (`identity_fields`
+    and `key_fields`, dotted paths). Answers are per caller: a payload missing any identity
+    field bypasses the cache. Identical concurrent calls share one in-flight request
+    (single-flight). Only successful responses are stored; every caller gets its own copy.
+    """
+
+    def __init__(
+        self,
+        agent_name: str,
+        *,
+        ttl: float = 60.0,
+        max_entries: int = 512,
+        identity_fields: List[str],
+        key_fields: Optional[List[str]] = None,
+    ):
+        if not identity_fields:
+            raise ValueError(f"agent cache for {agent_name} needs identity_fields (e.g. customer_no)")
+        self.agent_name = agent_name
+        self.identity_fields = list(identity_fields)
+        self.ttl = float(ttl)
+        self.max_entries = int(max_entries)
+        self.key_fields = list(key_fields or _DEFAULT_KEY_FIELDS)
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.joined = 0
+        self.bypassed = 0
+
+    def make_key(self, payload: Any) -> Optional[str]:
+        """Cache key for `payload`; None when it does not identify its caller."""
+        if not isinstance(payload, dict):
+            return None
+        projection = {}
+        for field in self.identity_fields:
+            value = _load_by_path(payload, field)
+            if value is None or value == "":
+                return None
+            projection[field] = _normalize(value)
+        for field in self.key_fields:
+            projection.setdefault(field, _normalize(_load_by_path(payload, field)))
+        raw = json.dumps(projection, ensure_ascii=False, sort_keys=True, default=str)
+        digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+        return f"{self.agent_name}:{digest}"
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return False, None
+            expires_at, value = item
+            if expires_at < now:
+                self._entries.pop(key, None)
+                return False, None
+            self._entries.move_to_end(key)
+        return True, copy.deepcopy(value)
+
+    def put(self, key: str, value: Any) -> None:
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    async def get_or_call(self, payload: Any, call: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        key = self.make_key(payload)
+        if key is None:
+            with self._lock:
+                self.bypassed += 1
+            return await call()
+        hit, value = self.get(key)
+        if hit:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            inflight = self._inflight.get(key)
+            if inflight is not None and inflight[0] is loop:
+                self.joined += 1
+                fut = inflight[1]
+            else:
+                self.misses += 1
+                fut = None
+                owner = loop.create_future()
+                self._inflight[key] = (loop, owner)
+
+        if fut is not None:
+            try:
+                return copy.deepcopy(await asyncio.shield(fut))
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    raise
+                # The leader was cancelled, not us: make the call ourselves.
+                return await call()
+
+        try:
+            res = await call()
+        except BaseException as exc:
+            if isinstance(exc, asyncio.CancelledError):
+                owner.cancel()
+            else:
+                owner.set_exception(exc)
+                # Nobody may be waiting on the shared future; mark its exception as retrieved.
+                owner.exception()
+            raise
+        else:
+            if isinstance(res, dict) and res.get("status") == "ok":
+                self.put(key, res)
+            # Joiners copy the result; the leader keeps the original.
+            owner.set_result(res)
+            return res
+        finally:
+            with self._lock:
+                if self._inflight.get(key, (None, None))[1] is owner:
+                    self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.joined
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "joined": self.joined,
+                "bypassed": self.bypassed,
+                "hit_rate": round((self.hits + self.joined) / lookups, 4) if lookups else 0.0,
+            }
+
+
+def build_agent_cache(agent_name: str, cfg: Dict[str, Any] | None) -> Optional[AgentResponseCache]:
+    if not isinstance(cfg, dict) or not cfg.get("enabled"):
+        return None
+    return AgentResponseCache(
+        agent_name,
+        ttl=cfg.get("ttl", 60),
+        max_entries=cfg.get("max_entries", 512),
+        identity_fields=cfg.get("identity_fields") or [],
+        key_fields=cfg.get("key_fields"),
+    )
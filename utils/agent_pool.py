@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict, List, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+
+_DEFAULT_POOL = {
+    "max_connections": 20,
+    "max_keepalive": 10,
+    "keepalive_expiry": 30.0,
+    "http2": False,
+    "warmup": 1,
+}
+
+
+def _pool_settings(endpoint: Dict[str, Any]) -> Dict[str, Any]:
+    cfg = dict(_DEFAULT_POOL)
+    raw = endpoint.get("pool")
+    if isinstance(raw, dict):
+        cfg.update(raw)
+    return cfg
+
+
+class AgentClientPool:
+    """
+    Long-lived HTTP clients for a single agent endpoint.
+    Sync callers share one requests.Session; async callers share one httpx.AsyncClient per
+    event loop (the request loop and the background loop each keep their own pool).
+    """
+
+    def __init__(
+        self,
+        agent_name: str,
+        url: str,
+        *,
+        timeout: float = 20,
+        headers: Optional[Dict[str, str]] = None,
+        pool: Optional[Dict[str, Any]] = None,
+    ):
+        self.agent_name = agent_name
+        self.url = url
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+        self.settings = dict(_DEFAULT_POOL)
+        self.settings.update(pool or {})
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    # -------- sync --------
+    @property
+    def session(self) -> requests.Session:
+        if self._session is not None:
+            return self._session
+        with self._lock:
+            if self._session is None:
+                size = int(self.settings.get("max_connections") or 10)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+                session = requests.Session()
+                session.headers.update(self.headers)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+        return self._session
+
+    # -------- async --------
+    def _build_async_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=int(self.settings.get("max_connections") or 20),
+            max_keepalive_connections=int(self.settings.get("max_keepalive") or 10),
+            keepalive_expiry=float(self.settings.get("keepalive_expiry") or 30.0),
+        )
+        kwargs = {"timeout": self.timeout, "headers": self.headers, "limits": limits}
+        if self.settings.get("http2"):
+            try:
+                return httpx.AsyncClient(http2=True, **kwargs)
+            except ImportError:
+                # h2 is not installed; fall back to HTTP/1.1 keep-alive.
+                pass
+        return httpx.AsyncClient(**kwargs)
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        # httpx connections are bound to the loop that opened them.
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            with self._lock:
+                client = self._async_clients.get(loop)
+                if client is None:
+                    client = self._build_async_client()
+                    self._async_clients[loop] = client
+        return client
+
+    # -------- lifecycle --------
+    def warmup(self) -> None:
+        count = int(self.settings.get("warmup") or 0)
+        if not self.url or count <= 0:
+            return
+        for _ in range(count):
+            try:
+                self.session.head(self.url, timeout=self.timeout)
+            except Exception:
+                return
+
+    async def awarmup(self) -> None:
+        count = int(self.settings.get("warmup") or 0)
+        if not self.url or count <= 0:
+            return
+        client = self.async_client
+
+        async def _touch():
+            try:
+                await client.head(self.url)
+            except Exception:
+                pass
+
+        await asyncio.gather(*[_touch() for _ in range(count)])
+
+    def close(self) -> None:
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+    async def aclose(self) -> None:
+        """Close every loop's client, each on the loop that owns its connections."""
+        with self._lock:
+            clients = list(self._async_clients.items())
+            self._async_clients.clear()
+        current = asyncio.get_running_loop()
+        for loop, client in clients:
+            if loop is current:
+                await client.aclose()
+            elif loop.is_running():
+                await asyncio.wait_for(asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), loop)), 5)
+            # A closed loop already dropped its connections.
+        self.close()
+
+
+class AgentPoolManager:
+    """Registry of per-agent client pools, owned by the agent registry."""
+
+    def __init__(self):
+        self._pools: Dict[str, AgentClientPool] = {}
+
+    def create(self, agent_name: str, endpoint: Dict[str, Any]) -> AgentClientPool:
+        pool = AgentClientPool(
+            agent_name,
+            endpoint.get("url", ""),
+            timeout=endpoint.get("timeout", 20),
+            headers=endpoint.get("headers"),
+            pool=_pool_settings(endpoint),
+        )
+        self._pools[agent_name] = pool
+        return pool
+
+    def get(self, agent_name: str) -> Optional[AgentClientPool]:
+        return self._pools.get(agent_name)
+
+    def pools(self) -> List[AgentClientPool]:
+        return list(self._pools.values())
+
+    async def startup(self, async_agents: List[str] | None = None) -> None:
+        async_set = set(async_agents or [])
+        tasks = []
+        for name, pool in self._pools.items():
+            if name in async_set:
+                tasks.append(pool.awarmup())
+            else:
+                tasks.append(asyncio.to_thread(pool.warmup))
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def shutdown(self) -> None:
+        for pool in self._pools.values():
+            try:
+                await pool.aclose()
+            except Exception:
+                pass
@@ -5,6 +5,12 @@ import re
 import json 
 from typing import Callable,Any,AsyncGenerator,Dict
 
+from utils.agent_pool import AgentClientPool,AgentPoolManager
+from utils.agent_cache import build_agent_cache
+from utils.bulkhead import build_bulkhead
+from utils.circuit_breaker import build_circuit_breaker
+from utils.sse_solver import aconsume_agent_http_stream
+
 def _resolve_header(headers:dict) -> dict:
     out = {}
     for k,v in (headers or {}).items():
@@ -14,56 +20,121 @@ def _resolve_header(headers:dict) -> dict:
         out[k] = v
     return out
 
-def make_http_executor(url:str,timeout:int = 20,headers:dict|None = None):
+def _parse_response(resp):
+    try:
+        return resp.json()
+    except Exception:
+        return {'status_code': resp.status_code, 'text': resp.text}
+
+def make_http_executor(url:str,timeout:int = 20,headers:dict|None = None,pool:AgentClientPool|None = None):
     headers = _resolve_header(headers or {})
 
     def _execute(payload:dict):
-        resp = requests.post(url,json=payload,timeout=timeout,headers=headers)
-
-        try:
-            return resp.json()
-        except Exception:
-            return {'status_code': resp.status_code, 'text': resp.text}
+        if pool is not None:
+            resp = pool.session.post(url,json=payload,timeout=timeout)
+        else:
+            resp = requests.post(url,json=payload,timeout=timeout,headers=headers)
+        return _parse_response(resp)
     
     return _execute
 
-def make_http_executor_async(url:str,timeout:int = 20,headers:dict|None = None):
+def make_http_executor_async(url:str,timeout:int = 20,headers:dict|None = None,pool:AgentClientPool|None = None):
     headers = _resolve_header(headers or {})
 
     async def _execute(payload:dict):
+        if pool is not None:
+            resp = await pool.async_client.post(url,json=payload)
+            return _parse_response(resp)
         async with httpx.AsyncClient(timeout=timeout,headers=headers) as client:
             resp = await client.post(url,json=payload)
-            try:
-                return resp.json()
-            except Exception:
-                return {'status_code': resp.status_code, 'text': resp.text}
+            return _parse_response(resp)
     
     return _execute
 
+def make_http_stream_executor_async(url:str,timeout:int = 20,headers:dict|None = None,pool:AgentClientPool|None = None):
+    '''
+    SSE agent: graph_trace events are relayed to `trace` as they arrive, every other event
+    is passed to `on_raw` immediately and collected into {'_stream_raw_events': [...]}.
+    A stream interrupted midway returns status 'fail' with the events received so far.
+    '''
+    headers = _resolve_header(headers or {})
+
+    async def _consume(client,payload,trace,on_raw):
+        raw_events = []
+
+        def _collect(raw):
+            raw_events.append(raw)
+            if on_raw:
+                on_raw(raw)
+
+        async with client.stream('POST',url,json=payload) as resp:
+            if resp.status_code != 200:
+                body = await resp.aread()
+                return {'status_code': resp.status_code, 'text': body.decode('utf-8','replace')}
+            try:
+                await aconsume_agent_http_stream(resp,trace,on_raw=_collect)
+            except Exception as e:
+                return {'status': 'fail', 'reason': f'stream interrupted: {e!r}', '_stream_raw_events': raw_events}
+        return {'_stream_raw_events': raw_events}
+
+    async def _execute(payload:dict,trace = None,on_raw = None):
+        if pool is not None:
+            return await _consume(pool.async_client,payload,trace,on_raw)
+        async with httpx.AsyncClient(timeout=timeout,headers=headers) as client:
+            return await _consume(client,payload,trace,on_raw)
+
+    return _execute
+
 def default_payload_builder(working_input:dict,slots:dict) -> dict:
     payload = dict(working_input)
     payload['slots'] = slots
     return payload
 
-def build_agent_registry(agent_config:dict):
+def build_agent_registry(agent_config:dict,pool_manager:AgentPoolManager|None = None):
+    '''
+    Build {agent_name: {description, execute, type, streaming, timeout, pool, bulkhead, breaker, hedge, cache}}.
+    http/http_async agents get a long-lived client pool from pool_manager
+    (endpoint.pool: max_connections/max_keepalive/keepalive_expiry/http2/warmup).
+    cfg.bulkhead (max_in_flight/max_queue/queue_timeout/thread_pool_size) isolates the agent.
+    cfg.circuit_breaker opens on rolling error/slow-call rates; cfg.hedge (idempotent agents
+    only) sends a second copy after the agent's latency quantile.
+    cfg.cache (enabled/ttl/max_entries/key_fields) caches successful responses with single-flight.
+    '''
     registry = {}
+    if pool_manager is None:
+        pool_manager = AgentPoolManager()
 
     # regist agents
     for agent_name,cfg in agent_config.items():
         endpoint = cfg.get('endpoint',{})
         etype = endpoint.get('type','http')
+        pool = None
+
+        if etype in ('http','http_async','http_stream'):
+            pool_endpoint = dict(endpoint)
+            pool_endpoint['headers'] = _resolve_header(endpoint.get('headers') or {})
+            pool = pool_manager.create(agent_name,pool_endpoint)
 
         if etype == 'http':
             exec_fn = make_http_executor(
                 url = endpoint['url'],
                 timeout = endpoint.get('timeout',20),
-                headers = endpoint.get('headers')
+                headers = endpoint.get('headers'),
+                pool = pool
             )
         elif etype == "http_async":
             exec_fn = make_http_executor_async(
                 url=endpoint["url"],
                 timeout=endpoint.get("timeout", 20),
                 headers=endpoint.get("headers"),
+                pool=pool,
+            )
+        elif etype == 'http_stream':
+            exec_fn = make_http_stream_executor_async(
+                url=endpoint['url'],
+                timeout=endpoint.get('timeout',20),
+                headers=endpoint.get('headers'),
+                pool=pool,
             )
         elif etype == 'local':
             exec_fn = endpoint['callable']
@@ -72,7 +143,16 @@ def build_agent_registry(agent_config:dict):
         
         registry[agent_name] = {
             'description' : cfg.get('description',''),
-            'execute': exec_fn
+            'execute': exec_fn,
+            'type': etype,
+            'streaming': etype == 'http_stream',
+            # The agent's own timeout; only timeouts against it count as breaker failures.
+            'timeout': endpoint.get('timeout'),
+            'pool': pool,
+            'bulkhead': build_bulkhead(agent_name,cfg.get('bulkhead')),
+            'breaker': build_circuit_breaker(agent_name,cfg.get('circuit_breaker')),
+            'hedge': cfg.get('hedge') if cfg.get('idempotent') else None,
+            'cache': build_agent_cache(agent_name,cfg.get('cache'))
         }
 
     return registry
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, Optional, Tuple
+
+
+class BulkheadFullError(RuntimeError):
+    pass
+
+
+class Bulkhead:
+    """
+    Per-agent isolation: at most `max_in_flight` concurrent calls plus `max_queue` waiters.
+    Anything beyond that fails fast with BulkheadFullError instead of piling up.
+    Counters are shared across event loops, so sync callers on other loops count too.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_in_flight: int = 0,
+        max_queue: int = 0,
+        queue_timeout: Optional[float] = None,
+        thread_pool_size: int = 0,
+    ):
+        self.name = name
+        self.max_in_flight = int(max_in_flight or 0)
+        self.max_queue = int(max_queue or 0)
+        self.queue_timeout = queue_timeout
+        self.thread_pool_size = int(thread_pool_size or 0)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.rejected = 0
+
+    @property
+    def executor(self) -> Optional[ThreadPoolExecutor]:
+        if self.thread_pool_size <= 0:
+            return None
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.thread_pool_size,
+                        thread_name_prefix=f"agent-{self.name}",
+                    )
+        return self._executor
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": self._active,
+                "queued": len(self._waiters),
+                "rejected": self.rejected,
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+            }
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now (never queues)."""
+        if self.max_in_flight <= 0:
+            return True
+        with self._lock:
+            if self._active < self.max_in_flight and not self._waiters:
+                self._active += 1
+                return True
+            return False
+
+    async def acquire(self) -> None:
+        if self.max_in_flight <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._active < self.max_in_flight and not self._waiters:
+                self._active += 1
+                return
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise BulkheadFullError(
+                    f"agent bulkhead full: {self.name} "
+                    f"(in_flight={self._active}, queued={len(self._waiters)})"
+                )
+            fut = loop.create_future()
+            waiter = (loop, fut)
+            self._waiters.append(waiter)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), self.queue_timeout)
+        except BaseException as exc:
+            with self._lock:
+                try:
+                    self._waiters.remove(waiter)
+                    still_queued = True
+                except ValueError:
+                    still_queued = False
+            if not still_queued:
+                # The slot was already handed to us; pass it on.
+                if fut.done() and not fut.cancelled():
+                    self.release()
+                else:
+                    fut.cancel()
+            if not isinstance(exc, asyncio.TimeoutError):
+                raise
+            with self._lock:
+                self.rejected += 1
+            raise BulkheadFullError(f"agent bulkhead full: {self.name} (queue wait timed out)") from None
+
+    def release(self) -> None:
+        if self.max_in_flight <= 0:
+            return
+        with self._lock:
+            while self._waiters:
+                loop, fut = self._waiters.popleft()
+                if fut.done():
+                    continue
+                loop.call_soon_threadsafe(self._hand_over, fut)
+                return
+            self._active = max(0, self._active - 1)
+
+    def _hand_over(self, fut: asyncio.Future) -> None:
+        if fut.done():
+            # Waiter gave up in the meantime; the slot goes to the next one.
+            self.release()
+            return
+        fut.set_result(True)
+
+    def shutdown(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def build_bulkhead(agent_name: str, cfg: Dict[str, Any] | None) -> Optional[Bulkhead]:
+    if not isinstance(cfg, dict) or not cfg:
+        return None
+    return Bulkhead(
+        agent_name,
+        max_in_flight=cfg.get("max_in_flight", 0),
+        max_queue=cfg.get("max_queue", 0),
+        queue_timeout=cfg.get("queue_timeout"),
+        thread_pool_size=cfg.get("thread_pool_size", 0),
+    )
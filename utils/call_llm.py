@@ -1,16 +1,278 @@
+import asyncio
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import httpx
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
-from conf.config import github_api_key
-_llm = ChatOpenAI(
+from conf.config import github_api_key, llm_config
+from utils.bulkhead import Bulkhead
+from utils.deadline import DeadlineExceeded
+from utils.recorder import current_session
+
+_LLM_KWARGS = dict(
     model="gpt-4o-mini",
-    api_key=github_api_key, 
+    api_key=github_api_key,
     base_url="https://models.inference.ai.azure.com",
-    temperature = 0.01
+    temperature = 0.01,
+    # langchain retries (2 by default) would each get the full timeout and run past the request deadline.
+    max_retries=int(llm_config.get('max_retries', 0)),
+)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(llm_config.get('max_connections', 64)),
+        max_keepalive_connections=int(llm_config.get('max_keepalive', 32)),
+        keepalive_expiry=float(llm_config.get('keepalive_expiry', 30)),
+    )
+
+
+# Built on first use: ChatOpenAI rejects an empty api_key, and importing this module
+# (offline benchmarks, tests with set_llm_backend) must not require one.
+_llm = None
+_sync_lock = threading.Lock()
+
+# httpx.AsyncClient connections belong to the loop that opened them: one pooled client per loop.
+_async_llms: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ChatOpenAI]" = weakref.WeakKeyDictionary()
+_async_lock = threading.Lock()
+
+_global_limiter = Bulkhead(
+    'llm',
+    max_in_flight=int(llm_config.get('max_concurrency', 0) or 0),
+    max_queue=int(llm_config.get('max_queue', 10000)),
 )
+_node_limiters = {
+    node: Bulkhead(f'llm-{node}', max_in_flight=int(limit or 0), max_queue=int(llm_config.get('max_queue', 10000)))
+    for node, limit in (llm_config.get('node_concurrency') or {}).items()
+}
+
+
+class _LLMStats:
+    '''Per-node call count, latency and limiter queue-wait samples.'''
+
+    def __init__(self, max_samples: int = 1000):
+        self._lock = threading.Lock()
+        self._max_samples = max_samples
+        self._nodes = {}
+
+    def record(self, node: str, wait_s: float, latency_s: float, ok: bool) -> None:
+        with self._lock:
+            item = self._nodes.setdefault(node, {
+                'calls': 0,
+                'errors': 0,
+                'wait': deque(maxlen=self._max_samples),
+                'latency': deque(maxlen=self._max_samples),
+            })
+            item['calls'] += 1
+            if not ok:
+                item['errors'] += 1
+            item['wait'].append(wait_s)
+            item['latency'].append(latency_s)
+
+    @staticmethod
+    def _quantile(samples, q: float):
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            out = {}
+            for node, item in self._nodes.items():
+                out[node] = {
+                    'calls': item['calls'],
+                    'errors': item['errors'],
+                    'queue_wait_p50_s': self._quantile(item['wait'], 0.5),
+                    'queue_wait_p95_s': self._quantile(item['wait'], 0.95),
+                    'latency_p50_s': self._quantile(item['latency'], 0.5),
+                    'latency_p95_s': self._quantile(item['latency'], 0.95),
+                }
+            return out
+
+
+_stats = _LLMStats()
+
+# Optional replacement for the model (offline benchmarks, replays): an object with
+# complete(prompt, node) -> str, async acomplete(prompt, node) -> str and
+# astream(prompt, node) -> async iterator of str.
+_backend = None
+
 
-def execute_react_agent(prompt: str) -> str:
-    resp = _llm.invoke([
+def set_llm_backend(backend):
+    '''Route every LLM call to `backend` (None restores ChatOpenAI); returns the previous backend.'''
+    global _backend
+    previous = _backend
+    _backend = backend
+    return previous
+
+
+def _messages(prompt: str):
+    return [
         SystemMessage(content='你是一个严格按照指令执行的智能助手。'),
         HumanMessage(content=prompt),
-    ])
-    return resp.content.strip()
+    ]
+
+
+def _sync_llm() -> ChatOpenAI:
+    global _llm
+    if _llm is None:
+        with _sync_lock:
+            if _llm is None:
+                _llm = ChatOpenAI(http_client=httpx.Client(limits=_limits()), **_LLM_KWARGS)
+    return _llm
+
+
+def _async_llm() -> ChatOpenAI:
+    loop = asyncio.get_running_loop()
+    llm = _async_llms.get(loop)
+    if llm is None:
+        with _async_lock:
+            llm = _async_llms.get(loop)
+            if llm is None:
+                llm = ChatOpenAI(http_async_client=httpx.AsyncClient(limits=_limits()), **_LLM_KWARGS)
+                _async_llms[loop] = llm
+    return llm
+
+
+def execute_react_agent(prompt: str, timeout: float | None = None) -> str:
+    kwargs = {}
+    if timeout is not None:
+        if timeout <= 0:
+            raise DeadlineExceeded('request deadline exceeded before LLM call')
+        kwargs['timeout'] = timeout
+    session = current_session()
+    started = time.perf_counter()
+    text = None
+    try:
+        if _backend is not None:
+            text = _backend.complete(prompt, node='default').strip()
+        else:
+            text = _sync_llm().invoke(_messages(prompt), **kwargs).content.strip()
+        return text
+    finally:
+        if session is not None:
+            session.record_llm('default', prompt, text, started, time.perf_counter(), error='' if text is not None else 'failed')
+
+
+@asynccontextmanager
+async def _llm_slot(node: str, timeout: float | None):
+    '''
+    Hold the global and per-node concurrency slots (llm_config) for one LLM call.
+    Yields the budget left after queueing (None = unbounded); the wait is reported by llm_metrics().
+    '''
+    if timeout is not None and timeout <= 0:
+        raise DeadlineExceeded('request deadline exceeded before LLM call')
+
+    limiters = [_global_limiter]
+    if node in _node_limiters:
+        limiters.append(_node_limiters[node])
+
+    started = time.perf_counter()
+    acquired = []
+    ok = False
+    waited = 0.0
+    try:
+        for limiter in limiters:
+            left = None if timeout is None else timeout - (time.perf_counter() - started)
+            if left is not None and left <= 0:
+                raise DeadlineExceeded('request deadline exceeded while waiting for an LLM slot')
+            try:
+                await asyncio.wait_for(limiter.acquire(), left)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded('request deadline exceeded while waiting for an LLM slot') from None
+            acquired.append(limiter)
+        waited = time.perf_counter() - started
+        yield None if timeout is None else max(0.001, timeout - waited)
+        ok = True
+    finally:
+        for limiter in reversed(acquired):
+            limiter.release()
+        _stats.record(node, waited, time.perf_counter() - started - waited, ok)
+
+
+async def aexecute_react_agent(prompt: str, *, node: str = 'default', timeout: float | None = None) -> str:
+    '''
+    Native async LLM call on a pooled client.
+    Bounded by the global and per-node concurrency limits (llm_config); the time spent
+    waiting for a slot counts against `timeout`.
+    '''
+    async with _llm_slot(node, timeout) as left:
+        session = current_session()
+        started = time.perf_counter()
+        text = None
+        try:
+            if _backend is not None:
+                text = (await asyncio.wait_for(_backend.acomplete(prompt, node=node), left)).strip()
+            else:
+                kwargs = {} if left is None else {'timeout': left}
+                # The client timeout is per HTTP operation; wait_for bounds the whole call.
+                resp = await asyncio.wait_for(_async_llm().ainvoke(_messages(prompt), **kwargs), left)
+                text = resp.content.strip()
+            return text
+        finally:
+            if session is not None:
+                session.record_llm(node, prompt, text, started, time.perf_counter(), error='' if text is not None else 'failed')
+
+
+async def astream_react_agent(
+    prompt: str, *, node: str = 'default', timeout: float | None = None
+) -> AsyncIterator[str]:
+    '''Streaming variant of aexecute_react_agent: yields text chunks as the model produces them.'''
+    async with _llm_slot(node, timeout) as left:
+        kwargs = {} if left is None else {'timeout': left}
+        deadline = None if left is None else time.monotonic() + left
+        session = current_session()
+        started = time.perf_counter()
+        recorded = []
+        finished = False
+        if _backend is not None:
+            chunks = _backend.astream(prompt, node=node).__aiter__()
+        else:
+            chunks = _async_llm().astream(_messages(prompt), **kwargs).__aiter__()
+        try:
+            while True:
+                wait = None if deadline is None else deadline - time.monotonic()
+                if wait is not None and wait <= 0:
+                    raise DeadlineExceeded('request deadline exceeded while streaming LLM output')
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), wait)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded('request deadline exceeded while streaming LLM output') from None
+                if isinstance(chunk, str):
+                    text = chunk
+                else:
+                    text = chunk.content if isinstance(chunk.content, str) else ''
+                if text:
+                    if session is not None:
+                        recorded.append([round(time.perf_counter() - started, 6), text])
+                    yield text
+            finished = True
+        finally:
+            if session is not None:
+                session.record_llm(
+                    node,
+                    prompt,
+                    ''.join(text for _, text in recorded),
+                    started,
+                    time.perf_counter(),
+                    error='' if finished else 'interrupted',
+                    chunks=recorded,
+                )
+
+
+def llm_metrics() -> dict:
+    return {
+        'nodes': _stats.snapshot(),
+        'limiters': {
+            'global': _global_limiter.stats(),
+            **{node: limiter.stats() for node, limiter in _node_limiters.items()},
+        },
+    }
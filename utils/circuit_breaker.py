@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Rolling-window breaker for one agent.
+    Opens when, over the last `window_s` seconds (and at least `min_calls` calls), the error
+    rate or the slow-call rate crosses its threshold. After `open_s` seconds one probe call
+    is let through (half-open); its outcome closes or re-opens the circuit.
+    The same window feeds latency quantiles used for hedged requests.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        window_s: float = 30.0,
+        min_calls: int = 10,
+        error_rate: float = 0.5,
+        slow_call_s: Optional[float] = None,
+        slow_rate: float = 0.8,
+        open_s: float = 15.0,
+        max_samples: int = 1000,
+    ):
+        self.name = name
+        self.window_s = float(window_s)
+        self.min_calls = int(min_calls)
+        self.error_rate = float(error_rate)
+        self.slow_call_s = slow_call_s
+        self.slow_rate = float(slow_rate)
+        self.open_s = float(open_s)
+        self._samples: Deque[Tuple[float, bool, float]] = deque(maxlen=int(max_samples))
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.open_s:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def _trim(self, now: float) -> None:
+        while self._samples and now - self._samples[0][0] > self.window_s:
+            self._samples.popleft()
+
+    def allow(self) -> bool:
+        return self.admit() is not None
+
+    def admit(self) -> Optional[str]:
+        """State the call was admitted under (CLOSED, or HALF_OPEN for the probe); None = rejected."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            if state == CLOSED:
+                return CLOSED
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return HALF_OPEN
+            self.rejected += 1
+            return None
+
+    def abandon(self, admitted: Optional[str]) -> None:
+        """
+        An admitted call ended without an outcome about the agent (cancelled, or cut short
+        by the request deadline). A half-open probe gives its slot back so the next call probes.
+        """
+        if admitted != HALF_OPEN:
+            return
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record(self, ok: bool, latency_s: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            self._samples.append((now, bool(ok), float(latency_s)))
+            if state == HALF_OPEN:
+                self._probe_in_flight = False
+                if ok:
+                    self._state = CLOSED
+                    self._samples.clear()
+                else:
+                    self._open(now)
+                return
+            if state == OPEN:
+                return
+            self._trim(now)
+            total = len(self._samples)
+            if total < self.min_calls:
+                return
+            errors = sum(1 for _, good, _ in self._samples if not good)
+            if errors / total >= self.error_rate:
+                self._open(now)
+                return
+            if self.slow_call_s:
+                slow = sum(1 for _, _, lat in self._samples if lat >= self.slow_call_s)
+                if slow / total >= self.slow_rate:
+                    self._open(now)
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._probe_in_flight = False
+
+    def latency_quantile(self, q: float) -> Optional[float]:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            latencies = sorted(lat for _, good, lat in self._samples if good)
+        if not latencies:
+            return None
+        pos = min(len(latencies) - 1, max(0, math.ceil(q * len(latencies)) - 1))
+        return latencies[pos]
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            self._trim(now)
+            total = len(self._samples)
+            errors = sum(1 for _, good, _ in self._samples if not good)
+        return {
+            "state": state,
+            "calls": total,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "p95_s": self.latency_quantile(0.95),
+            "rejected": self.rejected,
+        }
+
+
+def build_circuit_breaker(agent_name: str, cfg: Dict[str, Any] | None) -> Optional[CircuitBreaker]:
+    if not isinstance(cfg, dict) or not cfg or cfg.get("enabled") is False:
+        return None
+    return CircuitBreaker(
+        agent_name,
+        window_s=cfg.get("window_s", 30.0),
+        min_calls=cfg.get("min_calls", 10),
+        error_rate=cfg.get("error_rate", 0.5),
+        slow_call_s=cfg.get("slow_call_s"),
+        slow_rate=cfg.get("slow_rate", 0.8),
+        open_s=cfg.get("open_s", 15.0),
+    )
+
+
+def hedge_delay(breaker: Optional[CircuitBreaker], cfg: Dict[str, Any] | None) -> Optional[float]:
+    """Delay before sending a hedged copy, from the agent's latency quantile; None = no hedge."""
+    if not isinstance(cfg, dict) or not cfg.get("enabled"):
+        return None
+    delay = None
+    if breaker is not None:
+        delay = breaker.latency_quantile(float(cfg.get("quantile", 0.95)))
+    if delay is None:
+        delay = cfg.get("initial_delay")
+    if delay is None:
+        return None
+    delay = max(float(cfg.get("min_delay", 0.0)), float(delay))
+    if cfg.get("max_delay") is not None:
+        delay = min(float(cfg["max_delay"]), delay)
+    return delay
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Optional
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def new_deadline(timeout_s: Any) -> Optional[float]:
+    """Absolute monotonic deadline for a request, or None when no budget is set."""
+    try:
+        budget = float(timeout_s)
+    except (TypeError, ValueError):
+        return None
+    if budget <= 0:
+        return None
+    return time.monotonic() + budget
+
+
+def remaining(state: Dict[str, Any], cap: Optional[float] = None) -> Optional[float]:
+    """Seconds left in the request budget (never negative), optionally capped; None = unbounded."""
+    deadline = state.get("deadline") if isinstance(state, dict) else None
+    if deadline is None:
+        return cap
+    left = max(0.0, float(deadline) - time.monotonic())
+    if cap is not None:
+        return min(left, float(cap))
+    return left
+
+
+def expired(state: Dict[str, Any]) -> bool:
+    left = remaining(state)
+    return left is not None and left <= 0
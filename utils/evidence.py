@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import json
+from dataclasses import asdict, is_dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+from conf.config import evidence_config
+from utils.append_history import aggregate_agent_output, extract_plain_text
+
+
+# Transport / bookkeeping fields that never help an LLM judge or summarize an answer.
+_LOW_VALUE_FIELDS = {
+    "trace",
+    "graph_trace",
+    "debug",
+    "headers",
+    "request_id",
+    "trace_id",
+    "session_id",
+    "timestamp",
+    "ts",
+    "latency",
+    "elapsed",
+    "cost",
+    "usage",
+    "status_code",
+    "history",
+    "slots",
+}
+
+_TRUNCATED = "…(已截断)"
+
+
+def _is_wide(ch: str) -> bool:
+    return "\u3000" <= ch <= "\u9fff" or "\uff00" <= ch <= "\uffef"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate: one per CJK character, one per four other characters."""
+    cjk = sum(1 for ch in text if _is_wide(ch))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _strip_low_value(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {k: _strip_low_value(v) for k, v in obj.items() if k not in _LOW_VALUE_FIELDS}
+    if isinstance(obj, list):
+        return [_strip_low_value(v) for v in obj]
+    return obj
+
+
+def compact_text(obj: Any) -> str:
+    """Plain text of an agent output; structured payloads without a text field fall back to compact JSON."""
+    if isinstance(obj, dict) and "_stream_raw_events" in obj:
+        return aggregate_agent_output(obj.get("_stream_raw_events") or [])
+    if isinstance(obj, list) and obj and all(isinstance(x, dict) and "agent" in x for x in obj):
+        # ParallelCallAgent output: one line per call.
+        return "\n".join(f"[{x.get('agent')}] {compact_text(x.get('output'))}" for x in obj)
+    text = extract_plain_text(obj)
+    if text or obj is None:
+        return text.strip()
+    try:
+        return json.dumps(_strip_low_value(obj), ensure_ascii=False, separators=(",", ":"))
+    except Exception:
+        return str(obj)
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return _TRUNCATED if text else ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # Same estimate as estimate_tokens, accumulated until the budget is spent.
+    quarters = 0
+    for end, ch in enumerate(text):
+        quarters += 4 if _is_wide(ch) else 1
+        if quarters > max_tokens * 4:
+            return text[:end] + _TRUNCATED
+    return text
+
+
+def _allocate(sizes: List[int], budget: int) -> List[int]:
+    """Water-filling: small items keep everything, the rest share what is left equally."""
+    allowed = [0] * len(sizes)
+    remaining = budget
+    pending = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    while pending:
+        share = remaining // len(pending)
+        i = pending[0]
+        if sizes[i] <= share:
+            allowed[i] = sizes[i]
+            remaining -= sizes[i]
+            pending.pop(0)
+            continue
+        for i in pending:
+            allowed[i] = share
+        break
+    return allowed
+
+
+def _as_dict(value: Any) -> Dict[str, Any]:
+    if is_dataclass(value):
+        return asdict(value)
+    if isinstance(value, dict):
+        return value
+    return {"output": value}
+
+
+def budget_for(node: str) -> int:
+    return int((evidence_config.get("budgets") or {}).get(node, evidence_config.get("default_budget", 2000)))
+
+
+def build_evidence(
+    results: Dict[str, Any],
+    *,
+    node: str,
+    max_tokens: Optional[int] = None,
+    skip: Iterable[str] = (),
+) -> str:
+    """
+    Compact JSON evidence for an LLM prompt, sized to the node's token budget.
+    Step outputs become plain text; an output identical to an earlier step's (AppendHistory,
+    FinalOutput, ...) is replaced by a reference, steps in `skip` (e.g. the candidate answer
+    already shown to the evaluator) by a placeholder; long outputs are cut proportionally.
+    """
+    budget = budget_for(node) if max_tokens is None else int(max_tokens)
+    skip = set(skip)
+    entries: List[Dict[str, Any]] = []
+    texts: List[str] = []
+    seen: Dict[str, str] = {}
+
+    for var, value in (results or {}).items():
+        item = _as_dict(value)
+        entry = {k: item.get(k) for k in ("tag", "desc", "status", "error") if item.get(k)}
+        if var in skip:
+            entry["output"] = "(见候选答案)"
+            text = ""
+        elif item.get("tag") == "SplitQuery":
+            entry["output"] = item.get("output")
+            text = ""
+        else:
+            text = compact_text(item.get("output"))
+            if text and text in seen:
+                entry["output"] = f"(同 {seen[text]})"
+                text = ""
+            elif text:
+                seen[text] = var
+        entries.append({"var": var, **entry})
+        texts.append(text)
+
+    overhead = estimate_tokens(json.dumps(entries, ensure_ascii=False, separators=(",", ":"), default=str))
+    allowed = _allocate([estimate_tokens(t) for t in texts], max(0, budget - overhead))
+
+    out: Dict[str, Any] = {}
+    for entry, text, limit in zip(entries, texts, allowed):
+        var = entry.pop("var")
+        if text:
+            entry["output"] = truncate_tokens(text, limit)
+        out[var] = entry
+    return json.dumps(out, ensure_ascii=False, default=str)
@@ -7,11 +7,15 @@ from datetime import datetime
 from typing import Any, Dict
 
 
+def default_log_dir() -> str:
+    root = os.path.dirname(os.path.dirname(__file__))
+    return os.path.join(root, "log")
+
+
 class ReACTORLogger:
     def __init__(self, log_dir: str | None = None, prefix: str = "reactor"):
-        root = os.path.dirname(os.path.dirname(__file__))
         if log_dir is None:
-            log_dir = os.path.join(root, "log")
+            log_dir = default_log_dir()
         self._log_dir = log_dir
         self._prefix = prefix
         self._lock = threading.Lock()
@@ -16,33 +16,77 @@ def _normalize_tool_input(raw: str) -> str:
     return s
 
 
+# Support ASCII/full-width punctuation and flexible spacing, parse per-line to avoid
+# prematurely stopping on ']' inside JSON list payloads.
+_STEP_PATTERN = re.compile(r'^Plan[:：]\s*(.*?)\s*[|\uFF5C]\s*(#E\d+)\s*[=＝]\s*([A-Za-z_]\w*)\s*\[(.*)\]\s*$')
+
+
+def parse_plan_line(line: str):
+    match = _STEP_PATTERN.match(line.strip())
+    if not match:
+        return None
+    desc, var, tool_tag, tool_input = match.groups()
+    return (
+        desc.strip(),
+        var.strip(),
+        tool_tag.strip(),
+        _normalize_tool_input(tool_input),
+    )
+
+
+def split_queries(tool_input) -> List[str]:
+    '''Sub-queries of a SplitQuery step input (JSON list, or comma separated).'''
+    if isinstance(tool_input, str):
+        try:
+            return list(json.loads(tool_input))
+        except Exception:
+            return [q.strip() for q in tool_input.split(",")]
+    return list(tool_input)
+
+
 def parse_plan_str(plan_str: str):
-    # Support ASCII/full-width punctuation and flexible spacing, parse per-line to avoid
-    # prematurely stopping on ']' inside JSON list payloads.
-    pattern = r'^Plan[:：]\s*(.*?)\s*[|\uFF5C]\s*(#E\d+)\s*[=＝]\s*([A-Za-z_]\w*)\s*\[(.*)\]\s*$'
     steps = []
     for line in plan_str.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        match = re.match(pattern, line)
-        if not match:
-            continue
-        desc, var, tool_tag, tool_input = match.groups()
-        steps.append(
-            (
-                desc.strip(),
-                var.strip(),
-                tool_tag.strip(),
-                _normalize_tool_input(tool_input),
-            )
-        )
+        step = parse_plan_line(line)
+        if step is not None:
+            steps.append(step)
 
     reasoning_match = re.search(r'思考过程[:：](.+?)(?=Plan[:：])', plan_str, flags=re.S)
     reasoning_overview = reasoning_match.group(1).strip() if reasoning_match else ""
 
     return steps, reasoning_overview
 
+class PlanStreamParser:
+    '''
+    Incremental parse_plan_str for a streamed completion: feed() returns the steps
+    of every line completed by the chunk, close() flushes the last line.
+    '''
+
+    def __init__(self):
+        self.text = ''
+        self.steps = []
+        self._buffer = ''
+
+    def feed(self, chunk: str) -> List[tuple]:
+        self.text += chunk
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split('\n')
+        return self._take(lines)
+
+    def close(self) -> List[tuple]:
+        lines, self._buffer = [self._buffer], ''
+        return self._take(lines)
+
+    def _take(self, lines: List[str]) -> List[tuple]:
+        new_steps = []
+        for line in lines:
+            step = parse_plan_line(line)
+            if step is not None:
+                new_steps.append(step)
+        self.steps.extend(new_steps)
+        return new_steps
+
+
 def steps_to_agenda(raw_steps: List[tuple],working_input: dict) -> List[PlanStep]:
     '''
     convert tuple step to agenda steps(PlanStep dict)
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+def normalize_task(task: Any) -> str:
+    """Canonical form of a task for cache keys: NFKC (full-width -> half-width), collapsed spaces, lower-case."""
+    text = unicodedata.normalize("NFKC", str(task or ""))
+    return " ".join(text.split()).lower()
+
+
+def catalog_fingerprint(*catalogs: str) -> str:
+    digest = hashlib.sha1()
+    for catalog in catalogs:
+        digest.update((catalog or "").encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def make_plan_key(task: Any, fingerprint: str, replan_hint: str = "") -> str:
+    raw = json.dumps(
+        [normalize_task(task), fingerprint, replan_hint or ""],
+        ensure_ascii=False,
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """
+    LRU + TTL cache of planner output (raw plan_string and parsed steps).
+    The key already carries the agent/SOP catalog fingerprint, so a catalog change simply
+    stops matching old entries. With `disk_path` set, entries are also written to SQLite
+    and survive restarts; memory misses fall through to disk.
+    """
+
+    def __init__(self, *, ttl: float = 3600.0, max_entries: int = 2048, disk_path: Optional[str] = None):
+        self.ttl = float(ttl)
+        self.max_entries = int(max_entries)
+        self.disk_path = disk_path
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, path: str) -> None:
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS plan_cache ("
+            "key TEXT PRIMARY KEY, plan_string TEXT NOT NULL, steps TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl > 0 and now - created_at > self.ttl
+
+    def _remember(self, key: str, created_at: float, entry: Dict[str, Any]) -> None:
+        self._entries[key] = (created_at, entry)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                created_at, entry = item
+                if not self._expired(created_at, now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+                self._entries.pop(key, None)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT plan_string, steps, created_at FROM plan_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    plan_string, steps_json, created_at = row
+                    if not self._expired(created_at, now):
+                        entry = {
+                            "plan_string": plan_string,
+                            "steps": [tuple(step) for step in json.loads(steps_json)],
+                        }
+                        self._remember(key, created_at, entry)
+                        self.disk_hits += 1
+                        return entry
+                    self._db.execute("DELETE FROM plan_cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, plan_string: str, steps: List[tuple], created_at: Optional[float] = None) -> None:
+        if not steps:
+            return
+        created_at = time.time() if created_at is None else float(created_at)
+        if self._expired(created_at, time.time()):
+            return
+        entry = {"plan_string": plan_string, "steps": [tuple(step) for step in steps]}
+        with self._lock:
+            self._remember(key, created_at, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO plan_cache (key, plan_string, steps, created_at) VALUES (?, ?, ?, ?)",
+                    (key, plan_string, json.dumps(entry["steps"], ensure_ascii=False), created_at),
+                )
+                self._db.commit()
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM plan_cache WHERE key = ?", (key,))
+                self._db.commit()
+            self.invalidations += 1
+
+    # Async callers: with a disk tier, each call commits to SQLite under the lock, so it runs in
+    # a worker thread instead of blocking the event loop; memory-only lookups stay inline.
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        if self._db is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, plan_string: str, steps: List[tuple]) -> None:
+        if self._db is None:
+            return self.put(key, plan_string, steps)
+        await asyncio.to_thread(self.put, key, plan_string, steps)
+
+    async def ainvalidate(self, key: str) -> None:
+        if self._db is None:
+            return self.invalidate(key)
+        await asyncio.to_thread(self.invalidate, key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM plan_cache")
+                self._db.commit()
+
+    def prewarm_from_logs(self, paths: Iterable[str], parse_plan) -> int:
+        """
+        Load LLM-generated plans from ReACTORLogger files (planner events carrying a
+        plan_cache_key). Entries older than the TTL are skipped; returns the number loaded.
+        """
+        loaded = 0
+        for path in paths:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    lines = f.readlines()
+            except OSError:
+                continue
+            for line in lines:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(event, dict) or event.get("node") != "planner":
+                    continue
+                key = event.get("plan_cache_key")
+                plan_string = event.get("plan_string")
+                if not key or not plan_string or event.get("plan_source") != "llm":
+                    continue
+                created_at = _event_time(event.get("ts"))
+                steps, _ = parse_plan(plan_string)
+                if created_at is None or self._expired(created_at, time.time()) or not steps:
+                    continue
+                self.put(key, plan_string, steps, created_at=created_at)
+                loaded += 1
+        return loaded
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _event_time(ts: Any) -> Optional[float]:
+    if not isinstance(ts, str):
+        return None
+    try:
+        # ReACTORLogger writes naive UTC isoformat with a trailing "Z".
+        return datetime.fromisoformat(ts.rstrip("Z")).replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+
+def log_files(log_dir: str, prefix: str = "reactor") -> List[str]:
+    return sorted(glob.glob(os.path.join(log_dir, f"{prefix}_*.log")))
+
+
+def build_plan_cache(cfg: Dict[str, Any] | None) -> Optional[PlanCache]:
+    if not isinstance(cfg, dict) or not cfg.get("enabled"):
+        return None
+    return PlanCache(
+        ttl=cfg.get("ttl", 3600),
+        max_entries=cfg.get("max_entries", 2048),
+        disk_path=cfg.get("disk_path"),
+    )
@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import json
+import math
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.plan_cache import normalize_task
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = (1, 3)) -> Counter:
+    text = normalize_task(text).replace(" ", "")
+    low, high = ngram_range
+    grams: Counter = Counter()
+    for n in range(low, high + 1):
+        for i in range(len(text) - n + 1):
+            grams[text[i:i + n]] += 1
+    return grams
+
+
+def plan_template(steps: List[tuple]) -> bool:
+    """
+    Whether a plan can be replayed for another phrasing of the task: a single task
+    (no SplitQuery) whose agent calls read the query from $WORKING_INPUT instead of
+    a hard-coded "query" override.
+    """
+    if not steps:
+        return False
+    for _, _, tool_tag, tool_input in steps:
+        if tool_tag == "SplitQuery":
+            return False
+        if tool_tag in ("SerialCallAgent", "ParallelCallAgent"):
+            try:
+                calls = json.loads(tool_input) if isinstance(tool_input, str) else tool_input
+            except ValueError:
+                return False
+            if isinstance(calls, dict):
+                calls = [calls]
+            if not isinstance(calls, list):
+                return False
+            for call in calls:
+                if not isinstance(call, dict) or "query" in call:
+                    return False
+    return True
+
+
+class PlanIndex:
+    """
+    Offline similarity index over plans that passed the evaluator.
+    Tasks are embedded as character n-gram TF-IDF vectors and searched by cosine through
+    an inverted index, so a lookup only touches documents sharing an n-gram with the query.
+    Scores are accumulated over selective n-grams only, then the shortlist is re-ranked by
+    exact cosine. Document norms are refitted when the corpus doubles (amortized O(1) per add);
+    the refit is built outside the lock, so lookups are not held up by it.
+    NumPy is used for score accumulation when available. Async callers use aadd/aremove/alookup,
+    which run in a worker thread.
+    """
+
+    def __init__(
+        self,
+        *,
+        threshold: float = 0.85,
+        max_entries: int = 200000,
+        ngram_range: Tuple[int, int] = (1, 3),
+        max_posting: int = 5000,
+        shortlist: int = 20,
+    ):
+        self.threshold = float(threshold)
+        self.max_posting = int(max_posting)
+        self.shortlist = int(shortlist)
+        self.max_entries = int(max_entries)
+        self.ngram_range = (int(ngram_range[0]), int(ngram_range[1]))
+        self._lock = threading.Lock()
+        self._refitting = False
+        self._removed_during_refit: List[int] = []
+        self._reset()
+        self.hits = 0
+        self.misses = 0
+
+    def _reset(self) -> None:
+        self._docs: List[Optional[Dict[str, Any]]] = []
+        self._grams: List[Counter] = []
+        self._norms: List[float] = []
+        self._by_task: Dict[str, int] = {}
+        self._postings: Dict[str, Tuple[List[int], List[float]]] = {}
+        self._arrays: Dict[str, Any] = {}
+        self._live = 0
+        self._head = 0
+        self._fit_size = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    def _idf(self, gram: str) -> float:
+        posting = self._postings.get(gram)
+        df = len(posting[0]) if posting else 0
+        return math.log((len(self._docs) + 1) / (df + 1)) + 1.0
+
+    def _norm(self, grams: Counter) -> float:
+        return math.sqrt(sum((tf * self._idf(g)) ** 2 for g, tf in grams.items())) or 1.0
+
+    def _append(self, doc: Dict[str, Any], grams: Counter) -> None:
+        doc_id = len(self._docs)
+        self._docs.append(doc)
+        self._grams.append(grams)
+        for gram, tf in grams.items():
+            ids, tfs = self._postings.setdefault(gram, ([], []))
+            ids.append(doc_id)
+            tfs.append(float(tf))
+            self._arrays.pop(gram, None)
+        self._norms.append(self._norm(grams))
+        self._by_task[doc["key"]] = doc_id
+        self._live += 1
+
+    @staticmethod
+    def _build(entries: List[Tuple[Dict[str, Any], Counter]]) -> Dict[str, Any]:
+        docs: List[Optional[Dict[str, Any]]] = []
+        grams_list: List[Counter] = []
+        by_task: Dict[str, int] = {}
+        postings: Dict[str, Tuple[List[int], List[float]]] = {}
+        for doc_id, (doc, grams) in enumerate(entries):
+            docs.append(doc)
+            grams_list.append(grams)
+            by_task[doc["key"]] = doc_id
+            for gram, tf in grams.items():
+                ids, tfs = postings.setdefault(gram, ([], []))
+                ids.append(doc_id)
+                tfs.append(float(tf))
+        size = len(docs)
+        idf = {gram: math.log((size + 1) / (len(ids) + 1)) + 1.0 for gram, (ids, _tfs) in postings.items()}
+        norms = [
+            math.sqrt(sum((tf * idf[g]) ** 2 for g, tf in grams.items())) or 1.0
+            for grams in grams_list
+        ]
+        return {"docs": docs, "grams": grams_list, "by_task": by_task, "postings": postings, "norms": norms}
+
+    def _install(self, built: Dict[str, Any]) -> None:
+        self._reset()
+        self._docs = built["docs"]
+        self._grams = built["grams"]
+        self._by_task = built["by_task"]
+        self._postings = built["postings"]
+        self._norms = built["norms"]
+        self._live = len(self._docs)
+        self._fit_size = len(self._docs)
+
+    def _refit(self) -> None:
+        """
+        Rebuild postings and norms over the live documents. The build runs on a snapshot
+        without the lock; adds and removes made meanwhile are replayed onto the new index
+        when it is swapped in.
+        """
+        with self._lock:
+            if self._refitting:
+                return
+            self._refitting = True
+            self._removed_during_refit = []
+            docs, grams = list(self._docs), list(self._grams)
+        try:
+            ids = [i for i, doc in enumerate(docs) if doc is not None]
+            built = self._build([(docs[i], grams[i]) for i in ids])
+        except Exception:
+            with self._lock:
+                self._refitting = False
+            raise
+        new_ids = {old: new for new, old in enumerate(ids)}
+        with self._lock:
+            self._refitting = False
+            removed = self._removed_during_refit
+            tail = [
+                (doc, g)
+                for doc, g in zip(self._docs[len(docs):], self._grams[len(docs):])
+                if doc is not None
+            ]
+            # Keep the old structures alive until the lock is released: freeing them is not free.
+            retired = (self._docs, self._grams, self._postings, self._norms, self._by_task, self._arrays)
+            self._install(built)
+            for old in removed:
+                if old in new_ids:
+                    self._remove_locked(new_ids[old])
+            for doc, g in tail:
+                self._append(doc, g)
+        del retired
+
+    def _remove_locked(self, doc_id: int) -> None:
+        doc = self._docs[doc_id]
+        if doc is None:
+            return
+        self._by_task.pop(doc["key"], None)
+        self._docs[doc_id] = None
+        self._live -= 1
+        if self._refitting:
+            self._removed_during_refit.append(doc_id)
+
+    def add(self, task: str, plan_string: str, steps: List[tuple], fingerprint: str) -> bool:
+        if not plan_template(steps):
+            return False
+        key = normalize_task(task)
+        grams = char_ngrams(task, self.ngram_range)
+        if not grams:
+            return False
+        doc = {
+            "key": key,
+            "task": task,
+            "plan_string": plan_string,
+            "steps": [tuple(step) for step in steps],
+            "fingerprint": fingerprint,
+        }
+        with self._lock:
+            old = self._by_task.get(key)
+            if old is not None:
+                self._remove_locked(old)
+            self._append(doc, grams)
+            while self._live > self.max_entries:
+                while self._docs[self._head] is None:
+                    self._head += 1
+                self._remove_locked(self._head)
+            refit = not self._refitting and (
+                len(self._docs) >= max(64, 2 * self._fit_size) or len(self._docs) > 2 * self._live + 64
+            )
+        if refit:
+            self._refit()
+        return True
+
+    def remove(self, task: str) -> None:
+        with self._lock:
+            doc_id = self._by_task.get(normalize_task(task))
+            if doc_id is not None:
+                self._remove_locked(doc_id)
+
+    async def aadd(self, task: str, plan_string: str, steps: List[tuple], fingerprint: str) -> bool:
+        return await asyncio.to_thread(self.add, task, plan_string, steps, fingerprint)
+
+    async def aremove(self, task: str) -> None:
+        await asyncio.to_thread(self.remove, task)
+
+    async def alookup(self, task: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.lookup, task, fingerprint)
+
+    def _posting_array(self, gram: str):
+        arr = self._arrays.get(gram)
+        if arr is None:
+            ids, tfs = self._postings[gram]
+            arr = (np.asarray(ids, dtype=np.int64), np.asarray(tfs, dtype=np.float32))
+            self._arrays[gram] = arr
+        return arr
+
+    def _cosine(self, grams: Counter, qnorm: float, doc_id: int) -> float:
+        doc_grams = self._grams[doc_id]
+        dot = 0.0
+        for gram, qtf in grams.items():
+            dtf = doc_grams.get(gram)
+            if dtf:
+                idf = self._idf(gram)
+                dot += qtf * dtf * idf * idf
+        return dot / (self._norms[doc_id] * qnorm)
+
+    def _candidates(self, grams: Counter) -> List[int]:
+        # Accumulate only over selective n-grams; very common ones ("我", "的") touch most of
+        # the corpus but barely move the ranking. Exact cosine is computed for the shortlist.
+        present = sorted((len(self._postings[g][0]), g) for g in grams if g in self._postings)
+        if not present:
+            return []
+        selective = [g for df, g in present if df <= self.max_posting] or [g for _, g in present[:3]]
+
+        if np is not None:
+            scores = np.zeros(len(self._docs), dtype=np.float32)
+            for gram in selective:
+                ids, tfs = self._posting_array(gram)
+                idf = self._idf(gram)
+                scores[ids] += tfs * (grams[gram] * idf * idf)
+            top = min(self.shortlist, len(scores))
+            cand = np.argpartition(-scores, top - 1)[:top]
+            return [int(i) for i in cand if scores[i] > 0]
+
+        acc: Dict[int, float] = {}
+        for gram in selective:
+            ids, tfs = self._postings[gram]
+            idf = self._idf(gram)
+            weight = grams[gram] * idf * idf
+            get = acc.get
+            for doc_id, tf in zip(ids, tfs):
+                acc[doc_id] = get(doc_id, 0.0) + tf * weight
+        return heapq.nlargest(self.shortlist, acc, key=acc.__getitem__)
+
+    def _scores(self, grams: Counter) -> List[Tuple[float, int]]:
+        qnorm = self._norm(grams)
+        ranked = [
+            (self._cosine(grams, qnorm, doc_id), doc_id)
+            for doc_id in self._candidates(grams)
+            if self._docs[doc_id] is not None
+        ]
+        ranked.sort(reverse=True)
+        return ranked
+
+    def lookup(self, task: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Best past plan for `task` under the same catalogs, if its similarity clears the threshold."""
+        grams = char_ngrams(task, self.ngram_range)
+        with self._lock:
+            if not grams or not self._live:
+                self.misses += 1
+                return None
+            for score, doc_id in self._scores(grams):
+                if score < self.threshold:
+                    break
+                doc = self._docs[doc_id]
+                if doc is not None and doc["fingerprint"] == fingerprint:
+                    self.hits += 1
+                    return {**doc, "score": round(score, 4)}
+            self.misses += 1
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._live,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def instantiate_plan(entry: Dict[str, Any], task: str, parse_plan) -> Tuple[str, List[tuple], str]:
+    """Re-bind a past plan to a new task: literal mentions of the old task are replaced by the new one."""
+    plan_string = entry["plan_string"]
+    old_task = (entry.get("task") or "").strip()
+    if old_task and old_task != task:
+        plan_string = plan_string.replace(old_task, task)
+    steps, reasoning_overview = parse_plan(plan_string)
+    return plan_string, steps, reasoning_overview
+
+
+def build_plan_index(cfg: Dict[str, Any] | None) -> Optional[PlanIndex]:
+    if not isinstance(cfg, dict) or not cfg.get("enabled"):
+        return None
+    ngram = cfg.get("ngram_range") or (1, 3)
+    return PlanIndex(
+        threshold=cfg.get("threshold", 0.85),
+        max_posting=cfg.get("max_posting", 5000),
+        max_entries=cfg.get("max_entries", 200000),
+        ngram_range=(ngram[0], ngram[1]),
+    )
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.logger import ReACTORLogger, default_log_dir
+
+
+def _jsonable(value: Any) -> Any:
+    """Round-trip through JSON so recorded payloads never alias live request state."""
+    try:
+        return json.loads(json.dumps(value, ensure_ascii=False, default=str))
+    except Exception:
+        return str(value)
+
+
+@dataclass
+class RecordingSession:
+    """
+    Every LLM and agent interaction of one request, with offsets (seconds) from the request start.
+    One session becomes one JSONL line in the recording file.
+    """
+
+    request_id: str
+    working_input: Dict[str, Any]
+    started_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    t0: float = field(default_factory=time.perf_counter)
+    llm: List[Dict[str, Any]] = field(default_factory=list)
+    agents: List[Dict[str, Any]] = field(default_factory=list)
+
+    def offset(self, t: float) -> float:
+        return round(t - self.t0, 6)
+
+    def record_llm(
+        self,
+        node: str,
+        prompt: str,
+        completion: Optional[str],
+        started: float,
+        ended: float,
+        *,
+        error: str = "",
+        chunks: Optional[List[List[Any]]] = None,
+    ) -> None:
+        item: Dict[str, Any] = {
+            "node": node,
+            "prompt": prompt,
+            "completion": completion,
+            "start": self.offset(started),
+            "duration": round(ended - started, 6),
+        }
+        if error:
+            item["error"] = error
+        if chunks is not None:
+            # [[offset from call start, text], ...]
+            item["chunks"] = chunks
+        self.llm.append(item)
+
+    def record_agent(
+        self,
+        agent: str,
+        payload: Any,
+        response: Any,
+        started: float,
+        ended: float,
+        *,
+        error: str = "",
+        events: Optional[List[List[Any]]] = None,
+    ) -> None:
+        item: Dict[str, Any] = {
+            "agent": agent,
+            "payload": _jsonable(payload),
+            "response": _jsonable(response),
+            "start": self.offset(started),
+            "duration": round(ended - started, 6),
+        }
+        if error:
+            item["error"] = error
+        if events is not None:
+            # Streaming agents: [[offset from call start, raw event], ...]
+            item["events"] = _jsonable(events)
+        self.agents.append(item)
+
+
+_session: contextvars.ContextVar[Optional[RecordingSession]] = contextvars.ContextVar(
+    "reactor_recording", default=None
+)
+
+
+def current_session() -> Optional[RecordingSession]:
+    return _session.get()
+
+
+def bind_session(session: Optional[RecordingSession]) -> contextvars.Token:
+    return _session.set(session)
+
+
+def reset_session(token: contextvars.Token) -> None:
+    _session.reset(token)
+
+
+class InteractionRecorder:
+    """
+    Samples requests and writes their recorded sessions through ReACTORLogger
+    (daily `recording_YYYYMMDD.log` JSONL files).
+    """
+
+    def __init__(self, log_dir: str | None = None, *, sample_rate: float = 1.0, prefix: str = "recording"):
+        self.sample_rate = float(sample_rate)
+        self._logger = ReACTORLogger(log_dir or os.path.join(default_log_dir(), "recordings"), prefix=prefix)
+        self._rng = random.Random()
+
+    @property
+    def path(self) -> str:
+        return self._logger.path
+
+    def begin(self, working_input: Dict[str, Any]) -> Optional[RecordingSession]:
+        if self.sample_rate < 1.0 and self._rng.random() >= self.sample_rate:
+            return None
+        return RecordingSession(
+            request_id=str(working_input.get("request_id") or ""),
+            working_input=_jsonable(working_input),
+        )
+
+    def finish(self, session: Optional[RecordingSession], state: Dict[str, Any], result: Any) -> None:
+        if session is None:
+            return
+        self._logger.log(
+            {
+                "kind": "recording",
+                "request_id": session.request_id,
+                "started_at": session.started_at,
+                "duration": session.offset(time.perf_counter()),
+                "working_input": session.working_input,
+                "plan_string": state.get("plan_string") or "",
+                "plan_source": state.get("plan_source") or "",
+                "eval_status": state.get("eval_status") or "",
+                "result": _jsonable(result),
+                "llm": session.llm,
+                "agents": session.agents,
+            }
+        )
+
+
+def build_recorder(cfg: Dict[str, Any] | None) -> Optional[InteractionRecorder]:
+    if not isinstance(cfg, dict) or not cfg.get("enabled"):
+        return None
+    return InteractionRecorder(cfg.get("dir"), sample_rate=cfg.get("sample_rate", 1.0))
+
+
+def load_recordings(paths: List[str]) -> Iterator[Dict[str, Any]]:
+    """Recorded sessions from recording files, in file order."""
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("kind") == "recording":
+                    yield event
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+
+# Session fields restored into working_input when the request does not carry them.
+SESSION_FIELDS = ("history", "slots", "sop_runtime")
+
+
+class SessionStore:
+    """
+    Multi-turn state keyed by session id: history, slots, sop_runtime, pending_question and
+    the last turn's step results, as one JSON-serializable dict. Concurrent turns of the same
+    session are last-write-wins.
+    """
+
+    backend = ""
+
+    def __init__(self, *, ttl: float = 86400.0):
+        self.ttl = float(ttl)
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def _expired(self, updated_at: float, now: float) -> bool:
+        return self.ttl > 0 and now - updated_at > self.ttl
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def put(self, session_id: str, data: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    # Async callers: backends doing file or network I/O run it in a worker thread so a
+    # commit or round trip never blocks the event loop.
+    async def aget(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.get, session_id)
+
+    async def aput(self, session_id: str, data: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self.put, session_id, data)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "hits": self.hits, "misses": self.misses, "writes": self.writes}
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process LRU; sessions are lost on restart and not shared between workers. Stores and
+    returns copies, like the serializing backends, so callers never mutate a stored session.
+    """
+
+    backend = "memory"
+
+    def __init__(self, *, ttl: float = 86400.0, max_entries: int = 10000):
+        super().__init__(ttl=ttl)
+        self.max_entries = int(max_entries)
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._entries.get(session_id)
+            if item is not None and not self._expired(item[0], time.time()):
+                self._entries.move_to_end(session_id)
+                self.hits += 1
+                return copy.deepcopy(item[1])
+            self._entries.pop(session_id, None)
+            self.misses += 1
+            return None
+
+    def put(self, session_id: str, data: Dict[str, Any]) -> None:
+        data = copy.deepcopy(data)
+        with self._lock:
+            self._entries[session_id] = (time.time(), data)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.writes += 1
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    async def aget(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return self.get(session_id)
+
+    async def aput(self, session_id: str, data: Dict[str, Any]) -> None:
+        self.put(session_id, data)
+
+    def stats(self) -> Dict[str, Any]:
+        data = super().stats()
+        data["entries"] = len(self._entries)
+        return data
+
+
+class SqliteSessionStore(SessionStore):
+    """Sessions in a SQLite file: survive restarts and can be shared by workers on one host."""
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, *, ttl: float = 86400.0):
+        super().__init__(ttl=ttl)
+        self.path = path
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is not None and not self._expired(row[1], time.time()):
+                self.hits += 1
+                return json.loads(row[0])
+            if row is not None:
+                self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                self._db.commit()
+            self.misses += 1
+            return None
+
+    def put(self, session_id: str, data: Dict[str, Any]) -> None:
+        text = json.dumps(data, ensure_ascii=False, default=str)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+                (session_id, text, time.time()),
+            )
+            self._db.commit()
+            self.writes += 1
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Sessions in a Redis-compatible server. `client` only needs get(key), set(key, value, ex=)
+    and delete(key), so redis-py, fakeredis or any local stand-in with that interface works;
+    expiry is left to the server.
+    """
+
+    backend = "redis"
+
+    def __init__(self, client: Any, *, ttl: float = 86400.0, prefix: str = "reactor:session:"):
+        super().__init__(ttl=ttl)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(self.prefix + session_id)
+        if raw is None:
+            self.misses += 1
+            return None
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        self.hits += 1
+        return json.loads(raw)
+
+    def put(self, session_id: str, data: Dict[str, Any]) -> None:
+        text = json.dumps(data, ensure_ascii=False, default=str)
+        self.client.set(self.prefix + session_id, text, ex=int(self.ttl) if self.ttl > 0 else None)
+        self.writes += 1
+
+    def delete(self, session_id: str) -> None:
+        self.client.delete(self.prefix + session_id)
+
+    def close(self) -> None:
+        close = getattr(self.client, "close", None)
+        if callable(close):
+            close()
+
+
+def session_turn(
+    *,
+    history: Any,
+    query: str,
+    answer: Any,
+    slots: Dict[str, Any],
+    sop_runtime: Dict[str, Any],
+    pending_question: Any,
+    results: Dict[str, Any],
+    max_history: int = 40,
+) -> Dict[str, Any]:
+    """Session after one turn: the history the turn started with plus its query and answer (last max_history items)."""
+    history = list(history) if isinstance(history, list) else []
+    if query:
+        history.append({"role": "user", "content": query})
+    if answer:
+        content = answer if isinstance(answer, str) else json.dumps(answer, ensure_ascii=False, default=str)
+        history.append({"role": "assistant", "content": content})
+    if max_history > 0:
+        history = history[-max_history:]
+    return {
+        "history": history,
+        "slots": dict(slots or {}),
+        "sop_runtime": dict(sop_runtime or {}),
+        "pending_question": pending_question,
+        "last_results": results,
+        "updated_at": time.time(),
+    }
+
+
+def build_session_store(cfg: Dict[str, Any] | None) -> Optional[SessionStore]:
+    if not isinstance(cfg, dict) or not cfg.get("enabled"):
+        return None
+    backend = cfg.get("backend", "memory")
+    ttl = cfg.get("ttl", 86400)
+    if backend == "memory":
+        return MemorySessionStore(ttl=ttl, max_entries=cfg.get("max_entries", 10000))
+    if backend == "sqlite":
+        return SqliteSessionStore(cfg.get("path") or os.path.join("log", "sessions.sqlite"), ttl=ttl)
+    if backend == "redis":
+        if redis is None:
+            raise RuntimeError("session_config.backend='redis' requires the redis package")
+        return RedisSessionStore(redis.Redis.from_url(cfg.get("url") or "redis://127.0.0.1:6379/0"), ttl=ttl)
+    raise ValueError(f"unknown session backend: {backend!r}")
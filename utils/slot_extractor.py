@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Pattern, Tuple
+
+from utils.aho_corasick import AhoCorasick
+
+
+@dataclass(frozen=True)
+class SlotSpec:
+    name: str
+    type: str
+    enum: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class SlotCandidate:
+    """A value found for a slot; `source` indexes the scanned texts (0 = the query), `start` is the offset in it."""
+
+    slot: str
+    value: str
+    source: int
+    start: int
+    kind: str  # "enum" or a TYPED_EXTRACTORS name
+
+
+TYPED_EXTRACTORS: Dict[str, Pattern[str]] = {
+    # 5000 / 3.5万 / 3000元 / 3年 (the unit is optional, so any number matches).
+    "amount": re.compile(r"(\d+(?:\.\d+)?)\s*(万|元|年|月)?"),
+    "date": re.compile(r"\d{4}[-/.]\d{1,2}[-/.]\d{1,2}|(?:\d{4}年)?\d{1,2}月\d{1,2}[日号]|今天|明天|后天|昨天|前天"),
+    "phone": re.compile(r"(?<!\d)1[3-9]\d{9}(?!\d)"),
+    "account": re.compile(r"(?<!\d)\d{12,19}(?!\d)"),
+    "percent": re.compile(r"\d+(?:\.\d+)?\s*[%％]|百分之[\d.零一二三四五六七八九十百]+"),
+}
+
+# Slot `type` -> typed extractor.
+SLOT_TYPES: Dict[str, str] = {
+    "number": "amount",
+    "amount": "amount",
+    "int": "amount",
+    "float": "amount",
+    "money": "amount",
+    "date": "date",
+    "phone": "phone",
+    "mobile": "phone",
+    "account": "account",
+    "card": "account",
+    "card_no": "account",
+    "percent": "percent",
+    "percentage": "percent",
+    "rate": "percent",
+}
+
+
+def _slot_filled(slots: Dict[str, Any], name: str) -> bool:
+    val = slots.get(name)
+    if val is None:
+        return False
+    if isinstance(val, str):
+        return val.strip() != "" and val.strip().lower() not in ("unknown", "none")
+    return True
+
+
+class SlotExtractor:
+    """
+    Slot extraction compiled for one SOP: a single Aho-Corasick automaton over the enum
+    values of every slot, plus one typed extractor per slot type in use. Each text is
+    scanned once for all slots.
+    """
+
+    def __init__(self, specs: Tuple[SlotSpec, ...]):
+        self.specs = tuple(specs)
+        # enum value -> [(spec position, rank of the value in that spec's enum)]
+        owners: Dict[str, List[Tuple[int, int]]] = {}
+        for pos, spec in enumerate(self.specs):
+            seen = set()
+            for rank, opt in enumerate(spec.enum):
+                if opt not in seen:
+                    seen.add(opt)
+                    owners.setdefault(opt, []).append((pos, rank))
+        self.automaton = AhoCorasick(owners) if owners else None
+        self._owners = [owners[p] for p in self.automaton.patterns] if self.automaton else []
+        self._kinds: List[str] = [SLOT_TYPES.get(spec.type, "") for spec in self.specs]
+
+    def candidates(self, texts: List[str]) -> List[SlotCandidate]:
+        """Every enum and typed match for every slot in one pass per text, ordered by text, then offset."""
+        kind_slots: Dict[str, List[str]] = {}
+        for spec, kind in zip(self.specs, self._kinds):
+            if kind and spec.name not in kind_slots.setdefault(kind, []):
+                kind_slots[kind].append(spec.name)
+        out: List[SlotCandidate] = []
+        for source, text in enumerate(texts):
+            found: List[SlotCandidate] = []
+            if self.automaton is not None:
+                for start, pattern_id in self.automaton.finditer(text):
+                    value = self.automaton.patterns[pattern_id]
+                    for pos, _rank in self._owners[pattern_id]:
+                        found.append(SlotCandidate(self.specs[pos].name, value, source, start, "enum"))
+            for kind, names in kind_slots.items():
+                for match in TYPED_EXTRACTORS[kind].finditer(text):
+                    for name in names:
+                        found.append(SlotCandidate(name, match.group(0), source, match.start(), kind))
+            found.sort(key=lambda c: c.start)
+            out.extend(found)
+        return out
+
+    def extract(self, texts: List[str], existing: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        One value per slot not already filled in `existing`: an enum value from the earliest
+        text mentioning one (the first listed option wins within that text), else the first
+        match of the slot type's extractor. Stops scanning once every slot is resolved.
+        """
+        wanted = [pos for pos, spec in enumerate(self.specs) if not _slot_filled(existing, spec.name)]
+        if not wanted:
+            return {}
+        values: Dict[int, str] = {}
+        pending = {pos for pos in wanted if self.specs[pos].enum}
+        for text in texts:
+            if not pending:
+                break
+            best: Dict[int, int] = {}
+            for pattern_id in self.automaton.matches(text):
+                for pos, rank in self._owners[pattern_id]:
+                    if pos in pending and rank < best.get(pos, rank + 1):
+                        best[pos] = rank
+            for pos, rank in best.items():
+                values[pos] = self.specs[pos].enum[rank]
+                pending.discard(pos)
+
+        typed: Dict[str, Any] = {}
+        filled: Dict[str, Any] = {}
+        for pos in wanted:
+            value = values.get(pos)
+            kind = self._kinds[pos]
+            if value is None and kind:
+                if kind not in typed:
+                    typed[kind] = None
+                    pattern = TYPED_EXTRACTORS[kind]
+                    for text in texts:
+                        match = pattern.search(text)
+                        if match:
+                            typed[kind] = match.group(0)
+                            break
+                value = typed[kind]
+            if value is not None:
+                filled[self.specs[pos].name] = value
+        return filled
@@ -0,0 +1,338 @@
+from __future__ import annotations
+
+import json
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, List, Tuple
+
+from utils.slot_extractor import SlotExtractor, SlotSpec, _slot_filled
+from utils.sop_registry import _ensure_list, _normalize_text
+
+
+class SopCompileError(ValueError):
+    """A SOP definition that cannot be compiled (e.g. a malformed transition condition)."""
+
+
+# ---------------- conditions ----------------
+
+
+class Predicate:
+    def __call__(self, query: str, slots: Dict[str, Any]) -> bool:  # pragma: no cover - interface
+        raise NotImplementedError
+
+
+@dataclass(frozen=True)
+class Always(Predicate):
+    def __call__(self, query: str, slots: Dict[str, Any]) -> bool:
+        return True
+
+
+@dataclass(frozen=True)
+class AllFilled(Predicate):
+    names: Tuple[str, ...]
+
+    def __call__(self, query: str, slots: Dict[str, Any]) -> bool:
+        return all(_slot_filled(slots, name) for name in self.names)
+
+
+@dataclass(frozen=True)
+class AnyFilled(Predicate):
+    names: Tuple[str, ...]
+
+    def __call__(self, query: str, slots: Dict[str, Any]) -> bool:
+        return any(_slot_filled(slots, name) for name in self.names)
+
+
+@dataclass(frozen=True)
+class SlotFilled(Predicate):
+    name: str
+
+    def __call__(self, query: str, slots: Dict[str, Any]) -> bool:
+        return _slot_filled(slots, self.name)
+
+
+@dataclass(frozen=True)
+class NlpContains(Predicate):
+    keywords: Tuple[str, ...]
+
+    def __call__(self, query: str, slots: Dict[str, Any]) -> bool:
+        return any(kw in query for kw in self.keywords)
+
+
+def _unquote(item: str) -> str:
+    item = _normalize_text(item)
+    if len(item) >= 2 and item[0] == item[-1] and item[0] in "'\"":
+        item = _normalize_text(item[1:-1])
+    return item
+
+
+def _parse_list(expr: str) -> List[str]:
+    """`["a", "b"]`, unquoted `[a, b]` or `a, b` -> ["a", "b"]."""
+    if not expr:
+        return []
+    expr = expr.strip()
+    if expr.startswith("["):
+        try:
+            data = json.loads(expr)
+            if isinstance(data, list):
+                return [_normalize_text(item) for item in data if _normalize_text(item)]
+        except Exception:
+            pass
+        if expr.endswith("]"):
+            expr = expr[1:-1]
+    parts = [_unquote(p) for p in expr.split(",")]
+    return [p for p in parts if p]
+
+
+def _extract_list_arg(expr: str) -> List[str]:
+    if not expr:
+        return []
+    bracket = re.search(r"\[(.*)\]", expr)
+    if bracket:
+        return _parse_list("[" + bracket.group(1) + "]")
+    paren = re.search(r"\((.*)\)", expr)
+    if paren:
+        return _parse_list(paren.group(1))
+    return []
+
+
+_PREDICATES = {
+    "all_filled": lambda args: AllFilled(tuple(args)),
+    "any_filled": lambda args: AnyFilled(tuple(args)),
+    "slot_filled": lambda args: SlotFilled(args[0]),
+    "nlp_contains": lambda args: NlpContains(tuple(args)),
+}
+
+
+def compile_condition(expr: Any) -> Predicate:
+    """`all_filled([a, b])`, `any_filled(a, b)`, `slot_filled[a]`, `nlp_contains([...])` or `true`."""
+    text = str(expr or "").strip()
+    if text.lower() in ("else", "default", "true"):
+        return Always()
+    for name, build in _PREDICATES.items():
+        if text.startswith(name):
+            rest = text[len(name):].lstrip()
+            args = _extract_list_arg(text) if rest[:1] in ("(", "[") else []
+            if not args:
+                raise SopCompileError(f"condition {text!r}: expected a non-empty argument list")
+            bad = [arg for arg in args if any(ch in arg for ch in "[](){}'\"")]
+            if bad:
+                raise SopCompileError(f"condition {text!r}: malformed argument {bad[0]!r}")
+            return build(args)
+    raise SopCompileError(f"unknown condition {text!r}")
+
+
+# ---------------- compiled SOP ----------------
+
+
+def _render_payload(payload: Any) -> str:
+    if isinstance(payload, (dict, list)):
+        return json.dumps(payload, ensure_ascii=False)
+    return str(payload)
+
+
+@dataclass(frozen=True)
+class StepTemplate:
+    """A plan step rendered at load time; `ref_last` steps take the previous step's #E var as input."""
+
+    desc: str
+    tag: str
+    payload: str = ""
+    ref_last: bool = False
+
+
+@dataclass
+class CompiledNode:
+    id: Any
+    type: str
+    next: Any = None
+    transitions: List[Tuple[Predicate, Any]] = field(default_factory=list)
+    has_fallback: bool = False
+    fallback: Any = None
+    # prompt
+    desc: Any = None
+    question: str = ""
+    needed_slots: Tuple[str, ...] = ()
+    # action / jump
+    steps: Tuple[StepTemplate, ...] = ()
+
+    def choose(self, query: str, slots: Dict[str, Any]) -> Tuple[bool, Any]:
+        """(a transition matched, its target); else/default transitions are the fallback."""
+        for predicate, target in self.transitions:
+            if predicate(query, slots):
+                return True, target
+        return self.has_fallback, self.fallback
+
+
+class PlanMemo:
+    """
+    Bounded LRU of plans generated from one compiled SOP, keyed by the walk signature
+    (start node, filled slots, nlp_contains hits). Lives on the CompiledSop, so a SOP reload
+    that recompiles the SOP starts from an empty memo. Entries are not pickled.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = int(max_entries)
+        self._entries: "OrderedDict[Tuple[Any, ...], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[Any, ...]) -> Any:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Tuple[Any, ...], value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"max_entries": self.max_entries}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state.get("max_entries", 256))
+
+
+@dataclass
+class CompiledSop:
+    id: str
+    start: Any
+    nodes: Dict[Any, CompiledNode]
+    slots: Tuple[SlotSpec, ...]
+    required_slots: FrozenSet[str]
+    extractor: SlotExtractor
+    # Everything a walk depends on besides the start node: which of these slots are
+    # filled and which of these nlp_contains keywords occur in the query.
+    signature_slots: Tuple[str, ...] = ()
+    signature_keywords: Tuple[str, ...] = ()
+    memo: PlanMemo = field(default_factory=PlanMemo, repr=False, compare=False)
+
+
+def _compile_transitions(node: CompiledNode, raw: Dict[str, Any]) -> None:
+    for tr in _ensure_list(raw.get("transitions")):
+        if not isinstance(tr, dict):
+            raise SopCompileError(f"transition {tr!r} is not a mapping")
+        cond = str(tr.get("when", ""))
+        if cond.strip().lower() in ("else", "default"):
+            # Last else/default wins, as in the interpreted engine.
+            node.has_fallback, node.fallback = True, tr.get("to")
+            continue
+        node.transitions.append((compile_condition(cond), tr.get("to")))
+
+
+def _compile_action(raw: Dict[str, Any]) -> Tuple[StepTemplate, ...]:
+    mode = _normalize_text(raw.get("mode", "serial")).lower() or "serial"
+    calls = _ensure_list(raw.get("calls"))
+    if mode == "parallel" and len(calls) > 1:
+        payload = [call for call in calls if isinstance(call, dict)]
+        if not payload:
+            return ()
+        return (StepTemplate(raw.get("id", "并行执行"), "ParallelCallAgent", _render_payload(payload)),)
+    steps: List[StepTemplate] = []
+    for call in calls:
+        if not isinstance(call, dict):
+            continue
+        steps.append(
+            StepTemplate(f"{raw.get('id','执行')}-{call.get('agent','agent')}", "SerialCallAgent", _render_payload(call))
+        )
+        if call.get("append_history"):
+            steps.append(StepTemplate(f"{raw.get('id','写入历史')}-AppendHistory", "AppendHistory", ref_last=True))
+    return tuple(steps)
+
+
+def _compile_node(raw: Dict[str, Any]) -> CompiledNode:
+    node_type = _normalize_text(raw.get("type", "")).lower()
+    node = CompiledNode(id=raw.get("id"), type=node_type, next=raw.get("next"))
+    if node_type in ("start", "decision", "prompt", "action"):
+        _compile_transitions(node, raw)
+    if node_type == "prompt":
+        node.desc = raw.get("id", "询问信息")
+        utterances = _ensure_list(raw.get("utterances"))
+        node.question = _normalize_text(utterances[0]) if utterances else ""
+        node.needed_slots = tuple(_normalize_text(s) for s in _ensure_list(raw.get("needed_slots")) if _normalize_text(s))
+    elif node_type == "action":
+        node.steps = _compile_action(raw)
+    elif node_type == "jump":
+        payload = {
+            "jump_intent": _normalize_text(raw.get("target_intent", "")),
+            "jump_state": _normalize_text(raw.get("target_state", "")),
+        }
+        node.steps = (StepTemplate(raw.get("id", "跳转"), "FinalOutput", _render_payload(payload)),)
+    return node
+
+
+def _compile_slots(slot_defs: List[Any]) -> Tuple[Tuple[SlotSpec, ...], FrozenSet[str]]:
+    specs: List[SlotSpec] = []
+    required = set()
+    for slot in slot_defs:
+        if not isinstance(slot, dict):
+            continue
+        name = _normalize_text(slot.get("name", ""))
+        if slot.get("required") is True:
+            required.add(name)
+        if not name:
+            continue
+        enums = tuple(_normalize_text(opt) for opt in (slot.get("enum") or []) if _normalize_text(opt))
+        specs.append(SlotSpec(name, _normalize_text(slot.get("type", "")), enums))
+    return tuple(specs), frozenset(required)
+
+
+def compile_sop(sop: Dict[str, Any]) -> CompiledSop:
+    """Compile a registry SOP definition; raises SopCompileError naming the SOP and state."""
+    state_map = sop.get("state_map") or {st.get("id"): st for st in sop.get("states", [])}
+    nodes: Dict[Any, CompiledNode] = {}
+    for state_id, raw in state_map.items():
+        if not isinstance(raw, dict):
+            # Kept so a cursor on it still resumes there (and stops), as before.
+            nodes[state_id] = CompiledNode(id=None, type="")
+            continue
+        try:
+            nodes[state_id] = _compile_node(raw)
+        except SopCompileError as exc:
+            raise SopCompileError(f"SOP {sop.get('id')!r} state {state_id!r}: {exc}") from None
+    slots, required = _compile_slots(sop.get("slots") or [])
+    signature_slots: Dict[str, None] = {}
+    signature_keywords: Dict[str, None] = {}
+    for node in nodes.values():
+        signature_slots.update(dict.fromkeys(node.needed_slots))
+        for predicate, _target in node.transitions:
+            if isinstance(predicate, NlpContains):
+                signature_keywords.update(dict.fromkeys(kw for kw in predicate.keywords if kw))
+            elif isinstance(predicate, SlotFilled):
+                signature_slots[predicate.name] = None
+            elif isinstance(predicate, (AllFilled, AnyFilled)):
+                signature_slots.update(dict.fromkeys(predicate.names))
+    return CompiledSop(
+        id=sop.get("id", ""),
+        start=sop.get("start_state") or None,
+        nodes=nodes,
+        slots=slots,
+        required_slots=required,
+        extractor=SlotExtractor(slots),
+        signature_slots=tuple(signature_slots),
+        signature_keywords=tuple(signature_keywords),
+    )
+
+
+def compiled_sop(sop: Dict[str, Any]) -> CompiledSop:
+    """The SOP's compiled form; hand-built SOP dicts are compiled on first use."""
+    compiled = sop.get("compiled")
+    if compiled is None:
+        compiled = sop["compiled"] = compile_sop(sop)
+    return compiled
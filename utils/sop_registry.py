@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import os
+import pickle
 import re
-from typing import Any, Dict, List, Optional
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
 
 import yaml
 
+from utils.aho_corasick import AhoCorasick
+
 
 _QUOTE_CHARS = '"\'“”‘’`'
 
@@ -31,14 +37,6 @@ def _ensure_list(value: Any) -> List[Any]:
     return [value]
 
 
-def _load_yaml(path: str) -> Dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
-    if isinstance(data, dict):
-        return data
-    return {}
-
-
 def _normalize_slot_defs(raw_slots: Any) -> List[Dict[str, Any]]:
     slots = []
     for slot in _ensure_list(raw_slots):
@@ -113,13 +111,230 @@ def _collect_keywords(sop: Dict[str, Any]) -> List[str]:
     return deduped
 
 
-def build_sop_registry(config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
-    registry: Dict[str, Dict[str, Any]] = {}
+class TriggerIndex:
+    """
+    All SOP triggers compiled into one Aho-Corasick automaton.
+    Each distinct trigger carries its precomputed weight per SOP (len of the normalized
+    trigger, once per listed occurrence), so scoring a query is one pass over the text.
+    """
+
+    def __init__(self, registry: Dict[str, Dict[str, Any]]):
+        self.sops: List[Dict[str, Any]] = list(registry.values())
+        weights: Dict[str, Dict[int, int]] = {}
+        for pos, sop in enumerate(self.sops):
+            for trig in sop.get("triggers") or []:
+                trig_norm = _normalize_text(trig)
+                if not trig_norm:
+                    continue
+                per_sop = weights.setdefault(trig_norm, {})
+                per_sop[pos] = per_sop.get(pos, 0) + max(1, len(trig_norm))
+        self.automaton = AhoCorasick(weights)
+        self.weights: List[List[tuple]] = [list(weights[p].items()) for p in self.automaton.patterns]
+
+    def best(self, query_text: str) -> Optional[Dict[str, Any]]:
+        scores: Dict[int, int] = {}
+        for pattern_id in self.automaton.matches(query_text):
+            for pos, weight in self.weights[pattern_id]:
+                scores[pos] = scores.get(pos, 0) + weight
+        if not scores:
+            return None
+        # Highest score; ties go to the SOP registered first.
+        pos = min(scores, key=lambda p: (-scores[p], p))
+        return self.sops[pos]
+
+
+class SopRegistry(dict):
+    """
+    {sop_id: sop_def} with a lazily compiled TriggerIndex, dropped whenever SOPs are
+    added or removed. Call refresh_trigger_index() after editing a SOP's triggers in place.
+    """
+
+    _index: Optional[TriggerIndex] = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # {entry key: {"stamp", "sha256", "sop"}} of the files this registry was loaded from.
+        self.sources: Dict[str, Dict[str, Any]] = {}
+        self.stats: Dict[str, int] = {"parsed": 0, "cached": 0, "reused": 0}
+
+    @property
+    def trigger_index(self) -> TriggerIndex:
+        index = self._index
+        if index is None:
+            index = self._index = TriggerIndex(self)
+        return index
+
+    def refresh_trigger_index(self) -> TriggerIndex:
+        self._index = None
+        return self.trigger_index
+
+    def __setitem__(self, key, value):
+        self._index = None
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._index = None
+        super().__delitem__(key)
+
+    def pop(self, *args):
+        self._index = None
+        return super().pop(*args)
+
+    def popitem(self):
+        self._index = None
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        self._index = None
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        self._index = None
+        super().update(*args, **kwargs)
+
+    def clear(self):
+        self._index = None
+        super().clear()
+
+
+def _build_sop_def(entry: Dict[str, Any], abs_path: str, raw: Dict[str, Any]) -> Dict[str, Any]:
+    # Imported here: the compiler itself builds on this module's normalizers.
+    from utils.sop_compiler import compile_sop
+
+    intent = _normalize_text(entry.get("intent") or raw.get("intent", ""))
+    sop_id = _normalize_text(entry.get("id") or raw.get("id") or _default_sop_id(abs_path, intent))
+    description = _normalize_text(entry.get("description") or raw.get("description", ""))
+    triggers = entry.get("triggers") or raw.get("triggers") or raw.get("keywords") or raw.get("match")
+    triggers_list = [_normalize_text(item) for item in _ensure_list(triggers) if _normalize_text(item)]
+
+    slots = _normalize_slot_defs(raw.get("slots"))
+    states = _normalize_state_defs(raw.get("states"))
+
+    state_map = {st.get("id"): st for st in states if st.get("id")}
+    start_state = None
+    for st in states:
+        if _normalize_text(st.get("type")).lower() == "start":
+            start_state = st.get("id")
+            break
+    if not start_state and states:
+        start_state = states[0].get("id")
+
+    sop_def = {
+        "id": sop_id,
+        "intent": intent,
+        "description": description,
+        "triggers": triggers_list,
+        "slots": slots,
+        "states": states,
+        "state_map": state_map,
+        "start_state": start_state,
+        "path": abs_path,
+    }
+
+    if not sop_def["triggers"]:
+        sop_def["triggers"] = _collect_keywords(sop_def)
+    # Malformed states/conditions fail here, at load time, not on the first matching request.
+    sop_def["compiled"] = compile_sop(sop_def)
+    return sop_def
+
+
+def _entry_key(entry: Dict[str, Any], abs_path: str) -> str:
+    """Identity of one `sops` config entry: the resolved file plus its config-level overrides."""
+    overrides = {k: v for k, v in entry.items() if k != "path"}
+    raw = json.dumps([abs_path, overrides], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _file_stamp(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class SopDiskCache:
+    """
+    Compiled SOP definitions pickled under `cache_dir`, one file per `sops` entry, so warm
+    starts skip YAML parsing. A record is used when the SOP file's mtime/size are unchanged,
+    or failing that when its sha256 still matches (e.g. after a checkout touched the file).
+    Records written by another cache version are ignored.
+    """
+
+    # Bump whenever compiled SOPs (utils.sop_compiler) change shape or meaning.
+    VERSION = 4
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key: str, stamp: Tuple[int, int], digest_of) -> Tuple[Optional[Dict[str, Any]], str]:
+        """(cached sop_def or None, sha256 of the file if it had to be read, else "")."""
+        record = None
+        try:
+            with open(self._path(key), "rb") as f:
+                record = pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            self.errors += 1
+        if not isinstance(record, dict) or record.get("version") != self.VERSION:
+            self.misses += 1
+            return None, ""
+        if tuple(record.get("stamp") or ()) == stamp:
+            self.hits += 1
+            return record["sop"], record.get("sha256", "")
+        digest = digest_of()
+        if record.get("sha256") == digest:
+            self.hits += 1
+            self.put(key, stamp, digest, record["sop"])
+            return record["sop"], digest
+        self.misses += 1
+        return None, digest
+
+    def put(self, key: str, stamp: Tuple[int, int], digest: str, sop_def: Dict[str, Any]) -> None:
+        record = {"version": self.VERSION, "stamp": list(stamp), "sha256": digest, "sop": sop_def}
+        tmp = f"{self._path(key)}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except Exception as exc:
+            self.errors += 1
+            print(f"[sop_cache] write failed for {key}: {exc}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"dir": self.cache_dir, "hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+
+def build_sop_cache(config: Dict[str, Any] | None) -> Optional[SopDiskCache]:
+    cache_dir = config.get("cache_dir") if isinstance(config, dict) else None
+    if not cache_dir:
+        return None
+    return SopDiskCache(_resolve_path(cache_dir, config.get("base_dir")))
+
+
+def build_sop_registry(
+    config: Dict[str, Any],
+    *,
+    cache: Optional[SopDiskCache] = None,
+    previous: Optional[SopRegistry] = None,
+) -> SopRegistry:
+    """
+    Load every configured SOP. With `previous`, entries whose file is unchanged (same
+    mtime/size, or same sha256) reuse the previous definition instead of being re-parsed;
+    `cache` persists compiled definitions across restarts.
+    """
+    registry = SopRegistry()
     if not config:
         return registry
 
     base_dir = config.get("base_dir") if isinstance(config, dict) else None
     sop_items = config.get("sops") if isinstance(config, dict) else []
+    old_sources = previous.sources if previous is not None else {}
 
     for item in _ensure_list(sop_items):
         if isinstance(item, str):
@@ -137,52 +352,54 @@ def build_sop_registry(config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
         if not os.path.exists(abs_path):
             continue
 
-        raw = _load_yaml(abs_path)
-        if not raw:
-            continue
+        key = _entry_key(entry, abs_path)
+        stamp = _file_stamp(abs_path)
+        content: List[bytes] = []
+
+        def _digest() -> str:
+            if not content:
+                with open(abs_path, "rb") as f:
+                    content.append(f.read())
+            return hashlib.sha256(content[0]).hexdigest()
+
+        sop_def = None
+        digest = ""
+        old = old_sources.get(key)
+        if old is not None:
+            if old["stamp"] == stamp or old["sha256"] == _digest():
+                sop_def, digest = old["sop"], old["sha256"]
+                registry.stats["reused"] += 1
+        if sop_def is None and cache is not None:
+            sop_def, digest = cache.get(key, stamp, _digest)
+            if sop_def is not None:
+                registry.stats["cached"] += 1
+        if sop_def is None:
+            digest = _digest()
+            raw = yaml.safe_load(content[0].decode("utf-8"))
+            if not isinstance(raw, dict) or not raw:
+                continue
+            sop_def = _build_sop_def(entry, abs_path, raw)
+            registry.stats["parsed"] += 1
+            if cache is not None:
+                cache.put(key, stamp, digest, sop_def)
 
-        intent = _normalize_text(entry.get("intent") or raw.get("intent", ""))
-        sop_id = _normalize_text(entry.get("id") or raw.get("id") or _default_sop_id(abs_path, intent))
-        description = _normalize_text(entry.get("description") or raw.get("description", ""))
-        triggers = entry.get("triggers") or raw.get("triggers") or raw.get("keywords") or raw.get("match")
-        triggers_list = [_normalize_text(item) for item in _ensure_list(triggers) if _normalize_text(item)]
-
-        slots = _normalize_slot_defs(raw.get("slots"))
-        states = _normalize_state_defs(raw.get("states"))
-
-        state_map = {st.get("id"): st for st in states if st.get("id")}
-        start_state = None
-        for st in states:
-            if _normalize_text(st.get("type")).lower() == "start":
-                start_state = st.get("id")
-                break
-        if not start_state and states:
-            start_state = states[0].get("id")
-
-        sop_def = {
-            "id": sop_id,
-            "intent": intent,
-            "description": description,
-            "triggers": triggers_list,
-            "slots": slots,
-            "states": states,
-            "state_map": state_map,
-            "start_state": start_state,
-            "path": abs_path,
-        }
-
-        if not sop_def["triggers"]:
-            sop_def["triggers"] = _collect_keywords(sop_def)
-
-        registry[sop_id] = sop_def
+        registry.sources[key] = {"stamp": stamp, "sha256": digest or _digest(), "sop": sop_def}
+        registry[sop_def["id"]] = sop_def
 
+    registry.refresh_trigger_index()
     return registry
 
 
 def match_sop(query: str, registry: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    SOP whose triggers occurring in the query have the largest total length (a trigger
+    counts once however often it occurs); the first registered SOP wins a tie.
+    """
     if not query or not registry:
         return None
     query_text = str(query)
+    if isinstance(registry, SopRegistry):
+        return registry.trigger_index.best(query_text)
     best = None
     best_score = 0
     for sop in registry.values():
@@ -213,3 +430,12 @@ def build_sop_catalog(registry: Dict[str, Dict[str, Any]]) -> str:
             trigger_text = f" | 触发词: {sample}"
         lines.append(f"- {sop_id}: {desc or '无'}{trigger_text}")
     return "\n".join(lines)
+
+
+@dataclass(frozen=True)
+class SopSnapshot:
+    """A registry with its catalog text and plan-cache fingerprint, published as one reference."""
+
+    registry: SopRegistry
+    catalog: str
+    fingerprint: str
@@ -41,3 +41,48 @@ def consume_agent_http_stream(
                     trace.add_text(text)
     except Exception as e:
         trace.add_text(f'[STREAM ERROR] {repr(e)}')
+
+
+def _parse_stream_line(line: str) -> Any:
+    if line.startswith('data:'):
+        line = line[len('data:'):].strip()
+    try:
+        return json.loads(line)
+    except Exception:
+        return None
+
+
+async def aconsume_agent_http_stream(
+    resp,
+    trace,
+    *,
+    on_raw: Callable[[dict], None] | None = None,
+) -> None:
+    '''
+    Async counterpart of consume_agent_http_stream for httpx streaming responses.
+    graph_trace events go to the trace as they arrive, everything else to on_raw.
+    A stream that breaks off (read timeout, dropped connection) is noted in the trace and
+    the error re-raised, so a truncated answer is never taken for a complete one.
+    '''
+    try:
+        async for line in resp.aiter_lines():
+            if not line:
+                continue
+            raw = _parse_stream_line(line)
+            if raw is None:
+                continue
+
+            if is_graph_trace_event(raw):
+                if trace is not None:
+                    content = raw.get('data', {}).get('content')
+                    text = extract_plain_text(content)
+                    if text:
+                        trace.add_text(text)
+                continue
+
+            if on_raw:
+                on_raw(raw)
+    except Exception as e:
+        if trace is not None:
+            trace.add_text(f'[STREAM ERROR] {repr(e)}')
+        raise